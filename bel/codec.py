@@ -0,0 +1,103 @@
+"""JSON codec used for nanopub, edge and terminology files
+
+Uses orjson when it is installed (pip install bel[fast]) and falls back to the
+stdlib json module otherwise.  The backend can be forced with the BEL_JSON_CODEC
+environment variable (orjson or json) or with set_backend().
+
+    import bel.codec as codec
+
+    nanopub = codec.loads(line)
+    out_fh.write(codec.dumps_line(edges))
+
+canonical_dumps() is the deterministic serialization used for hashing (EdgeStore
+node and edge _keys, bel.utils._create_hash_from_doc).  It is always the stdlib
+json.dumps(sort_keys=True) so that hashes don't depend on the installed backend
+and stay bit-compatible with existing EdgeStores - orjson sorts keys too but uses
+compact separators and doesn't escape non-ASCII characters.
+"""
+
+import json
+import os
+from typing import Any, Union
+
+from structlog import get_logger
+log = get_logger()
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+backends = ['orjson', 'json']
+
+backend = None
+
+
+def available_backends():
+    """Installed codec backends, fastest first"""
+
+    return [name for name in backends if name != 'orjson' or orjson is not None]
+
+
+def set_backend(name: str = None) -> str:
+    """Select codec backend
+
+    Args:
+        name: orjson or json - None for the fastest installed backend
+
+    Returns:
+        str: selected backend
+    """
+
+    global backend
+
+    if name is None:
+        name = available_backends()[0]
+    elif name not in backends:
+        raise ValueError(f'Unknown JSON codec backend {name} - expected one of {backends}')
+    elif name not in available_backends():
+        log.warning('JSON codec backend not installed - using json', backend=name)
+        name = 'json'
+
+    backend = name
+    return backend
+
+
+def loads(content: Union[str, bytes]) -> Any:
+    """Parse JSON document from str or bytes"""
+
+    if backend == 'orjson':
+        return orjson.loads(content)
+
+    return json.loads(content)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to single line JSON
+
+    Documents orjson can't serialize, e.g. integers larger than 64bit or
+    non-string keys, are serialized with the stdlib json module.
+    """
+
+    if backend == 'orjson':
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            pass
+
+    return json.dumps(obj)
+
+
+def dumps_line(obj: Any) -> str:
+    """Serialize to a JSONLines record including the trailing newline"""
+
+    return dumps(obj) + '\n'
+
+
+def canonical_dumps(obj: Any) -> str:
+    """Deterministic serialization for hashing - independent of the codec backend"""
+
+    return json.dumps(obj, sort_keys=True)
+
+
+set_backend(os.getenv('BEL_JSON_CODEC') or None)
@@ -0,0 +1,523 @@
+"""Multi-threaded compressed file I/O for nanopub, edge and resource files
+
+Compression is chosen by the file extension:
+
+    *.gz, *.bgz  gzip - written as BGZF (blocked gzip, as used by bgzip/samtools)
+    *.zst        zstd - requires zstandard (pip install bel[zstd])
+
+    with bel.compression.open_file('nanopubs.jsonl.gz', 'wt') as f:
+        f.write(line)
+
+BGZF files are multi-member gzip files with each member holding up to 64KB of
+uncompressed data and recording its compressed size in the gzip header, so any
+gzip reader (gzip.open, zcat) reads them.  Blocks are compressed in a thread pool
+(zlib releases the GIL) and - because the member boundaries are known without
+decompressing - decompressed in a thread pool as well.  Other gzip files are
+decompressed in a read-ahead thread so that decompression overlaps with parsing.
+
+zstd files are compressed with the multi-threaded zstd compressor and decompressed
+in a read-ahead thread.
+"""
+
+import collections
+import concurrent.futures
+import gzip
+import io
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+from typing import IO, List, Union
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+from structlog import get_logger
+log = get_logger()
+
+bgzf_block_size = 0xff00  # max uncompressed bytes per BGZF block (as bgzip)
+bgzf_header = struct.Struct('<BBBBIBBHBBHH')  # gzip header with the BC extra subfield
+bgzf_eof = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+blocks_per_task = 16  # BGZF blocks (de)compressed per thread pool task - ~1MB
+chunk_size = 1 << 20
+
+gzip_magic = b'\x1f\x8b'
+zstd_magic = b'\x28\xb5\x2f\xfd'
+
+compression_extensions = {
+    '.gz': 'gzip',
+    '.bgz': 'gzip',
+    '.zst': 'zstd',
+}
+
+
+def default_threads() -> int:
+    """Compression threads - number of CPUs, at most 8"""
+
+    return max(1, min(8, os.cpu_count() or 1))
+
+
+def file_compression(fn: str) -> str:
+    """Compression by file extension - gzip, zstd or None"""
+
+    for extension, compression in compression_extensions.items():
+        if fn.endswith(extension):
+            return compression
+
+    return None
+
+
+def sniff_compression(fh: IO) -> str:
+    """Compression by the magic bytes at the current position of a binary file
+
+    Seekable files are read and rewound, other files (pipes, HTTP responses) need
+    peek() - e.g. wrapped in io.BufferedReader.
+    """
+
+    if fh.seekable():
+        position = fh.tell()
+        magic = fh.read(4)
+        fh.seek(position)
+    else:
+        magic = fh.peek(4)[:4]
+
+    if magic[:2] == gzip_magic:
+        return 'gzip'
+    elif magic == zstd_magic:
+        return 'zstd'
+
+    return None
+
+
+def compress_bgzf_block(data: bytes, level: int) -> bytes:
+    """Compress up to bgzf_block_size bytes into a BGZF block"""
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+
+    # BSIZE is the total block size - 1: 18 byte header + cdata + 8 byte CRC32/ISIZE trailer
+    header = bgzf_header.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+
+
+def compress_bgzf_blocks(data: bytes, level: int) -> bytes:
+
+    return b''.join([
+        compress_bgzf_block(data[start:start + bgzf_block_size], level)
+        for start in range(0, len(data), bgzf_block_size)
+    ])
+
+
+def decompress_bgzf_blocks(blocks: List[bytes]) -> bytes:
+
+    return b''.join([zlib.decompress(block, 31) for block in blocks])
+
+
+def read_bgzf_block(fh: IO) -> bytes:
+    """Read the next (compressed) BGZF block from the file
+
+    Returns:
+        bytes: block - b'' at end of file, None if not a BGZF block
+    """
+
+    header = fh.read(12)
+    if not header:
+        return b''
+
+    if len(header) < 12 or header[:2] != gzip_magic or not header[3] & 4:
+        return None
+
+    xlen = struct.unpack('<H', header[10:12])[0]
+    extra = fh.read(xlen)
+
+    # Find the BC subfield - other subfields are allowed
+    bsize, idx = None, 0
+    while idx + 4 <= len(extra):
+        (si1, si2, slen) = struct.unpack('<BBH', extra[idx:idx + 4])
+        if si1 == 66 and si2 == 67 and slen == 2:
+            bsize = struct.unpack('<H', extra[idx + 4:idx + 6])[0]
+        idx += 4 + slen
+
+    if bsize is None:
+        return None
+
+    rest = fh.read(bsize + 1 - 12 - xlen)
+    return header + extra + rest
+
+
+def is_bgzf(fh: IO) -> bool:
+    """Is the seekable binary file a BGZF file"""
+
+    position = fh.tell()
+    try:
+        return bool(read_bgzf_block(fh))
+    finally:
+        fh.seek(position)
+
+
+class BGZFWriter(io.RawIOBase):
+    """Write BGZF blocks compressed in a thread pool
+
+    flush() writes all buffered data as complete blocks so the output written so far
+    is a valid gzip file - e.g. for bel.nanopub.checkpoint.ResumableOutput.
+
+    Args:
+        fh: binary file to write the compressed blocks to
+        level: zlib compression level
+        threads: compression threads
+        close_fh: close fh on close()
+    """
+
+    def __init__(self, fh: IO, level: int = 6, threads: int = None, close_fh: bool = True):
+
+        self.fh = fh
+        self.level = level
+        self.threads = threads or default_threads()
+        self.close_fh = close_fh
+
+        self._buffer = bytearray()
+        self._task_size = bgzf_block_size * blocks_per_task
+        self._pending = collections.deque()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+        self._finished = False
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+
+        self._buffer.extend(data)
+        while len(self._buffer) >= self._task_size:
+            self._submit(bytes(self._buffer[:self._task_size]))
+            del self._buffer[:self._task_size]
+
+        return len(data)
+
+    def _submit(self, data: bytes):
+
+        self._pending.append(self._executor.submit(compress_bgzf_blocks, data, self.level))
+        while len(self._pending) > 2 * self.threads:
+            self.fh.write(self._pending.popleft().result())
+
+    def flush(self):
+        """Compress and write all buffered data"""
+
+        if self._finished:
+            return
+
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+
+        while self._pending:
+            self.fh.write(self._pending.popleft().result())
+
+        self.fh.flush()
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self.flush()
+        self.fh.write(bgzf_eof)
+        self._executor.shutdown()
+        if self.close_fh:
+            self.fh.close()
+        else:
+            self.fh.flush()
+
+        self._finished = True
+        super().close()
+
+
+class BGZFReader(io.RawIOBase):
+    """Read BGZF blocks decompressed in a thread pool
+
+    Args:
+        fh: binary BGZF file
+        threads: decompression threads
+        close_fh: close fh on close()
+    """
+
+    def __init__(self, fh: IO, threads: int = None, close_fh: bool = True):
+
+        self.fh = fh
+        self.threads = threads or default_threads()
+        self.close_fh = close_fh
+
+        self._data = b''
+        self._offset = 0
+        self._eof = False
+        self._pending = collections.deque()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        """Keep up to 2 * threads decompression tasks in flight"""
+
+        while not self._eof and len(self._pending) < 2 * self.threads:
+            blocks = []
+            while len(blocks) < blocks_per_task:
+                block = read_bgzf_block(self.fh)
+                if block is None:
+                    raise OSError('Not a BGZF block - file is truncated or corrupt')
+                if not block:
+                    self._eof = True
+                    break
+                blocks.append(block)
+
+            if blocks:
+                self._pending.append(self._executor.submit(decompress_bgzf_blocks, blocks))
+
+    def readinto(self, b) -> int:
+
+        while self._offset >= len(self._data):
+            self._fill()
+            if not self._pending:
+                return 0
+            self._data = self._pending.popleft().result()
+            self._offset = 0
+
+        size = min(len(b), len(self._data) - self._offset)
+        b[:size] = self._data[self._offset:self._offset + size]
+        self._offset += size
+
+        return size
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self._executor.shutdown()
+        if self.close_fh:
+            self.fh.close()
+
+        super().close()
+
+
+class ReadAheadReader(io.RawIOBase):
+    """Read a (decompressing) binary stream in a background thread
+
+    Args:
+        fh: binary file, e.g. gzip.GzipFile
+        close_fhs: files to close on close(), e.g. fh and the file it decompresses
+        max_chunks: max chunks read ahead
+    """
+
+    def __init__(self, fh: IO, close_fhs: List[IO] = (), max_chunks: int = 8):
+
+        self.fh = fh
+        self.close_fhs = close_fhs
+
+        self._data = b''
+        self._offset = 0
+        self._done = False
+        self._stop = threading.Event()
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+
+        try:
+            while not self._stop.is_set():
+                chunk = self.fh.read(chunk_size)
+                self._queue.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self._queue.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+
+        while self._offset >= len(self._data):
+            if self._done:
+                return 0
+            chunk = self._queue.get()
+            if isinstance(chunk, Exception):
+                self._done = True
+                raise chunk
+            if not chunk:
+                self._done = True
+                return 0
+            self._data, self._offset = chunk, 0
+
+        size = min(len(b), len(self._data) - self._offset)
+        b[:size] = self._data[self._offset:self._offset + size]
+        self._offset += size
+
+        return size
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        # Unblock and stop the read-ahead thread
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+        for fh in self.close_fhs:
+            fh.close()
+
+        super().close()
+
+
+class ZstdWriter(io.RawIOBase):
+    """Write a zstd stream - flush() ends the current zstd frame"""
+
+    def __init__(self, fh: IO, level: int = 3, threads: int = None, close_fh: bool = True):
+
+        self.fh = fh
+        self.close_fh = close_fh
+
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads or default_threads())
+        self._writer = compressor.stream_writer(fh, closefd=False)
+        self._finished = False
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+
+        self._writer.write(data)
+        return len(data)
+
+    def flush(self):
+
+        if self._finished:
+            return
+
+        self._writer.flush(zstandard.FLUSH_FRAME)
+        self.fh.flush()
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self._writer.close()
+        if self.close_fh:
+            self.fh.close()
+        else:
+            self.fh.flush()
+
+        self._finished = True
+        super().close()
+
+
+class _Unclosed(io.RawIOBase):
+    """Binary file object proxy that doesn't close the file object"""
+
+    def __init__(self, fh: IO):
+        self.fh = fh
+
+    def readable(self):
+        return self.fh.readable()
+
+    def writable(self):
+        return self.fh.writable()
+
+    def readinto(self, b) -> int:
+        data = self.fh.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def write(self, data) -> int:
+        return self.fh.write(data)
+
+    def flush(self):
+        self.fh.flush()
+
+
+def check_compression(compression: str):
+
+    if compression not in (None, 'gzip', 'zstd'):
+        raise ValueError(f'Unknown compression {compression} - expected gzip or zstd')
+
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError('zstd compressed files require zstandard - pip install bel[zstd]')
+
+
+def open_file(file: Union[str, IO], mode: str = 'rt', compression: str = None, threads: int = None, level: int = None) -> IO:
+    """Open (compressed) file for reading or writing
+
+    Args:
+        file: filename ('-' for STDIN/STDOUT) or binary file object - file objects are not closed on close()
+        mode: rt, wt, rb or wb
+        compression: gzip, zstd or None - default is based on the filename extension or,
+            for file objects opened for reading, on the magic bytes
+        threads: (de)compression threads - default is the number of CPUs, at most 8
+        level: compression level - default is 6 for gzip and 3 for zstd
+
+    Returns:
+        IO: text or binary file object
+    """
+
+    if mode not in ('rt', 'wt', 'rb', 'wb', 'r', 'w'):
+        raise ValueError(f'Unsupported mode {mode}')
+
+    read_flag = mode.startswith('r')
+    text_flag = not mode.endswith('b')
+
+    if file == '-':
+        stream = sys.stdin if read_flag else sys.stdout
+        return stream if text_flag else stream.buffer
+
+    if isinstance(file, str):
+        if compression is None:
+            compression = file_compression(file)
+        fh = open(file, 'rb' if read_flag else 'wb')
+        close_fh = True
+    else:
+        fh = file
+        close_fh = False
+        if compression is None and read_flag:
+            if not fh.seekable() and not hasattr(fh, 'peek'):
+                fh = io.BufferedReader(_Unclosed(fh))
+            compression = sniff_compression(fh)
+
+    check_compression(compression)
+
+    if compression is None:
+        if close_fh:
+            stream = fh
+        elif read_flag:
+            stream = io.BufferedReader(_Unclosed(fh))
+        else:
+            stream = io.BufferedWriter(_Unclosed(fh))
+    elif read_flag and compression == 'gzip' and fh.seekable() and is_bgzf(fh):
+        stream = io.BufferedReader(BGZFReader(fh, threads=threads, close_fh=close_fh), buffer_size=chunk_size)
+    elif read_flag and compression == 'gzip':
+        reader = gzip.GzipFile(fileobj=fh, mode='rb')
+        stream = io.BufferedReader(ReadAheadReader(reader, [reader, fh] if close_fh else [reader]), buffer_size=chunk_size)
+    elif read_flag:
+        reader = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True, closefd=close_fh)
+        stream = io.BufferedReader(ReadAheadReader(reader, [reader]), buffer_size=chunk_size)
+    elif compression == 'gzip':
+        stream = BGZFWriter(fh, level=6 if level is None else level, threads=threads, close_fh=close_fh)
+    else:
+        stream = ZstdWriter(fh, level=3 if level is None else level, threads=threads, close_fh=close_fh)
+
+    if text_flag:
+        return io.TextIOWrapper(stream, encoding='utf-8')
+
+    return stream
+
@@ -1,6 +1,15 @@
 import re
+import inspect
+import json
+import time
+import threading
+import concurrent.futures
+from typing import List, Mapping, Tuple
+
 import arango
+import requests
 
+import bel.codec as codec
 import bel.utils as utils
 from bel.Config import config
 
@@ -16,6 +25,7 @@ edgestore_edges_name = 'edges'  # edgestore edge collection name
 edgestore_pipeline_name = 'pipeline'  # edgestore pipeline state collection name
 edgestore_pipeline_errors_name = 'pipeline_errors'  # edgestore pipeline errors collection name
 edgestore_pipeline_stats_name = 'pipeline_stats'  # edgestore pipeline stats collection name
+edgestore_contexts_name = 'nanopub_contexts'  # edgestore nanopub annotations/metadata for normalized edges
 
 equiv_nodes_name = 'equivalence_nodes'  # equivalence node collection name
 equiv_edges_name = 'equivalence_edges'  # equivalence edge collection name
@@ -65,13 +75,172 @@ def get_client(host=None, port=None, username=None, password=None, enable_loggin
     return client
 
 
-def aql_query(db, query):
+def aql_query(db, query, bind_vars=None):
     """Run AQL query"""
 
-    result = db.aql.execute(query)
+    result = db.aql.execute(query, bind_vars=bind_vars)
     return result
 
 
+aql_queries = {}  # name -> AQLQuery registry
+aql_query_stats = {}  # name -> execution counts and timing
+aql_query_stats_lock = threading.Lock()
+
+
+class AQLQuery(object):
+    """Named, parameterized AQL query
+
+    The query text is constant and all values are passed as bind variables
+    (use @@name for collection names) so that ArangoDB can reuse the query plan.
+    Queries are registered by name in aql_queries and their cursor options can be
+    tuned per name in the configuration, e.g.:
+
+        bel_api:
+          aql_queries:
+            get_equivalents: {cache: true, batch_size: 50}
+
+    Execution counts and timings (time to the first result batch) are collected in
+    aql_query_stats.
+    """
+
+    def __init__(self, name: str, query: str, batch_size: int = None, cache: bool = None,
+                 stream: bool = False, ttl: int = None, count: bool = False) -> None:
+        """Initialize and register AQL Query
+
+        Args:
+            name: unique query name
+            query: AQL query text using bind parameters
+            batch_size: number of results fetched per cursor round trip
+            cache: use the ArangoDB query results cache (server cache mode must be on or demand)
+            stream: use a server-side streaming cursor - dropped with a warning if the installed
+                    python-arango doesn't support it
+            ttl: server-side cursor time-to-live in seconds
+            count: include the total result count in the cursor
+        """
+
+        self.name = name
+        self.query = query
+        self.batch_size = batch_size
+        self.cache = cache
+        self.stream = stream
+        self.ttl = ttl
+        self.count = count
+
+        aql_queries[name] = self
+
+    def __repr__(self):
+        return f'AQLQuery({self.name})'
+
+    def options(self) -> dict:
+        """Cursor options merged with configuration overrides"""
+
+        options = {'batch_size': self.batch_size, 'cache': self.cache, 'stream': self.stream, 'ttl': self.ttl, 'count': self.count}
+        options.update(config['bel_api'].get('aql_queries', {}).get(self.name, {}))
+
+        return options
+
+    def execute(self, db, bind_vars: dict = None, **options):
+        """Execute query
+
+        Args:
+            db: ArangoDB client database handle
+            bind_vars: bind variables for query
+            options: cursor options overriding the query defaults
+
+        Returns:
+            arango.cursor.Cursor: result cursor
+        """
+
+        query_options = self.options()
+        query_options.update(options)
+        # Only pass stream if requested - older python-arango versions don't support it
+        if not query_options.get('stream'):
+            query_options.pop('stream', None)
+        query_options = {key: value for key, value in query_options.items() if value is not None}
+
+        supported = supported_aql_options(db.aql)
+        if supported is not None:
+            for key in [key for key in query_options if key not in supported]:
+                warn_unsupported_aql_option(self.name, key)
+                query_options.pop(key)
+
+        start_time = time.perf_counter()
+        try:
+            cursor = db.aql.execute(self.query, bind_vars=bind_vars, **query_options)
+        except Exception:
+            record_aql_query_stats(self.name, time.perf_counter() - start_time, error=True)
+            raise
+
+        record_aql_query_stats(self.name, time.perf_counter() - start_time)
+
+        return cursor
+
+
+_aql_options = {}  # AQL API class -> supported execute() options
+_aql_option_warnings = set()
+
+
+def supported_aql_options(aql) -> set:
+    """Cursor options supported by the python-arango AQL API execute() - None if any are accepted"""
+
+    aql_class = type(aql)
+    if aql_class not in _aql_options:
+        try:
+            parameters = inspect.signature(aql.execute).parameters.values()
+        except (TypeError, ValueError):
+            parameters = []
+
+        if not parameters or any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters):
+            _aql_options[aql_class] = None
+        else:
+            _aql_options[aql_class] = {parameter.name for parameter in parameters}
+
+    return _aql_options[aql_class]
+
+
+def warn_unsupported_aql_option(name: str, option: str):
+    """Warn once per query about a cursor option the installed python-arango doesn't support"""
+
+    if (name, option) not in _aql_option_warnings:
+        _aql_option_warnings.add((name, option))
+        log.warning(f'AQL query {name}: cursor option {option} is not supported by the installed python-arango - ignored')
+
+
+def record_aql_query_stats(name: str, elapsed: float, error: bool = False):
+    """Add query execution to aql_query_stats"""
+
+    with aql_query_stats_lock:
+        stats = aql_query_stats.setdefault(name, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        if error:
+            stats['errors'] += 1
+        elapsed_ms = elapsed * 1000
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def get_aql_query_stats(reset: bool = False) -> dict:
+    """Get AQL query execution counts and timings by query name
+
+    Args:
+        reset: clear the collected stats
+
+    Returns:
+        dict: {name: {'count', 'errors', 'total_ms', 'max_ms', 'avg_ms'}}
+    """
+
+    with aql_query_stats_lock:
+        results = {}
+        for name, stats in aql_query_stats.items():
+            results[name] = dict(stats)
+            results[name]['avg_ms'] = stats['total_ms'] / stats['count'] if stats['count'] else 0.0
+
+        if reset:
+            aql_query_stats.clear()
+
+    return results
+
+
 def get_edgestore_handle(client: arango.client.ArangoClient,
                          username=None, password=None,
                          edgestore_db_name: str = edgestore_db_name,
@@ -79,7 +248,8 @@ def get_edgestore_handle(client: arango.client.ArangoClient,
                          edgestore_nodes_name: str = edgestore_nodes_name,
                          edgestore_pipeline_name: str = edgestore_pipeline_name,
                          edgestore_pipeline_stats_name: str = edgestore_pipeline_stats_name,
-                         edgestore_pipeline_errors_name: str = edgestore_pipeline_errors_name) -> arango.database.StandardDatabase:
+                         edgestore_pipeline_errors_name: str = edgestore_pipeline_errors_name,
+                         edgestore_contexts_name: str = edgestore_contexts_name) -> arango.database.StandardDatabase:
     """Get Edgestore arangodb database handle
 
     Args:
@@ -119,20 +289,18 @@ def get_edgestore_handle(client: arango.client.ArangoClient,
     # has_collection function doesn't seem to be working
     # if not edgestore_db.has_collection(edgestore_nodes_name):
     try:
-        nodes = edgestore_db.create_collection(edgestore_nodes_name, index_bucket_count=64)
-        nodes.add_hash_index(fields=['name'], unique=False)
-        nodes.add_hash_index(fields=['components'], unique=False)  # add subject/object components as node properties
+        edgestore_db.create_collection(edgestore_nodes_name, index_bucket_count=64)
     except Exception:
         pass
 
     # if not edgestore_db.has_collection(edgestore_edges_name):
     try:
-        edges = edgestore_db.create_collection(edgestore_edges_name, edge=True, index_bucket_count=64)
-        edges.add_hash_index(fields=['relation'], unique=False)
-        edges.add_hash_index(fields=['edge_types'], unique=False)
-        edges.add_hash_index(fields=['nanopub_id'], unique=False)
-        edges.add_hash_index(fields=['metadata.project'], unique=False)
-        edges.add_hash_index(fields=['annotations[*].id'], unique=False)
+        edgestore_db.create_collection(edgestore_edges_name, edge=True, index_bucket_count=64)
+    except Exception:
+        pass
+
+    try:
+        edgestore_db.create_collection(edgestore_contexts_name)
     except Exception:
         pass
 
@@ -152,9 +320,165 @@ def get_edgestore_handle(client: arango.client.ArangoClient,
     except arango.exceptions.CollectionCreateError as e:
         pass
 
+    # Add any missing managed indexes - also updates existing EdgeStores
+    index_definitions = {
+        edgestore_nodes_name: edgestore_indexes['nodes'],
+        edgestore_edges_name: edgestore_indexes['edges'],
+        edgestore_contexts_name: edgestore_indexes['contexts'],
+        edgestore_pipeline_errors_name: edgestore_indexes['pipeline_errors'],
+    }
+    try:
+        ensure_indexes(edgestore_db, index_definitions)
+    except Exception as e:
+        log.error(f'Could not add EdgeStore indexes  msg: {e}')
+
     return edgestore_db
 
 
+# Managed EdgeStore indexes by collection role
+#   hash indexes for equality lookups, skiplist indexes for range filters, sorting and paging
+edgestore_indexes = {
+    'nodes': [
+        {'type': 'hash', 'fields': ['name']},
+        {'type': 'hash', 'fields': ['components']},  # add subject/object components as node properties
+        {'type': 'hash', 'fields': ['components[*]']},  # node by subcomponent
+    ],
+    'edges': [
+        {'type': 'hash', 'fields': ['relation']},
+        {'type': 'hash', 'fields': ['edge_types']},
+        {'type': 'hash', 'fields': ['nanopub_id']},
+        {'type': 'hash', 'fields': ['metadata.project']},
+        {'type': 'hash', 'fields': ['annotations[*].id']},
+        {'type': 'hash', 'fields': ['edge_hash']},
+        {'type': 'hash', 'fields': ['citation']},
+        {'type': 'hash', 'fields': ['subject_canon']},
+        {'type': 'hash', 'fields': ['object_canon']},
+        {'type': 'hash', 'fields': ['species_id'], 'sparse': True},
+        {'type': 'skiplist', 'fields': ['metadata.gd:updateTS']},
+        {'type': 'skiplist', 'fields': ['nanopub_id', 'metadata.gd:updateTS']},
+    ],
+    'contexts': [
+        {'type': 'hash', 'fields': ['metadata.project']},
+        {'type': 'hash', 'fields': ['annotations[*].id']},
+        {'type': 'skiplist', 'fields': ['metadata.gd:updateTS']},
+    ],
+    'pipeline_errors': [
+        {'type': 'hash', 'fields': ['nanopub_id']},
+    ],
+}
+
+
+def ensure_indexes(db, index_definitions: Mapping[str, List[dict]]) -> List[dict]:
+    """Add missing indexes
+
+    Indexes are matched on type, fields and sparse flag.  Existing indexes that
+    are not in the definitions are left alone.
+
+    Args:
+        db: ArangoDB database handle
+        index_definitions: collection name -> [{'type': hash|skiplist|persistent, 'fields': [], 'sparse': bool, 'unique': bool}]
+
+    Returns:
+        List[dict]: created indexes
+    """
+
+    add_index = {'hash': 'add_hash_index', 'skiplist': 'add_skiplist_index', 'persistent': 'add_persistent_index'}
+
+    created = []
+    for collection_name, definitions in index_definitions.items():
+        collection = db.collection(collection_name)
+        existing = [
+            (index['type'], list(index['fields']), bool(index.get('sparse', False)))
+            for index in collection.indexes()
+        ]
+
+        for definition in definitions:
+            sparse = definition.get('sparse', False)
+            if (definition['type'], definition['fields'], sparse) in existing:
+                continue
+
+            getattr(collection, add_index[definition['type']])(
+                fields=definition['fields'], unique=definition.get('unique', False), sparse=sparse
+            )
+            created.append(dict(definition, collection=collection_name))
+            log.info('Created index', collection=collection_name, index=definition)
+
+    return created
+
+
+def inline_bind_vars(query: str, bind_vars: dict = None) -> str:
+    """Replace bind variables in query with their values
+
+    Used for explaining queries as aql.explain doesn't take bind variables
+
+    Args:
+        query: AQL query
+        bind_vars: bind variables - @@collection values are inlined as collection names
+
+    Returns:
+        str: AQL query without bind variables
+    """
+
+    bind_vars = bind_vars or {}
+
+    def replace(match):
+        name = match.group(1)
+        if name.startswith('@'):
+            return f'`{bind_vars[name]}`'
+        return json.dumps(bind_vars[name])
+
+    return re.sub(r'@(@?\w+)', replace, query)
+
+
+def explain_query(db, query: str, bind_vars: dict = None) -> dict:
+    """Explain query and collect full collection scans and used indexes
+
+    Args:
+        db: ArangoDB database handle
+        query: AQL query
+        bind_vars: bind variables
+
+    Returns:
+        dict: {'scans': [collections scanned], 'indexes': [(collection, index type, fields)], 'estimated_cost': float}
+    """
+
+    plan = db.aql.explain(inline_bind_vars(query, bind_vars))
+
+    scans, indexes = [], []
+    for node in plan.get('nodes', []):
+        if node['type'] == 'EnumerateCollectionNode':
+            scans.append(node['collection'])
+        elif node['type'] == 'IndexNode':
+            for index in node.get('indexes', []):
+                indexes.append((node['collection'], index['type'], index['fields']))
+
+    return {'scans': scans, 'indexes': indexes, 'estimated_cost': plan.get('estimatedCost')}
+
+
+def advise_indexes(db, queries: List[Tuple[str, dict]]) -> List[dict]:
+    """Explain named AQL queries and flag full collection scans
+
+    Args:
+        db: ArangoDB database handle
+        queries: (AQLQuery name, sample bind variables) - see aql_queries
+
+    Returns:
+        List[dict]: explain_query result with name and full_scan flag for each query
+    """
+
+    reports = []
+    for (name, bind_vars) in queries:
+        try:
+            report = explain_query(db, aql_queries[name].query, bind_vars)
+        except Exception as e:
+            report = {'scans': [], 'indexes': [], 'estimated_cost': None, 'error': str(e)}
+
+        report.update({'name': name, 'full_scan': len(report['scans']) > 0})
+        reports.append(report)
+
+    return reports
+
+
 def get_belns_handle(client, username=None, password=None):
     """Get BEL namespace arango db handle"""
 
@@ -190,6 +514,12 @@ def get_belns_handle(client, username=None, password=None):
     except Exception:
         pass
 
+    # Added separately so that existing belns databases pick up the index
+    try:
+        belns_db.collection(equiv_nodes_name).add_hash_index(fields=['cluster_id'], unique=False)
+    except Exception:
+        pass
+
     try:
         belns_db.create_collection(equiv_edges_name, edge=True, index_bucket_count=64)
     except Exception:
@@ -201,6 +531,13 @@ def get_belns_handle(client, username=None, password=None):
     except Exception:
         pass
 
+    # Added separately so that existing belns databases pick up the indexes
+    try:
+        belns_db.collection(ortholog_nodes_name).add_hash_index(fields=['group_id'], unique=False)
+        belns_db.collection(ortholog_nodes_name).add_hash_index(fields=['tax_id'], unique=False)
+    except Exception:
+        pass
+
     try:
         belns_db.create_collection(ortholog_edges_name, edge=True, index_bucket_count=64)
     except Exception:
@@ -261,46 +598,186 @@ def delete_database(client, db_name, username=None, password=None):
         log.warn('No arango database {db_name} to delete, does not exist')
 
 
-def batch_load_docs(db, doc_iterator, on_duplicate='replace'):
+doc_size_sample_every = 100  # batch_load_docs measures the JSON size of every 100th document
+
+
+def batch_load_docs(db, doc_iterator, on_duplicate='replace', batch_size: int = 1000, batch_bytes: int = 4000000, max_workers: int = 4, retries: int = 3):
     """Batch load documents
 
+    Documents are buffered per collection.  A collection's buffer is imported as soon as
+    it holds batch_size documents or batch_bytes of JSON (estimated from a sample of each
+    collection's documents), so nearly empty collections are not flushed along with busy ones.  Up to max_workers imports run concurrently and
+    imports failing with a transient error (connection problem, server busy) are retried.
+
     Args:
         db: ArangoDB client database handle
         doc_iterator:  function that yields (collection_name, doc_key, doc)
         on_duplicate: defaults to replace, but can be error, update, replace or ignore
+        batch_size: max number of documents per import request
+        batch_bytes: max size of the JSON documents per import request
+        max_workers: number of import requests in flight
+        retries: number of times to retry an import after a transient error
 
         https://python-driver-for-arangodb.readthedocs.io/en/master/specs.html?highlight=import_bulk#arango.collection.StandardCollection.import_bulk
+
+    Returns:
+        dict: load report - {collection_name: {'docs', 'batches', 'created', 'updated', 'ignored', 'empty', 'errors', 'failed_batches'}}
     """
 
-    batch_size = 100
+    if on_duplicate not in ['error', 'update', 'replace', 'ignore']:
+        log.error(f'Bad parameter for on_duplicate: {on_duplicate}')
+        return
 
     counter = 0
     collections = {}
     docs = {}
+    docs_bytes = {}
+    doc_sizes = {}  # collection_name: (sampled docs, sampled bytes)
+    report = {}
+    futures = set()
 
-    if on_duplicate not in ['error', 'update', 'replace', 'ignore']:
-        log.error(f'Bad parameter for on_duplicate: {on_duplicate}')
-        return
+    def import_batch(collection_name, batch):
+        for attempt in range(retries + 1):
+            try:
+                result = collections[collection_name].import_bulk(batch, on_duplicate=on_duplicate, halt_on_error=False)
+                return (collection_name, len(batch), result)
+            except Exception as e:
+                if attempt == retries or not is_transient_error(e):
+                    log.error(f'Bulk import arangodb failed for {collection_name}: {e}')
+                    return (collection_name, len(batch), None)
+
+                log.warning(f'Bulk import arangodb retry {attempt + 1} for {collection_name}: {e}')
+                time.sleep(2 ** attempt)
+
+    def collect(done):
+        for future in done:
+            (collection_name, batch_cnt, result) = future.result()
+            stats = report[collection_name]
+            stats['batches'] += 1
+            if result is None:
+                stats['failed_batches'] += 1
+                stats['errors'] += batch_cnt
+                continue
+            for key in ['created', 'updated', 'ignored', 'empty', 'errors']:
+                stats[key] += result.get(key, 0)
+
+    def doc_size(collection_name, doc):
+        """JSON size of doc - estimated from every doc_size_sample_every-th doc of the collection"""
+
+        (sampled_cnt, sampled_bytes) = doc_sizes.get(collection_name, (0, 0))
+        if (report[collection_name]['docs'] - 1) % doc_size_sample_every == 0:
+            sampled_cnt += 1
+            sampled_bytes += len(codec.dumps(doc))
+            doc_sizes[collection_name] = (sampled_cnt, sampled_bytes)
+
+        return sampled_bytes / sampled_cnt
+
+    def flush(executor, collection_name):
+        nonlocal futures
+
+        if len(futures) >= max_workers * 2:
+            (done, futures) = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            collect(done)
+
+        futures.add(executor.submit(import_batch, collection_name, docs[collection_name]))
+        docs[collection_name] = []
+        docs_bytes[collection_name] = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (collection_name, doc) in doc_iterator:
+            if collection_name not in collections:
+                collections[collection_name] = db.collection(collection_name)
+                docs[collection_name] = []
+                docs_bytes[collection_name] = 0
+                report[collection_name] = {'docs': 0, 'batches': 0, 'created': 0, 'updated': 0, 'ignored': 0, 'empty': 0, 'errors': 0, 'failed_batches': 0}
+
+            counter += 1
+            report[collection_name]['docs'] += 1
+
+            docs[collection_name].append(doc)
+            docs_bytes[collection_name] += doc_size(collection_name, doc)
+
+            if len(docs[collection_name]) >= batch_size or docs_bytes[collection_name] >= batch_bytes:
+                flush(executor, collection_name)
+
+            if counter % 100000 == 0:
+                log.info(f'Bulk import arangodb: {counter}')
+
+        for collection_name in docs:
+            if docs[collection_name]:
+                flush(executor, collection_name)
+
+        collect(concurrent.futures.as_completed(futures))
+
+    log.info(f'Bulk import arangodb: {counter}', report=report)
+
+    return report
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Is this an ArangoDB request error worth retrying?"""
+
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+
+    if isinstance(e, arango.exceptions.ArangoServerError) and e.http_code in [408, 429, 502, 503, 504]:
+        return True
+
+    return False
+
+
+cluster_edges_query = AQLQuery(
+    'cluster_edges',
+    'FOR edge IN @@edges RETURN [edge._from, edge._to]',
+    batch_size=10000, ttl=3600,
+)
+
+cluster_nodes_query = AQLQuery(
+    'cluster_nodes',
+    'FOR node IN @@nodes RETURN [node._key, node.@field]',
+    batch_size=10000, ttl=3600,
+)
+
+
+def materialize_clusters(db, nodes_name, edges_name, cluster_field='cluster_id'):
+    """Store the connected component id of every node on the node document
+
+    Turns graph traversals over the edges collection into a single indexed
+    lookup on nodes[cluster_field].  Nodes without edges are their own cluster.
+    Only nodes whose cluster id changed are written back.
+
+    Args:
+        db: ArangoDB client database handle
+        nodes_name: node collection name
+        edges_name: edge collection name connecting nodes in nodes_name
+        cluster_field: node attribute to store the cluster id in
+
+    Returns:
+        dict: counts of nodes, clusters and updated nodes
+    """
+
+    cursor = cluster_edges_query.execute(db, bind_vars={'@edges': edges_name})
+    prefix_len = len(nodes_name) + 1
+    clusters = utils.connected_components((_from[prefix_len:], _to[prefix_len:]) for (_from, _to) in cursor)
 
-    for (collection_name, doc) in doc_iterator:
-        if collection_name not in collections:
-            collections[collection_name] = db.collection(collection_name)
-            docs[collection_name] = []
+    counts = {'nodes': 0, 'clusters': 0, 'updated': 0}
 
-        counter += 1
+    def updates():
+        cursor = cluster_nodes_query.execute(db, bind_vars={'@nodes': nodes_name, 'field': cluster_field})
+        for (key, current_cluster_id) in cursor:
+            counts['nodes'] += 1
+            cluster_id = clusters.get(key, key)
+            if cluster_id == key:
+                counts['clusters'] += 1
+            if cluster_id != current_cluster_id:
+                counts['updated'] += 1
+                yield (nodes_name, {'_key': key, cluster_field: cluster_id})
 
-        docs[collection_name].append(doc)
+    batch_load_docs(db, updates(), on_duplicate='update')
 
-        if counter % batch_size == 0:
-            log.info(f'Bulk import arangodb: {counter}')
-            for cname in docs:
-                collections[cname].import_bulk(docs[cname], on_duplicate=on_duplicate, halt_on_error=False)
-                docs[cname] = []
+    log.info(f'Materialized {nodes_name} clusters', **counts)
 
-    log.info(f'Bulk import arangodb: {counter}')
-    for cname in docs:
-        collections[cname].import_bulk(docs[cname], on_duplicate=on_duplicate, halt_on_error=False)
-        docs[cname] = []
+    return counts
 
 
 def arango_id_to_key(_id):
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Columnar (Apache Parquet) export of BEL edges
+
+Flattens the edges created by bel.edge.edges.nanopub_to_edges (or stored in the
+EdgeStore) into one row per edge for dataframe based analytics:
+
+    belc pipeline nanopubs.jsonl.gz --output_fn edges.parquet
+    belc db export_edges edgestore_edges.parquet
+
+    table = bel.edge.columnar.read_edges_table('edges.parquet', columns=['subject_canon', 'relation', 'object_canon'])
+    df = table.to_pandas()
+
+Repeated strings (canonical node names, relations, species, citations, nanopub
+ids) are dictionary encoded.  Rows are buffered and written as a parquet row
+group every row_group_size edges so memory use doesn't grow with the number of
+edges.  Edge metadata is not exported.
+
+Requires pyarrow (pip install bel[parquet]).
+"""
+
+from typing import Any, Iterable, List, Mapping
+
+import bel.db.arangodb as arangodb
+import bel.nanopub.files
+from bel.edge.queries import with_edge_context
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+import structlog
+log = structlog.getLogger(__name__)
+
+default_row_group_size = 100000
+
+export_edges_query = arangodb.AQLQuery(
+    'export_edges',
+    f"""
+    FOR edge IN @@edges
+        LET subject = DOCUMENT(edge._from)
+        LET object = DOCUMENT(edge._to)
+        RETURN {{
+            "edge": {{
+                "subject": KEEP(subject, "name", "label", "components"),
+                "relation": UNSET({with_edge_context("edge")}, "_id", "_rev", "_from", "_to", "metadata"),
+                "object": KEEP(object, "name", "label", "components")
+            }}
+        }}
+""",
+    batch_size=10000,
+    ttl=3600,
+)
+
+# (column, dictionary encoded, list)
+edge_columns = [
+    ('subject_canon', True, False),
+    ('subject_label', False, False),
+    ('subject_components', True, True),
+    ('relation', True, False),
+    ('object_canon', True, False),
+    ('object_label', False, False),
+    ('object_components', True, True),
+    ('edge_types', True, True),
+    ('species_id', True, False),
+    ('species_label', True, False),
+    ('citation', True, False),
+    ('nanopub_id', True, False),
+    ('nanopub_url', False, False),
+    ('edge_hash', False, False),
+    ('edge_key', False, False),
+    ('edge_dt', False, False),
+    ('annotations', False, True),
+]
+
+edge_column_names = [name for (name, _, _) in edge_columns]
+
+
+def check_pyarrow():
+
+    if pyarrow is None:
+        raise ImportError('Parquet edge files require pyarrow - pip install bel[parquet]')
+
+
+def edges_schema():
+    """Arrow schema of the flattened edges"""
+
+    check_pyarrow()
+
+    dict_string = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    annotation = pyarrow.struct([
+        ('type', dict_string),
+        ('id', dict_string),
+        ('label', pyarrow.string()),
+    ])
+
+    fields = []
+    for (name, dictionary_flag, list_flag) in edge_columns:
+        if name == 'annotations':
+            column_type = pyarrow.list_(annotation)
+        else:
+            column_type = dict_string if dictionary_flag else pyarrow.string()
+            if list_flag:
+                column_type = pyarrow.list_(column_type)
+
+        fields.append(pyarrow.field(name, column_type))
+
+    return pyarrow.schema(fields)
+
+
+def edge_row(edge: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Flatten edge into a row of edge_columns
+
+    Args:
+        edge: {'edge': {'subject': {...}, 'relation': {...}, 'object': {...}}}
+
+    Returns:
+        Mapping[str, Any]: row - None if not an edge
+    """
+
+    if 'edge' not in edge:
+        return None
+
+    subject = edge['edge'].get('subject', {})
+    relation = edge['edge'].get('relation', {})
+    object_ = edge['edge'].get('object', {})
+
+    annotations = []
+    for annotation in relation.get('annotations') or []:
+        annotations.append({
+            'type': annotation.get('type'),
+            'id': annotation.get('id'),
+            'label': annotation.get('label'),
+        })
+
+    return {
+        'subject_canon': subject.get('name', relation.get('subject_canon')),
+        'subject_label': subject.get('label', relation.get('subject')),
+        'subject_components': subject.get('components'),
+        'relation': relation.get('relation'),
+        'object_canon': object_.get('name', relation.get('object_canon')),
+        'object_label': object_.get('label', relation.get('object')),
+        'object_components': object_.get('components'),
+        'edge_types': relation.get('edge_types'),
+        'species_id': relation.get('species_id'),
+        'species_label': relation.get('species_label'),
+        'citation': relation.get('citation'),
+        'nanopub_id': relation.get('nanopub_id'),
+        'nanopub_url': relation.get('nanopub_url'),
+        'edge_hash': relation.get('edge_hash'),
+        'edge_key': relation.get('_key'),
+        'edge_dt': relation.get('edge_dt'),
+        'annotations': annotations,
+    }
+
+
+class ParquetEdgesWriter(bel.nanopub.files.RecordsWriter):
+    """Stream edges to a parquet file - one row group per row_group_size edges
+
+    Args:
+        fn: parquet filename
+        row_group_size: edges to buffer before writing a row group
+        flush_secs: max seconds between row groups - default is to only write full row groups
+        compression: parquet compression codec, e.g. snappy, gzip or zstd
+    """
+
+    def __init__(self, fn: str, row_group_size: int = default_row_group_size, flush_secs: float = float('inf'), compression: str = 'snappy'):
+
+        check_pyarrow()
+
+        self.fn = fn
+        self.schema = edges_schema()
+        self.row_groups_cnt = 0
+        self._columns = {name: [] for name in edge_column_names}
+
+        dictionary_columns = [name for (name, dictionary_flag, _) in edge_columns if dictionary_flag]
+        out_fh = pyarrow.parquet.ParquetWriter(
+            fn, self.schema, compression=compression, use_dictionary=dictionary_columns
+        )
+
+        super().__init__(out_fh, flush_every=row_group_size, flush_secs=flush_secs)
+
+    def write_records(self, edges):
+
+        for edge in edges:
+            row = edge_row(edge)
+            if row is None:
+                continue
+            for name in edge_column_names:
+                self._columns[name].append(row[name])
+
+    def write(self, edges):
+        """Write edges - records_cnt only counts the edge rows written"""
+
+        if not edges:
+            return
+
+        buffered_cnt = len(self._columns['relation'])
+        self.write_records(edges)
+        self._written(len(self._columns['relation']) - buffered_cnt)
+
+    def flush(self):
+        """Write buffered edges as a row group"""
+
+        if self._columns['relation']:
+            table = pyarrow.Table.from_pydict(self._columns, schema=self.schema)
+            self.out_fh.write_table(table)
+            self.row_groups_cnt += 1
+            self._columns = {name: [] for name in edge_column_names}
+
+        super().flush()
+
+    def end(self):
+        self.flush()
+
+
+def read_edges_table(fn: str, columns: List[str] = None):
+    """Read parquet edges file into an Arrow table
+
+    Args:
+        fn: parquet filename
+        columns: only read these columns, e.g. ['subject_canon', 'relation', 'object_canon']
+
+    Returns:
+        pyarrow.Table: edges - dictionary encoded columns are read as dictionary arrays (pandas categoricals)
+    """
+
+    check_pyarrow()
+
+    return pyarrow.parquet.read_table(fn, columns=columns)
+
+
+def iter_edge_rows(fn: str, columns: List[str] = None, batch_size: int = 10000) -> Iterable[Mapping[str, Any]]:
+    """Iterate over parquet edges file rows a batch at a time
+
+    Args:
+        fn: parquet filename
+        columns: only read these columns
+        batch_size: rows per batch read
+
+    Returns:
+        Iterable[Mapping[str, Any]]: rows with the requested columns
+    """
+
+    check_pyarrow()
+
+    parquet_file = pyarrow.parquet.ParquetFile(fn)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        for row in batch.to_pylist():
+            yield row
+
+
+def export_edgestore(fn: str, row_group_size: int = default_row_group_size, db=None) -> int:
+    """Export EdgeStore edges with their subject and object nodes to a parquet file
+
+    Args:
+        fn: parquet filename
+        row_group_size: edges per row group
+        db: EdgeStore database handle
+
+    Returns:
+        int: number of edges exported
+    """
+
+    if db is None:
+        db = arangodb.get_edgestore_handle(arangodb.get_client())
+
+    bind_vars = {
+        '@edges': arangodb.edgestore_edges_name,
+        'contexts': arangodb.edgestore_contexts_name,
+    }
+
+    with ParquetEdgesWriter(fn, row_group_size=row_group_size) as writer:
+        writer.write_all(export_edges_query.execute(db, bind_vars=bind_vars))
+
+    log.info('Exported EdgeStore edges', edges_cnt=writer.records_cnt, row_groups_cnt=writer.row_groups_cnt, fn=fn)
+
+    return writer.records_cnt
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Inverted subcomponent index of EdgeStore nodes
+
+Maps each node subcomponent (see bel.edge.edges.get_node_subcomponents) to the
+keys of the nodes containing it, e.g. HGNC:AKT1 -> all nodes with AKT1 in any form.
+Function names are indexed as well, e.g. complex() and pmod(), so that
+"AKT1 inside a complex" or "AKT1 with any pmod" are intersections of posting lists:
+
+    index = ComponentIndex.from_edgestore()
+    node_ids = index.node_ids(['HGNC:AKT1', 'pmod()'])
+    edges = bel.edge.queries.node_edges(node_ids)
+
+Posting lists are arrays of 64bit ints (node _keys are CityHash64 values, see
+bel.edge.keys) so millions of postings fit in memory.  The index can be saved to
+and loaded from a gzipped JSONLines file with one posting list per line.
+"""
+
+import gzip
+import json
+import re
+from array import array
+from typing import Iterable, List, Mapping
+
+import bel.db.arangodb as arangodb
+
+import structlog
+log = structlog.getLogger(__name__)
+
+node_components_query = arangodb.AQLQuery(
+    "get_node_components",
+    """
+    FOR node IN @@nodes
+        RETURN [node._key, node.name, node.components]
+""",
+    batch_size=10000,
+    ttl=3600,
+)
+
+
+def function_term(bel_str: str) -> str:
+    """Function name term for function strings, e.g. pmod(Ph) -> pmod(), else None"""
+
+    match = re.match(r'([A-Za-z]+)\(', bel_str)
+    if match:
+        return f'{match.group(1)}()'
+
+    return None
+
+
+def node_terms(name: str, components: List[str]) -> List[str]:
+    """Index terms for node - components and function names of node and components"""
+
+    terms = set(components or [])
+    for bel_str in [name] + list(components or []):
+        term = function_term(bel_str or '')
+        if term:
+            terms.add(term)
+
+    return list(terms)
+
+
+class ComponentIndex(object):
+    """Inverted index of node subcomponents to node _keys"""
+
+    def __init__(self):
+        self.postings = {}  # term -> array('Q') of node keys
+        self.nodes_cnt = 0
+
+    def __len__(self):
+        return len(self.postings)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.postings
+
+    def add_node(self, node_key: str, name: str, components: List[str]):
+        """Add node to index - nodes are expected to be added once"""
+
+        key = int(node_key)
+        for term in node_terms(name, components):
+            self.postings.setdefault(term, array('Q')).append(key)
+
+        self.nodes_cnt += 1
+
+    @classmethod
+    def from_edgestore(cls, db=None, nodes_coll_name: str = arangodb.edgestore_nodes_name) -> 'ComponentIndex':
+        """Build index from EdgeStore nodes in a single pass"""
+
+        if db is None:
+            db = arangodb.get_edgestore_handle(arangodb.get_client())
+
+        index = cls()
+        for (node_key, name, components) in node_components_query.execute(db, bind_vars={"@nodes": nodes_coll_name}):
+            index.add_node(node_key, name, components)
+
+        log.info("Built component index", nodes_cnt=index.nodes_cnt, terms_cnt=len(index))
+
+        return index
+
+    def count(self, term: str) -> int:
+        """Posting count - number of nodes containing term"""
+
+        return len(self.postings.get(term, ()))
+
+    def counts(self) -> Mapping[str, int]:
+        """Posting counts for all terms"""
+
+        return {term: len(keys) for term, keys in self.postings.items()}
+
+    def most_common(self, n: int = 10) -> List[tuple]:
+        """Terms with the largest posting counts"""
+
+        return sorted(self.counts().items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def node_keys(self, terms: Iterable[str]) -> List[str]:
+        """Keys of nodes containing all of the terms
+
+        Posting lists are intersected starting with the smallest one.
+
+        Args:
+            terms: components and/or function names, e.g. ['HGNC:AKT1', 'complex()']
+
+        Returns:
+            List[str]: node _keys
+        """
+
+        postings = sorted([self.postings.get(term, array('Q')) for term in terms], key=len)
+        if not postings or not postings[0]:
+            return []
+
+        keys = set(postings[0])
+        for posting in postings[1:]:
+            keys.intersection_update(posting)
+            if not keys:
+                break
+
+        return [str(key) for key in sorted(keys)]
+
+    def node_ids(self, terms: Iterable[str], nodes_coll_name: str = arangodb.edgestore_nodes_name) -> List[str]:
+        """Node _ids for nodes containing all of the terms (see node_keys)"""
+
+        return [f'{nodes_coll_name}/{key}' for key in self.node_keys(terms)]
+
+    def save(self, fn: str):
+        """Save index as gzipped JSONLines - header line then one posting list per line"""
+
+        with gzip.open(fn, 'wt') as f:
+            f.write(json.dumps({'nodes_cnt': self.nodes_cnt, 'terms_cnt': len(self)}) + '\n')
+            for term, keys in self.postings.items():
+                f.write(json.dumps({'term': term, 'count': len(keys), 'node_keys': keys.tolist()}) + '\n')
+
+    @classmethod
+    def load(cls, fn: str) -> 'ComponentIndex':
+        """Load index saved with save()"""
+
+        index = cls()
+        with gzip.open(fn, 'rt') as f:
+            index.nodes_cnt = json.loads(f.readline())['nodes_cnt']
+            for line in f:
+                posting = json.loads(line)
+                index.postings[posting['term']] = array('Q', posting['node_keys'])
+
+        return index
@@ -0,0 +1,88 @@
+"""EdgeStore node and relation _key generation
+
+Keys are bit-compatible with hashing the whole node or the relation without the
+edge_key_exclude_fields using bel.utils._create_hash_from_doc (CityHash64 of the
+bel.codec.canonical_dumps JSON document) so existing EdgeStores stay valid.
+
+Node keys are memoized by the node fields - popular nodes like p(HGNC:TNF) show up
+in thousands of edges.  Relation keys are hashed from a shallow copy of the relation
+instead of a deep copy.
+"""
+
+import functools
+from typing import Any, Mapping
+
+from cityhash import CityHash64
+
+from bel.codec import canonical_dumps
+
+# Relation fields left out of the edge _key hash
+edge_key_exclude_fields = (
+    "edge_dt",
+    "edge_hash",
+    "nanopub_dt",
+    "nanopub_url",
+    "subject_canon",
+    "object_canon",
+    "public_flag",
+    "metadata",
+)
+
+# Node fields created by bel.edge.edges.nanopub_to_edges - nodes with exactly these fields are memoized
+node_fields = ("name", "name_lc", "label", "label_lc", "components")
+
+node_key_cache_size = 2 ** 17
+
+
+@functools.lru_cache(maxsize=node_key_cache_size)
+def _node_key(name: str, name_lc: str, label: str, label_lc: str, components: tuple) -> str:
+
+    node = {
+        "name": name,
+        "name_lc": name_lc,
+        "label": label,
+        "label_lc": label_lc,
+        "components": list(components),
+    }
+    return str(CityHash64(canonical_dumps(node)))
+
+
+def node_key(node: Mapping[str, Any]) -> str:
+    """Create node _key
+
+    Args:
+        node: EdgeStore node (edge subject or object) without _key
+
+    Returns:
+        str: CityHash64 of node
+    """
+
+    if len(node) == len(node_fields) and isinstance(node.get("components"), list):
+        try:
+            return _node_key(
+                node["name"], node["name_lc"], node["label"], node["label_lc"], tuple(node["components"])
+            )
+        except (KeyError, TypeError):  # other fields or unhashable components
+            pass
+
+    return str(CityHash64(canonical_dumps(node)))
+
+
+def relation_key(relation: Mapping[str, Any]) -> str:
+    """Create edge relation _key
+
+    Args:
+        relation: EdgeStore relation including _from and _to
+
+    Returns:
+        str: CityHash64 of relation without the edge_key_exclude_fields
+    """
+
+    relation_hash = {key: val for key, val in relation.items() if key not in edge_key_exclude_fields}
+    return str(CityHash64(canonical_dumps(relation_hash)))
+
+
+def node_key_cache_info():
+    """Node key memoization hits, misses and size"""
+
+    return _node_key.cache_info()
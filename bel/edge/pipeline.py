@@ -11,12 +11,18 @@ import itertools
 import json
 import datetime
 import os.path
+import time
 import urllib
+from typing import Any, Iterable, List, Mapping
 
 import bel.utils as utils
 import bel.db.arangodb as arangodb
 import bel.nanopub.files as files
+import bel.nanopub.nanopubs
 import bel.edge.edges
+from bel.edge.keys import edge_key_exclude_fields, node_key, relation_key
+from bel.edge.queries import edge_context_fields, with_edge_context
+from bel.Config import config
 
 import structlog
 
@@ -24,35 +30,197 @@ log = structlog.getLogger(__name__)
 
 client = arangodb.get_client()
 edgestore_db = arangodb.get_edgestore_handle(client)
+belns_db = arangodb.get_belns_handle(client)
 
 db = {"NanopubStore": client.db("NanopubStore"), "BackboneStore": client.db("BackboneStore")}
 
 edges_coll_name = arangodb.edgestore_edges_name
 nodes_coll_name = arangodb.edgestore_nodes_name
+contexts_coll_name = arangodb.edgestore_contexts_name
+
+# Relation fields left out of the edge _key hash (edge_key_exclude_fields) can change
+#    without changing the edge and are patched in place by differential updates
+edge_patch_fields = [field for field in edge_key_exclude_fields if field != "edge_dt"]
+
+# Nanopub state fields that must all match the stored pipeline state to skip a nanopub
+nanopub_state_fields = [
+    "nanopub_hash",
+    "content_hash",
+    "metadata_hash",
+    "bel_version",
+    "bel_package_version",
+    "resource_versions",
+    "orthologize_targets",
+    "normalized",
+]
+
+resource_versions_ttl = 300  # seconds to cache resource versions
+_resource_versions = {"versions": None, "expires": 0}
+
+
+edges_for_nanopub_query = arangodb.AQLQuery("get_edges_for_nanopub", f"""
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id == @nanopub_id
+        LIMIT 1
+        RETURN {with_edge_context()}
+""")
+
+edges_with_context_query = arangodb.AQLQuery("get_edges_with_context", f"""
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id == @nanopub_id
+        RETURN {with_edge_context()}
+""")
+
+nanopub_query = arangodb.AQLQuery("get_nanopub", """
+    FOR nanopub IN @@collection
+        FILTER nanopub._key == @nanopub_id
+        RETURN nanopub
+""")
+
+remove_nanopub_edges_query = arangodb.AQLQuery("remove_nanopub_edges", """
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id == @nanopub_id
+        REMOVE edge IN @@edges
+""")
+
+nanopub_edge_keys_query = arangodb.AQLQuery("get_nanopub_edge_keys", """
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id == @nanopub_id
+        RETURN MERGE({_key: edge._key}, KEEP(edge, @fields))
+""")
+
+remove_edges_by_key_query = arangodb.AQLQuery("remove_edges_by_key", """
+    FOR key IN @keys
+        REMOVE key IN @@edges OPTIONS { ignoreErrors: true }
+""")
+
+edges_update_ts_query = arangodb.AQLQuery("get_edges_update_ts", """
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id IN @nanopub_ids
+        COLLECT nanopub_id = edge.nanopub_id AGGREGATE update_ts = MAX(edge.metadata.`gd:updateTS`)
+        RETURN [nanopub_id, update_ts || DOCUMENT(@contexts, nanopub_id).metadata.`gd:updateTS`]
+""", batch_size=10000)
+
+resource_versions_query = arangodb.AQLQuery("get_resource_versions", """
+    FOR doc IN @@collection
+        RETURN [doc._key, doc.metadata.version]
+""")
+
+remove_nanopub_errors_query = arangodb.AQLQuery("remove_nanopub_errors", """
+    FOR e IN pipeline_errors
+        FILTER e.nanopub_id == @nanopub_id
+        REMOVE e IN pipeline_errors
+""")
+
+purge_edges_query = arangodb.AQLQuery("purge_nanopub_edges", """
+    FOR edge IN @@edges
+        FILTER edge.nanopub_id IN @nanopub_ids
+        REMOVE edge IN @@edges
+        RETURN [OLD._from, OLD._to]
+""", batch_size=10000)
+
+purge_errors_query = arangodb.AQLQuery("purge_nanopub_errors", """
+    FOR e IN @@errors
+        FILTER e.nanopub_id IN @nanopub_ids
+        REMOVE e IN @@errors
+        RETURN 1
+""", batch_size=10000)
+
+# Missing keys are ignored and return null instead of the removed document's _key
+purge_docs_by_key_query = arangodb.AQLQuery("purge_docs_by_key", """
+    FOR key IN @keys
+        REMOVE key IN @@collection OPTIONS { ignoreErrors: true }
+        RETURN OLD._key
+""", batch_size=10000)
+
+# Remove nodes without any incident edges - separate _from/_to lookups to use the edge index
+remove_orphan_nodes_query = arangodb.AQLQuery("remove_orphan_nodes", """
+    FOR node_id IN @node_ids
+        FILTER LENGTH(FOR edge IN @@edges FILTER edge._from == node_id LIMIT 1 RETURN 1) == 0
+        FILTER LENGTH(FOR edge IN @@edges FILTER edge._to == node_id LIMIT 1 RETURN 1) == 0
+        REMOVE PARSE_IDENTIFIER(node_id).key IN @@nodes OPTIONS { ignoreErrors: true }
+        RETURN OLD._key
+""", batch_size=10000)
+
+remove_all_orphan_nodes_query = arangodb.AQLQuery("remove_all_orphan_nodes", """
+    FOR node IN @@nodes
+        FILTER LENGTH(FOR edge IN @@edges FILTER edge._from == node._id LIMIT 1 RETURN 1) == 0
+        FILTER LENGTH(FOR edge IN @@edges FILTER edge._to == node._id LIMIT 1 RETURN 1) == 0
+        REMOVE node IN @@nodes
+        RETURN 1
+""", batch_size=10000)
+
+# EdgeStore consumer access paths
+edges_by_edge_hash_query = arangodb.AQLQuery("get_edges_by_edge_hash", """
+    FOR edge IN @@edges
+        FILTER edge.edge_hash == @edge_hash
+        RETURN edge
+""")
+
+edges_by_subject_query = arangodb.AQLQuery("get_edges_by_subject_canon", """
+    FOR edge IN @@edges
+        FILTER edge.subject_canon == @subject_canon
+        RETURN edge
+""")
+
+edges_by_object_query = arangodb.AQLQuery("get_edges_by_object_canon", """
+    FOR edge IN @@edges
+        FILTER edge.object_canon == @object_canon
+        RETURN edge
+""")
+
+edges_by_species_query = arangodb.AQLQuery("get_edges_by_species", """
+    FOR edge IN @@edges
+        FILTER edge.species_id == @species_id
+        RETURN edge
+""")
+
+edges_updated_since_query = arangodb.AQLQuery("get_edges_updated_since", """
+    FOR edge IN @@edges
+        FILTER edge.metadata.`gd:updateTS` > @update_ts
+        SORT edge.metadata.`gd:updateTS`
+        LIMIT @limit
+        RETURN edge
+""")
+
+# Standard EdgeStore query set with sample bind variables for arangodb.advise_indexes
+edgestore_standard_queries = [
+    ("get_edges_for_nanopub", {"@edges": edges_coll_name, "contexts": contexts_coll_name, "nanopub_id": "_"}),
+    ("get_nanopub_edge_keys", {"@edges": edges_coll_name, "nanopub_id": "_", "fields": edge_patch_fields}),
+    ("get_edges_update_ts", {"@edges": edges_coll_name, "contexts": contexts_coll_name, "nanopub_ids": ["_"]}),
+    ("remove_nanopub_edges", {"@edges": edges_coll_name, "nanopub_id": "_"}),
+    ("remove_nanopub_errors", {"nanopub_id": "_"}),
+    ("purge_nanopub_edges", {"@edges": edges_coll_name, "nanopub_ids": ["_"]}),
+    ("purge_nanopub_errors", {"@errors": arangodb.edgestore_pipeline_errors_name, "nanopub_ids": ["_"]}),
+    ("remove_orphan_nodes", {"@nodes": nodes_coll_name, "@edges": edges_coll_name, "node_ids": ["nodes/_"]}),
+    ("get_edges_by_edge_hash", {"@edges": edges_coll_name, "edge_hash": "_"}),
+    ("get_edges_by_subject_canon", {"@edges": edges_coll_name, "subject_canon": "_"}),
+    ("get_edges_by_object_canon", {"@edges": edges_coll_name, "object_canon": "_"}),
+    ("get_edges_by_species", {"@edges": edges_coll_name, "species_id": "TAX:9606"}),
+    ("get_edges_updated_since", {"@edges": edges_coll_name, "update_ts": "1900-01-01", "limit": 1000}),
+]
 
 
 def get_edges_for_nanopub(nanopub_id):
-    query = f"""
-        FOR edge IN edges
-            FILTER edge.nanopub_id == "{nanopub_id}"
-            LIMIT 1
-            RETURN edge
-    """
+    bind_vars = {"@edges": edges_coll_name, "contexts": contexts_coll_name, "nanopub_id": nanopub_id}
     try:
-        result = [edge for edge in edgestore_db.aql.execute(query)]
+        result = [edge for edge in edges_for_nanopub_query.execute(edgestore_db, bind_vars=bind_vars)]
         return result[0]
     except Exception as e:
         return None
 
 
+def get_edges_with_context(nanopub_id: str) -> List[dict]:
+    """Get nanopub edges with annotations and metadata whether normalized or not"""
+
+    bind_vars = {"@edges": edges_coll_name, "contexts": contexts_coll_name, "nanopub_id": nanopub_id}
+    return [edge for edge in edges_with_context_query.execute(edgestore_db, bind_vars=bind_vars)]
+
+
 def get_nanopub(nanopub_id, db_name, collection_name):
-    query = f"""
-        FOR nanopub IN {collection_name}
-            FILTER nanopub._key == "{nanopub_id}"
-            RETURN nanopub
-    """
+    bind_vars = {"@collection": collection_name, "nanopub_id": nanopub_id}
 
-    result = [nanopub for nanopub in db[db_name].aql.execute(query)]
+    result = [nanopub for nanopub in nanopub_query.execute(db[db_name], bind_vars=bind_vars)]
     if len(result) > 0:
         return result[0]
     else:
@@ -60,22 +228,336 @@ def get_nanopub(nanopub_id, db_name, collection_name):
         return {}
 
 
+def get_resource_versions() -> dict:
+    """Get terminology and ortholog resource versions loaded into BEL DB
+
+    Cached for resource_versions_ttl seconds
+
+    Returns:
+        Mapping[str, str]: resource metadata key (e.g. Namespace_HGNC) -> version
+    """
+
+    if _resource_versions["versions"] is None or _resource_versions["expires"] < time.time():
+        bind_vars = {"@collection": arangodb.belns_metadata_name}
+        try:
+            versions = {key: version for (key, version) in resource_versions_query.execute(belns_db, bind_vars=bind_vars)}
+        except Exception as e:
+            log.error(f"Could not get resource versions  msg: {e}")
+            versions = {}
+
+        _resource_versions["versions"] = versions
+        _resource_versions["expires"] = time.time() + resource_versions_ttl
+
+    return _resource_versions["versions"]
+
+
+def get_nanopub_state(nanopub: dict, orthologize_targets: list = []) -> dict:
+    """Collect everything the nanopub's edges depend on
+
+    The hash_nanopub digest covers the nanopub type, citation, assertions and annotations
+    but ignores case and annotation labels, so the assertions and annotations are also
+    hashed as written (hash_nanopub_content) as they are copied into the edges.
+    The metadata is hashed separately (without gd:updateTS) as it is copied into the edges.
+    The EdgeStore layout (bel_api.edgestore_normalized) is included so that all nanopubs
+    are reloaded when it changes.
+
+    Args:
+        nanopub: nanopub document
+        orthologize_targets: species the edges are orthologized to
+
+    Returns:
+        dict: pipeline state for nanopub
+    """
+
+    metadata = copy.deepcopy(nanopub["nanopub"].get("metadata", {}))
+    metadata.pop("gd:updateTS", None)
+
+    return {
+        "nanopub_hash": bel.nanopub.nanopubs.hash_nanopub(copy.deepcopy(nanopub)),
+        "content_hash": bel.nanopub.nanopubs.hash_nanopub_content(nanopub),
+        "metadata_hash": utils._create_hash_from_doc(metadata),
+        "bel_version": nanopub["nanopub"]["type"].get("version"),
+        "bel_package_version": config["bel"].get("version"),
+        "resource_versions": get_resource_versions(),
+        "orthologize_targets": sorted(orthologize_targets),
+        "normalized": is_normalized(),
+    }
+
+
+def get_pipeline_state(nanopub_id: str) -> dict:
+    """Get stored pipeline state for nanopub"""
+
+    try:
+        return edgestore_db.collection(arangodb.edgestore_pipeline_name).get(nanopub_id)
+    except Exception as e:
+        log.debug(f"Could not get pipeline state for nanopub: {nanopub_id}  msg: {e}")
+        return None
+
+
+def save_pipeline_state(nanopub_id: str, nanopub_url: str, state: dict):
+    """Store pipeline state for nanopub edges loaded into the Edgestore"""
+
+    doc = copy.deepcopy(state)
+    doc.update({"_key": nanopub_id, "nanopub_url": nanopub_url, "state_dt": utils.dt_utc_formatted()})
+    try:
+        edgestore_db.collection(arangodb.edgestore_pipeline_name).insert(doc, overwrite=True, silent=True)
+    except Exception as e:
+        log.error(f"Could not save pipeline state for nanopub: {nanopub_id}  msg: {e}")
+
+
+def remove_pipeline_state(nanopub_id: str):
+    """Remove stored pipeline state so that the nanopub is reprocessed"""
+
+    try:
+        edgestore_db.collection(arangodb.edgestore_pipeline_name).delete(nanopub_id, ignore_missing=True)
+    except Exception as e:
+        log.debug(f"Could not remove pipeline state for nanopub: {nanopub_id}  msg: {e}")
+
+
+def is_nanopub_unchanged(state: dict, stored_state: dict) -> bool:
+    """Are the nanopub, BEL version and resource versions unchanged since the stored state?"""
+
+    if not stored_state:
+        return False
+
+    return all(state[field] == stored_state.get(field) for field in nanopub_state_fields)
+
+
+def nanopub_id_from_url(nanopub_url: str) -> str:
+    """Nanopub id is the basename of the nanopub url path"""
+
+    url_comps = urllib.parse.urlparse(nanopub_url)
+    return os.path.basename(url_comps.path)
+
+
+def prefetch_nanopubs(
+    nanopub_ids: List[str], db_name: str = "NanopubStore", collection_name: str = "Nanopub"
+) -> Mapping[str, dict]:
+    """Collect everything needed to check if nanopubs need processing
+
+    Three requests for the whole list of nanopub ids instead of three queries per nanopub:
+    nanopubs and pipeline states by key using the document API and the
+    latest edge gd:updateTS per nanopub_id using a single grouped AQL query.
+
+    Args:
+        nanopub_ids: nanopub ids
+        db_name: database holding the nanopubs
+        collection_name: collection holding the nanopubs
+
+    Returns:
+        Mapping[str, dict]: nanopub_id -> {"nanopub": nanopub or None, "edge_update_ts": latest edge gd:updateTS
+            or None, "pipeline_state": stored pipeline state or None}
+    """
+
+    prefetched = {nanopub_id: {"nanopub": None, "edge_update_ts": None, "pipeline_state": None} for nanopub_id in nanopub_ids}
+
+    try:
+        for nanopub in db[db_name].collection(collection_name).get_many(nanopub_ids):
+            prefetched[nanopub["_key"]]["nanopub"] = nanopub
+    except Exception as e:
+        log.error(f"Could not GET nanopubs from {db_name} :: {collection_name}  msg: {e}")
+
+    bind_vars = {"@edges": edges_coll_name, "contexts": contexts_coll_name, "nanopub_ids": nanopub_ids}
+    try:
+        for (nanopub_id, update_ts) in edges_update_ts_query.execute(edgestore_db, bind_vars=bind_vars):
+            if nanopub_id in prefetched:
+                prefetched[nanopub_id]["edge_update_ts"] = update_ts
+    except Exception as e:
+        log.error(f"Could not get edge update timestamps for nanopubs  msg: {e}")
+
+    try:
+        for state in edgestore_db.collection(arangodb.edgestore_pipeline_name).get_many(nanopub_ids):
+            prefetched[state["_key"]]["pipeline_state"] = state
+    except Exception as e:
+        log.debug(f"Could not get pipeline states for nanopubs  msg: {e}")
+
+    return prefetched
+
+
+def purge_nanopubs(
+    nanopub_urls: Iterable[str],
+    chunk_size: int = 1000,
+    full_node_gc: bool = False,
+    edges_coll_name: str = edges_coll_name,
+    nodes_coll_name: str = nodes_coll_name,
+) -> Mapping[str, Any]:
+    """Bulk purge of nanopubs deleted upstream from the EdgeStore
+
+    Removes the nanopubs' edges, pipeline errors, pipeline states and nanopub
+    contexts with chunked AQL queries, then removes the nodes left without any
+    edges in a single garbage collection pass over the nodes of the removed edges.
+
+    Args:
+        nanopub_urls: nanopub urls or ids, e.g. the deleted nanopubs from bel.nanopub.nanopubstore.get_nanopub_urls
+        chunk_size: nanopub ids (and node ids) per AQL query
+        full_node_gc: check all nodes for incident edges instead of only the nodes of the removed edges
+        edges_coll_name: EdgeStore edges collection
+        nodes_coll_name: EdgeStore nodes collection
+
+    Returns:
+        Mapping[str, Any]: counts of removed documents and timing in milliseconds
+    """
+
+    report = {
+        "nanopubs": 0,
+        "edges_removed": 0,
+        "errors_removed": 0,
+        "states_removed": 0,
+        "contexts_removed": 0,
+        "nodes_removed": 0,
+        "timing_ms": {},
+    }
+
+    def count(query, bind_vars):
+        """Count removed documents - ignored removes return null"""
+        return sum(1 for key in query.execute(edgestore_db, bind_vars=bind_vars) if key is not None)
+
+    start_time = datetime.datetime.now()
+
+    node_ids = set()
+    nanopub_ids = iter(dict.fromkeys(nanopub_id_from_url(nanopub_url) for nanopub_url in nanopub_urls))
+    while True:
+        chunk = list(itertools.islice(nanopub_ids, chunk_size))
+        if not chunk:
+            break
+
+        report["nanopubs"] += len(chunk)
+
+        bind_vars = {"@edges": edges_coll_name, "nanopub_ids": chunk}
+        for (from_id, to_id) in purge_edges_query.execute(edgestore_db, bind_vars=bind_vars):
+            report["edges_removed"] += 1
+            node_ids.update((from_id, to_id))
+
+        bind_vars = {"@errors": arangodb.edgestore_pipeline_errors_name, "nanopub_ids": chunk}
+        report["errors_removed"] += count(purge_errors_query, bind_vars)
+
+        bind_vars = {"@collection": arangodb.edgestore_pipeline_name, "keys": chunk}
+        report["states_removed"] += count(purge_docs_by_key_query, bind_vars)
+
+        bind_vars = {"@collection": contexts_coll_name, "keys": chunk}
+        report["contexts_removed"] += count(purge_docs_by_key_query, bind_vars)
+
+    end_time1 = datetime.datetime.now()
+    report["timing_ms"]["remove_nanopub_docs"] = round((end_time1 - start_time).total_seconds() * 1000, 1)
+
+    # Garbage collect nodes without any incident edges
+    if full_node_gc:
+        bind_vars = {"@nodes": nodes_coll_name, "@edges": edges_coll_name}
+        report["nodes_removed"] = count(remove_all_orphan_nodes_query, bind_vars)
+    else:
+        node_ids = iter(sorted(node_ids))
+        while True:
+            chunk = list(itertools.islice(node_ids, chunk_size))
+            if not chunk:
+                break
+            bind_vars = {"@nodes": nodes_coll_name, "@edges": edges_coll_name, "node_ids": chunk}
+            report["nodes_removed"] += count(remove_orphan_nodes_query, bind_vars)
+
+    end_time2 = datetime.datetime.now()
+    report["timing_ms"]["remove_orphan_nodes"] = round((end_time2 - end_time1).total_seconds() * 1000, 1)
+    report["timing_ms"]["total"] = round((end_time2 - start_time).total_seconds() * 1000, 1)
+
+    log.info("Purged nanopubs", **report)
+
+    return report
+
+
+def process_nanopubs(
+    nanopub_urls: Iterable[str],
+    db_name: str = "NanopubStore",
+    collection_name: str = "Nanopub",
+    orthologize_targets: list = [],
+    override: bool = False,
+    diff: bool = False,
+    batch_size: int = 1000,
+):
+    """Process nanopubs into edges with batched freshness checks
+
+    The nanopubs and their freshness information are collected with prefetch_nanopubs
+    in batches of batch_size so that only the nanopubs that need reprocessing
+    cost any per-nanopub queries.  A nanopub listed more than once in a batch
+    is only processed the first time.
+
+    Args:
+        nanopub_urls: nanopub urls, e.g. the modified nanopubs from bel.nanopub.nanopubstore.get_nanopub_urls
+        db_name: database holding the nanopubs
+        collection_name: collection holding the nanopubs
+        orthologize_targets: species to orthologize edges to
+        override: process the nanopubs even if they are unchanged
+        diff: only apply edge differences (see update_edges_in_db)
+        batch_size: nanopubs to prefetch per batch
+
+    Yields:
+        Tuple[str, dict]: (nanopub_url, process_nanopub result)
+    """
+
+    nanopub_urls = iter(nanopub_urls)
+    while True:
+        batch = list(itertools.islice(nanopub_urls, batch_size))
+        if not batch:
+            break
+
+        start_time = datetime.datetime.now()
+        batch_ids = list(dict.fromkeys(nanopub_id_from_url(nanopub_url) for nanopub_url in batch))
+        prefetched = prefetch_nanopubs(batch_ids, db_name=db_name, collection_name=collection_name)
+
+        delta_ms = f"{(datetime.datetime.now() - start_time).total_seconds() * 1000:.1f}"
+        log.info("Timing - Prefetch nanopubs", delta_ms=delta_ms, nanopubs_cnt=len(batch_ids))
+
+        # The prefetched state is stale once a nanopub is processed so repeats are skipped
+        processed_ids = set()
+        for nanopub_url in batch:
+            nanopub_id = nanopub_id_from_url(nanopub_url)
+            if nanopub_id in processed_ids:
+                yield (nanopub_url, {"msg": "Nanopub already processed in this batch", "success": True, "e": ""})
+                continue
+            processed_ids.add(nanopub_id)
+
+            result = process_nanopub(
+                nanopub_url,
+                db_name=db_name,
+                collection_name=collection_name,
+                orthologize_targets=orthologize_targets,
+                override=override,
+                diff=diff,
+                prefetched=prefetched[nanopub_id],
+            )
+            yield (nanopub_url, result)
+
+
 def process_nanopub(
     nanopub_url,
     db_name: str = "NanopubStore",
     collection_name: str = "Nanopub",
     orthologize_targets: list = [],
     override: bool = False,
+    diff: bool = False,
+    prefetched: dict = None,
 ):
+    """Convert nanopub into edges and load them into the EdgeStore
+
+    Args:
+        nanopub_url: url of nanopub - basename of url path is the nanopub_id
+        db_name: database holding the nanopub
+        collection_name: collection holding the nanopub
+        orthologize_targets: species to orthologize edges to
+        override: process the nanopub even if the EdgeStore edges are as new as the nanopub
+                  or the nanopub content, BEL version and resource versions are unchanged
+        diff: only apply edge removals, inserts and patches (see update_edges_in_db)
+              instead of replacing all of the nanopub's edges
+        prefetched: nanopub, latest edge gd:updateTS and pipeline state from prefetch_nanopubs
+                    to use instead of querying for them
+    """
 
-    url_comps = urllib.parse.urlparse(nanopub_url)
-    nanopub_id = os.path.basename(url_comps.path)
-    # domain = url_comps.netloc
+    nanopub_id = nanopub_id_from_url(nanopub_url)
 
     start_time = datetime.datetime.now()
 
     # collect nanopub
-    nanopub = get_nanopub(nanopub_id, db_name, collection_name)
+    if prefetched is None:
+        nanopub = get_nanopub(nanopub_id, db_name, collection_name)
+    else:
+        nanopub = prefetched["nanopub"]
     if not nanopub:
         return {
             "msg": f"Could not GET nanopub id: {nanopub_id} db_name: {db_name} collection: {collection_name}",
@@ -94,15 +576,29 @@ def process_nanopub(
     # Is nanopub in edge newer than from queue? If so, skip
     if not override:
         # collect one edge for nanopub from edgestore
-        edge = get_edges_for_nanopub(nanopub_id)
-        if edge:
-            # check if edge nanopub is newer
-            if nanopub["nanopub"]["metadata"]["gd:updateTS"] <= edge["metadata"]["gd:updateTS"]:
-                return {"msg": "Nanopub older than edge nanopub", "success": True, "e": ""}
+        if prefetched is None:
+            edge = get_edges_for_nanopub(nanopub_id)
+            edge_update_ts = edge["metadata"]["gd:updateTS"] if edge else None
+        else:
+            edge_update_ts = prefetched["edge_update_ts"]
+
+        # check if edge nanopub is newer
+        if edge_update_ts and nanopub["nanopub"]["metadata"]["gd:updateTS"] <= edge_update_ts:
+            return {"msg": "Nanopub older than edge nanopub", "success": True, "e": ""}
+
+    # Skip nanopub if content, BEL version and resource versions match the stored state
+    state = get_nanopub_state(nanopub, orthologize_targets)
+    if not override:
+        if prefetched is None:
+            stored_state = get_pipeline_state(nanopub_id)
+        else:
+            stored_state = prefetched["pipeline_state"]
+        if is_nanopub_unchanged(state, stored_state):
+            return {"msg": "Nanopub unchanged since edges were loaded", "success": True, "e": ""}
 
     end_time2 = datetime.datetime.now()
     delta_ms = f"{(end_time2 - end_time1).total_seconds() * 1000:.1f}"
-    log.info("Timing - Get edge to check nanopub", delta_ms=delta_ms)
+    log.info("Timing - Get edge and pipeline state to check nanopub", delta_ms=delta_ms)
 
     results = bel.edge.edges.nanopub_to_edges(nanopub, orthologize_targets=orthologize_targets)
 
@@ -111,7 +607,18 @@ def process_nanopub(
     log.info("Timing - Get edges for nanopub", delta_ms=delta_ms)
 
     if results["success"]:
-        load_edges_into_db(nanopub_id, nanopub["source_url"], edges=results["edges"])
+        load_results = load_edges_into_db(nanopub_id, nanopub["source_url"], edges=results["edges"], diff=diff)
+        if not load_results["success"]:
+            remove_pipeline_state(nanopub_id)
+            return {
+                "msg": f"Could not load edges into edgestore for nanopub: {nanopub_id}",
+                "edges_cnt": 0,
+                "assertions_cnt": len(nanopub["nanopub"]["assertions"]),
+                "success": False,
+                "errors": results["errors"],
+            }
+
+        save_pipeline_state(nanopub_id, nanopub["source_url"], state)
 
         end_time4 = datetime.datetime.now()
         delta_ms = f"{(end_time4 - end_time3).total_seconds() * 1000:.1f}"
@@ -129,6 +636,7 @@ def process_nanopub(
         }
 
     else:
+        remove_pipeline_state(nanopub_id)
         return {
             "msg": f'Could not process nanopub into edges - error: {results["errors"]}',
             "edges_cnt": 0,
@@ -138,43 +646,92 @@ def process_nanopub(
         }
 
 
+def import_docs(collection_name: str, docs: List[dict], on_duplicate: str = "replace") -> bool:
+    """Bulk import documents into an EdgeStore collection
+
+    Returns:
+        bool: True if the import ran and none of the documents were rejected
+    """
+
+    if not docs:
+        return True
+
+    try:
+        results = edgestore_db.collection(collection_name).import_bulk(
+            docs, on_duplicate=on_duplicate, halt_on_error=False
+        )
+    except Exception as e:
+        log.error(f"Could not load documents into {collection_name}  msg: {e}")
+        return False
+
+    if results.get("errors"):
+        log.error(
+            f"Could not load documents into {collection_name}",
+            errors=results["errors"],
+            details=results.get("details"),
+        )
+        return False
+
+    return True
+
+
 def load_edges_into_db(
     nanopub_id: str,
     nanopub_url: str,
     edges: list = [],
     edges_coll_name: str = edges_coll_name,
     nodes_coll_name: str = nodes_coll_name,
+    diff: bool = False,
+    normalized: bool = None,
 ):
-    """Load edges into Edgestore"""
+    """Load edges into Edgestore
+
+    Args:
+        nanopub_id: nanopub id the edges were computed from
+        nanopub_url: nanopub url
+        edges: edges from bel.edge.edges.nanopub_to_edges
+        edges_coll_name: EdgeStore edges collection
+        nodes_coll_name: EdgeStore nodes collection
+        diff: apply only the differences to the nanopub's current edges instead
+              of deleting and re-importing all of them
+        normalized: store annotations and metadata once in the nanopub context document
+                    instead of in every edge, defaults to bel_api.edgestore_normalized
+
+    Returns:
+        Mapping[str, Any]: success - False if the nanopub's edges, nodes or context could not
+            all be loaded - plus counts from update_edges_in_db if diff
+    """
+
+    normalized = is_normalized(normalized)
+
+    if diff:
+        return update_edges_in_db(
+            nanopub_id,
+            nanopub_url,
+            edges=edges,
+            edges_coll_name=edges_coll_name,
+            nodes_coll_name=nodes_coll_name,
+            normalized=normalized,
+        )
 
     start_time = datetime.datetime.now()
 
     # Clean out edges for nanopub in edgestore
-    query = f"""
-        FOR edge IN {edges_coll_name}
-            FILTER edge.nanopub_id == "{nanopub_id}"
-            REMOVE edge IN edges
-    """
-
     try:
-        edgestore_db.aql.execute(query)
+        remove_nanopub_edges_query.execute(edgestore_db, bind_vars={"@edges": edges_coll_name, "nanopub_id": nanopub_id})
     except Exception as e:
-        log.debug(f"Could not remove nanopub-related edges: {query}  msg: {e}")
+        log.error(f"Could not remove nanopub-related edges: {nanopub_id}  msg: {e}")
+        return {"success": False}
 
     end_time1 = datetime.datetime.now()
     delta_ms = f"{(end_time1 - start_time).total_seconds() * 1000:.1f}"
     log.info("Timing - Delete edges for nanopub", delta_ms=delta_ms)
 
     # Clean out errors for nanopub in pipeline_errors
-    query = f"""
-        FOR e IN pipeline_errors
-            FILTER e.nanopub_id == "{nanopub_id}"
-            REMOVE e IN pipeline_errors
-    """
     try:
-        edgestore_db.aql.execute(query)
+        remove_nanopub_errors_query.execute(edgestore_db, bind_vars={"nanopub_id": nanopub_id})
     except Exception as e:
-        log.debug(f"Could not remove nanopub-related errors: {query} msg: {e}")
+        log.debug(f"Could not remove nanopub-related errors: {nanopub_id} msg: {e}")
 
     end_time2 = datetime.datetime.now()
     delta_ms = f"{(end_time2 - end_time1).total_seconds() * 1000:.1f}"
@@ -182,7 +739,7 @@ def load_edges_into_db(
 
     # Collect edges and nodes to load into arangodb
     node_list, edge_list = [], []
-    for doc in edge_iterator(edges=edges):
+    for doc in edge_iterator(edges=edges, normalized=normalized):
         if doc[0] == "nodes":
             node_list.append(doc[1])
         else:
@@ -192,65 +749,241 @@ def load_edges_into_db(
     delta_ms = f"{(end_time3 - end_time2).total_seconds() * 1000:.1f}"
     log.info("Timing - Collect edges and nodes", delta_ms=delta_ms)
 
-    try:
-        results = edgestore_db.collection(edges_coll_name).import_bulk(
-            edge_list, on_duplicate="replace", halt_on_error=False
-        )
-    except Exception as e:
-        log.error(f"Could not load edges  msg: {e}")
+    success = import_docs(edges_coll_name, edge_list)
+
+    if normalized:
+        success = load_edge_contexts(edges) and success
 
     end_time4 = datetime.datetime.now()
     delta_ms = f"{(end_time4 - end_time3).total_seconds() * 1000:.1f}"
     log.info("Timing - Load edges into edgestore", delta_ms=delta_ms)
 
-    try:
-        results = edgestore_db.collection(nodes_coll_name).import_bulk(
-            node_list, on_duplicate="replace", halt_on_error=False
-        )
-    except Exception as e:
-        log.error(f"Could not load nodes  msg: {e}")
+    success = import_docs(nodes_coll_name, node_list) and success
 
     end_time5 = datetime.datetime.now()
     delta_ms = f"{(end_time5 - end_time4).total_seconds() * 1000:.1f}"
     log.info("Timing - Load nodes into edgestore", delta_ms=delta_ms)
 
+    return {"success": success}
 
-def edge_iterator(edges=[], edges_fn=None):
-    """Yield documents from edge for loading into ArangoDB"""
+
+def update_edges_in_db(
+    nanopub_id: str,
+    nanopub_url: str,
+    edges: list = [],
+    edges_coll_name: str = edges_coll_name,
+    nodes_coll_name: str = nodes_coll_name,
+    normalized: bool = None,
+):
+    """Differential update of a nanopub's edges in the Edgestore
+
+    The edge _key is a hash of the relation without the fields in edge_key_exclude_fields
+    so the existing edge _keys for the nanopub are compared against the new ones:
+
+    * existing edges missing from the new edges are removed
+    * new edges are inserted along with their nodes (existing nodes are left alone)
+    * kept edges are patched in place only if one of the edge_patch_fields changed
+
+    A re-curated nanopub that only changed metadata results in a handful of patches
+    instead of deleting and re-importing all of its edges and nodes.  Edges stored in
+    the other layout (normalized or inline annotations and metadata) are all reloaded.
+
+    Args:
+        nanopub_id: nanopub id the edges were computed from
+        nanopub_url: nanopub url
+        edges: edges from bel.edge.edges.nanopub_to_edges
+        edges_coll_name: EdgeStore edges collection
+        nodes_coll_name: EdgeStore nodes collection
+        normalized: store annotations and metadata once in the nanopub context document
+                    (replaced on every update) instead of in every edge
+
+    Returns:
+        Mapping[str, Any]: success - False if any of the differences could not be applied -
+            and counts of removed, inserted, patched and unchanged edges
+    """
+
+    normalized = is_normalized(normalized)
+
+    start_time = datetime.datetime.now()
+
+    # Clean out errors for nanopub in pipeline_errors
+    try:
+        remove_nanopub_errors_query.execute(edgestore_db, bind_vars={"nanopub_id": nanopub_id})
+    except Exception as e:
+        log.debug(f"Could not remove nanopub-related errors: {nanopub_id} msg: {e}")
+
+    # Collect new edges by _key with the nodes they need
+    #    edge_iterator yields subject node, object node and relation for each edge
+    new_edges, edge_nodes = {}, {}
+    docs = edge_iterator(edges=edges, normalized=normalized)
+    for (_, subj), (_, obj), (_, relation) in zip(docs, docs, docs):
+        new_edges[relation["_key"]] = relation
+        edge_nodes[relation["_key"]] = (subj, obj)
+
+    # Collect current edges for nanopub - context_key is only set on normalized edges
+    bind_vars = {"@edges": edges_coll_name, "nanopub_id": nanopub_id, "fields": edge_patch_fields + ["context_key"]}
+    try:
+        current_edges = {
+            edge["_key"]: edge for edge in nanopub_edge_keys_query.execute(edgestore_db, bind_vars=bind_vars)
+        }
+        layout_changed = any(("context_key" in edge) != bool(normalized) for edge in current_edges.values())
+    except Exception as e:
+        log.error(f"Could not collect current edges for nanopub: {nanopub_id}  msg: {e}")
+        current_edges, layout_changed = None, False
+
+    if current_edges is None or layout_changed:
+        if layout_changed:
+            log.info("EdgeStore layout changed - reloading all edges for nanopub", nanopub_id=nanopub_id, normalized=normalized)
+        return load_edges_into_db(
+            nanopub_id,
+            nanopub_url,
+            edges=edges,
+            edges_coll_name=edges_coll_name,
+            nodes_coll_name=nodes_coll_name,
+            normalized=normalized,
+        )
+
+    end_time1 = datetime.datetime.now()
+    delta_ms = f"{(end_time1 - start_time).total_seconds() * 1000:.1f}"
+    log.info("Timing - Collect current and new edges for nanopub", delta_ms=delta_ms)
+
+    removed = [key for key in current_edges if key not in new_edges]
+    inserted = [key for key in new_edges if key not in current_edges]
+    patches = []
+    for key in new_edges:
+        if key not in current_edges:
+            continue
+        patch = {field: new_edges[key][field] for field in edge_patch_fields if field in new_edges[key]}
+        if any(current_edges[key].get(field) != patch[field] for field in patch):
+            patch["_key"] = key
+            patch["edge_dt"] = new_edges[key].get("edge_dt")
+            patches.append(patch)
+
+    success = True
+
+    if removed:
+        try:
+            remove_edges_by_key_query.execute(edgestore_db, bind_vars={"@edges": edges_coll_name, "keys": removed})
+        except Exception as e:
+            log.error(f"Could not remove edges for nanopub: {nanopub_id}  msg: {e}")
+            success = False
+
+    if inserted:
+        node_list = {}
+        for key in inserted:
+            for node in edge_nodes[key]:
+                node_list[node["_key"]] = node
+        success = import_docs(nodes_coll_name, list(node_list.values()), on_duplicate="ignore") and success
+        success = import_docs(edges_coll_name, [new_edges[key] for key in inserted]) and success
+
+    if normalized:
+        success = load_edge_contexts(edges) and success
+
+    if patches:
+        try:
+            edgestore_db.collection(edges_coll_name).update_many(patches, merge=False, silent=True)
+        except Exception as e:
+            log.error(f"Could not patch edges for nanopub: {nanopub_id}  msg: {e}")
+            success = False
+
+    counts = {
+        "removed": len(removed),
+        "inserted": len(inserted),
+        "patched": len(patches),
+        "unchanged": len(new_edges) - len(inserted) - len(patches),
+    }
+
+    end_time2 = datetime.datetime.now()
+    delta_ms = f"{(end_time2 - end_time1).total_seconds() * 1000:.1f}"
+    log.info("Timing - Apply edge differences for nanopub", delta_ms=delta_ms, nanopub_id=nanopub_id, **counts)
+
+    return dict(counts, success=success)
+
+
+def is_normalized(normalized: bool = None) -> bool:
+    """Store edges normalized? Defaults to bel_api.edgestore_normalized configuration"""
+
+    if normalized is None:
+        return config["bel_api"].get("edgestore_normalized", False)
+    return normalized
+
+
+def edge_contexts(edges=[]):
+    """Yield nanopub context document for each nanopub in edges
+
+    The context document holds the annotations and metadata shared by all of the
+    nanopub's edges and uses the nanopub_id as the document _key.
+    """
+
+    seen = set()
+    for edge in edges:
+        relation = edge["edge"]["relation"]
+        nanopub_id = relation.get("nanopub_id") or edge.get("nanopub_id")
+        if not nanopub_id or nanopub_id in seen:
+            continue
+        seen.add(nanopub_id)
+
+        context = {
+            "_key": nanopub_id,
+            "nanopub_id": nanopub_id,
+            "nanopub_url": relation.get("nanopub_url"),
+        }
+        for field in edge_context_fields:
+            context[field] = copy.deepcopy(relation.get(field, {} if field == "metadata" else []))
+        if edge.get("nanopub_id", None):
+            context["metadata"]["nanopub_id"] = edge["nanopub_id"]
+
+        yield context
+
+
+def load_edge_contexts(edges=[]) -> bool:
+    """Load nanopub context documents for normalized edges
+
+    Returns:
+        bool: True if all of the context documents were loaded
+    """
+
+    return import_docs(contexts_coll_name, list(edge_contexts(edges)))
+
+
+def edge_iterator(edges=[], edges_fn=None, normalized: bool = False):
+    """Yield documents from edge for loading into ArangoDB
+
+    Args:
+        edges: edges from bel.edge.edges.nanopub_to_edges
+        edges_fn: edges filename
+        normalized: leave the annotations and metadata out of the relation documents and
+                    reference the nanopub context document (see edge_contexts) with context_key.
+                    The edge _key is unchanged.
+    """
 
     for edge in itertools.chain(edges, files.read_edges(edges_fn)):
 
-        subj = copy.deepcopy(edge["edge"]["subject"])
-        subj_id = str(utils._create_hash_from_doc(subj))
+        # Shallow copies - only top level fields (and metadata below) are changed
+        subj = dict(edge["edge"]["subject"])
+        subj_id = node_key(subj)
         subj["_key"] = subj_id
-        obj = copy.deepcopy(edge["edge"]["object"])
 
-        obj_id = str(utils._create_hash_from_doc(obj))
+        obj = dict(edge["edge"]["object"])
+        obj_id = node_key(obj)
         obj["_key"] = obj_id
-        relation = copy.deepcopy(edge["edge"]["relation"])
 
+        relation = dict(edge["edge"]["relation"])
         relation["_from"] = f"nodes/{subj_id}"
         relation["_to"] = f"nodes/{obj_id}"
 
         # Create edge _key
-        relation_hash = copy.deepcopy(relation)
-        relation_hash.pop("edge_dt", None)
-        relation_hash.pop("edge_hash", None)
-        relation_hash.pop("nanopub_dt", None)
-        relation_hash.pop("nanopub_url", None)
-        relation_hash.pop("subject_canon", None)
-        relation_hash.pop("object_canon", None)
-        relation_hash.pop("public_flag", None)
-        relation_hash.pop("metadata", None)
-
-        relation_id = str(utils._create_hash_from_doc(relation_hash))
-        relation["_key"] = relation_id
+        relation["_key"] = relation_key(relation)
 
         if edge.get("nanopub_id", None):
-            if "metadata" not in relation:
-                relation["metadata"] = {}
+            relation["metadata"] = dict(relation.get("metadata", {}))
             relation["metadata"]["nanopub_id"] = edge["nanopub_id"]
 
+        if normalized:
+            for field in edge_context_fields:
+                relation.pop(field, None)
+            relation["context_key"] = relation.get("nanopub_id") or edge.get("nanopub_id")
+
         yield ("nodes", subj)
         yield ("nodes", obj)
         yield ("edges", relation)
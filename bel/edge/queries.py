@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""EdgeStore queries - node neighborhoods, k-hop paths and edges by citation
+
+Results are returned a page at a time with an opaque cursor to collect the next
+page so that hubs like p(HGNC:TNF) with tens of thousands of edges can be walked
+without pulling everything into memory.  Edge pages use keyset pagination on the
+edge _key, path pages use the path offset.  Page sizes are capped at max_page_size
+and the iter_* generators stop after max_results.
+
+Neighborhood edges are looked up with the edge index on _from/_to so every page
+collects and sorts all of the node's edges with _key > cursor - a full walk of a hub
+costs O(pages * edges).  Path pages re-run the traversal up to the page offset; the
+edge_types and species_id filters prune the traversal so it doesn't expand paths
+through non-matching edges.
+
+The ArangoDB cursors fetch batch_size results per round trip from server-side
+streaming cursors so the server doesn't materialize a page before returning the
+first batch.  The stream option is dropped with a warning by python-arango versions
+that don't support it (e.g. 4.x) and can be turned off per query in bel_api.aql_queries.
+"""
+
+import json
+from typing import Any, Iterable, List, Mapping
+
+import bel.db.arangodb as arangodb
+
+import structlog
+log = structlog.getLogger(__name__)
+
+max_page_size = 1000  # maximum edges or paths per page
+max_hops = 3  # maximum path length for k-hop path queries
+
+# Relation fields moved into the nanopub context document for normalized edges
+edge_context_fields = ["annotations", "metadata"]
+
+_edgestore_db = None
+
+
+def get_edgestore_db():
+    """EdgeStore database handle - created on first use"""
+
+    global _edgestore_db
+    if _edgestore_db is None:
+        _edgestore_db = arangodb.get_edgestore_handle(arangodb.get_client())
+
+    return _edgestore_db
+
+
+def with_edge_context(edge_var: str = "edge") -> str:
+    """AQL expression returning the edge with its nanopub context merged back in
+
+    Normalized edges (see bel.edge.pipeline.edge_iterator) reference the nanopub context
+    document holding the annotations and metadata with context_key.  Edges stored with
+    their annotations and metadata are returned unchanged.
+
+    The query using the expression needs the @contexts bind variable set to
+    the nanopub contexts collection name (arangodb.edgestore_contexts_name).
+
+    Args:
+        edge_var: AQL variable holding the edge
+
+    Returns:
+        str: AQL expression
+    """
+
+    return (
+        f'(HAS({edge_var}, "context_key") ? '
+        f'MERGE({edge_var}, KEEP(DOCUMENT(@contexts, {edge_var}.context_key), {json.dumps(edge_context_fields)})) '
+        f': {edge_var})'
+    )
+
+
+# Shared edge filters - @edge_types matches edges with any of the listed edge types
+edge_filters = """
+        FILTER @edge_types == null OR LENGTH(INTERSECTION(edge.edge_types, @edge_types)) > 0
+        FILTER @species_id == null OR edge.species_id == @species_id
+"""
+
+# Same filters as a single condition for traversals
+edge_match = (
+    "(@edge_types == null OR LENGTH(INTERSECTION(edge.edge_types, @edge_types)) > 0) "
+    "AND (@species_id == null OR edge.species_id == @species_id)"
+)
+
+neighborhood_node_filters = {
+    "name": "FILTER node.name == @node",
+    "component": "FILTER @node IN node.components",
+}
+
+neighborhood_edge_filters = {
+    "outbound": "FILTER edge._from IN node_ids",
+    "inbound": "FILTER edge._to IN node_ids",
+    "any": "FILTER edge._from IN node_ids OR edge._to IN node_ids",
+}
+
+# The edge index on _from/_to returns all of the node's edges - each page filters
+#    them by _key > @after and sorts them (see module docstring)
+neighborhood_queries = {}
+for (node_by, node_filter) in neighborhood_node_filters.items():
+    for (direction, edge_filter) in neighborhood_edge_filters.items():
+        neighborhood_queries[(node_by, direction)] = arangodb.AQLQuery(
+            f"get_neighborhood_by_{node_by}_{direction}",
+            f"""
+    LET node_ids = (
+        FOR node IN @@nodes
+            {node_filter}
+            RETURN node._id
+    )
+    FOR edge IN @@edges
+        {edge_filter}
+        FILTER edge._key > @after
+        {edge_filters}
+        SORT edge._key
+        LIMIT @limit
+        RETURN {with_edge_context()}
+""",
+            batch_size=max_page_size,
+            stream=True,
+        )
+
+# PRUNE stops expanding at non-matching edges so only the last edge of each path
+#    needs filtering - the earlier edges were all matched before expanding past them
+k_hop_paths_query = arangodb.AQLQuery(
+    "get_k_hop_paths",
+    f"""
+    FOR start IN @@nodes
+        FILTER start.name == @node
+        FOR vertex, edge, path IN 1..@hops ANY start @@edges
+            PRUNE edge != null AND NOT ({edge_match})
+            OPTIONS {{bfs: true, uniqueVertices: "path"}}
+            FILTER {edge_match}
+            LIMIT @offset, @limit
+            RETURN {{
+                nodes: path.vertices[*].name,
+                edges: path.edges[* RETURN {{_key: CURRENT._key, subject: CURRENT.subject_canon,
+                    relation: CURRENT.relation, object: CURRENT.object_canon}}],
+            }}
+""",
+    batch_size=max_page_size,
+    stream=True,
+)
+
+node_edges_queries = {}
+for (direction, edge_filter) in neighborhood_edge_filters.items():
+    node_edges_queries[direction] = arangodb.AQLQuery(
+        f"get_node_edges_{direction}",
+        f"""
+    LET node_ids = @node_ids
+    FOR edge IN @@edges
+        {edge_filter}
+        FILTER edge._key > @after
+        {edge_filters}
+        SORT edge._key
+        LIMIT @limit
+        RETURN {with_edge_context()}
+""",
+        batch_size=max_page_size,
+        stream=True,
+    )
+
+edges_by_citation_query = arangodb.AQLQuery(
+    "get_edges_by_citation",
+    f"""
+    FOR edge IN @@edges
+        FILTER edge.citation == @citation
+        FILTER edge._key > @after
+        {edge_filters}
+        SORT edge._key
+        LIMIT @limit
+        RETURN {with_edge_context()}
+""",
+    batch_size=max_page_size,
+    stream=True,
+)
+
+# Sample bind variables for arangodb.advise_indexes
+standard_queries = [
+    (query.name, {
+        "@nodes": arangodb.edgestore_nodes_name,
+        "@edges": arangodb.edgestore_edges_name,
+        "contexts": arangodb.edgestore_contexts_name,
+        "node": "p(HGNC:TNF)",
+        "after": "",
+        "edge_types": None,
+        "species_id": None,
+        "limit": max_page_size,
+    })
+    for query in neighborhood_queries.values()
+] + [
+    (query.name, {
+        "@edges": arangodb.edgestore_edges_name,
+        "contexts": arangodb.edgestore_contexts_name,
+        "node_ids": [f"{arangodb.edgestore_nodes_name}/_"],
+        "after": "",
+        "edge_types": None,
+        "species_id": None,
+        "limit": max_page_size,
+    })
+    for query in node_edges_queries.values()
+] + [
+    ("get_edges_by_citation", {
+        "@edges": arangodb.edgestore_edges_name,
+        "contexts": arangodb.edgestore_contexts_name,
+        "citation": "_",
+        "after": "",
+        "edge_types": None,
+        "species_id": None,
+        "limit": max_page_size,
+    }),
+]
+
+
+def page_size(limit: int) -> int:
+    """Cap requested page size to max_page_size"""
+
+    return max(1, min(limit, max_page_size))
+
+
+def edges_page(query: arangodb.AQLQuery, bind_vars: dict, limit: int, cursor: str, db) -> Mapping[str, Any]:
+    """Collect page of edges sorted by _key starting after the cursor"""
+
+    limit = page_size(limit)
+    bind_vars = dict(bind_vars, after=cursor or "", limit=limit + 1)
+    bind_vars.setdefault("@edges", arangodb.edgestore_edges_name)
+    bind_vars.setdefault("contexts", arangodb.edgestore_contexts_name)
+
+    edges = list(query.execute(db or get_edgestore_db(), bind_vars=bind_vars))
+
+    next_cursor = None
+    if len(edges) > limit:
+        edges = edges[:limit]
+        next_cursor = edges[-1]["_key"]
+
+    return {"edges": edges, "cursor": next_cursor}
+
+
+def node_neighborhood(
+    node: str,
+    node_by: str = "name",
+    direction: str = "any",
+    edge_types: List[str] = None,
+    species_id: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    db=None,
+) -> Mapping[str, Any]:
+    """Get page of edges attached to node
+
+    Args:
+        node: canonical node name, e.g. p(EG:7124), or node subcomponent, e.g. EG:7124
+        node_by: 'name' or 'component' - match node by canonical name or subcomponent
+        direction: 'outbound' (node is subject), 'inbound' (node is object) or 'any'
+        edge_types: only edges with any of these edge_types, e.g. ['primary']
+        species_id: only edges for this species, e.g. TAX:9606
+        limit: page size (capped at max_page_size)
+        cursor: cursor from the previous page
+        db: EdgeStore database handle
+
+    Returns:
+        Mapping[str, Any]: {'edges': [...], 'cursor': cursor for next page or None if last page}
+    """
+
+    query = neighborhood_queries[(node_by, direction)]
+    bind_vars = {
+        "@nodes": arangodb.edgestore_nodes_name,
+        "node": node,
+        "edge_types": edge_types,
+        "species_id": species_id,
+    }
+
+    return edges_page(query, bind_vars, limit, cursor, db)
+
+
+def node_edges(
+    node_ids: List[str],
+    direction: str = "any",
+    edge_types: List[str] = None,
+    species_id: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    db=None,
+) -> Mapping[str, Any]:
+    """Get page of edges attached to any of the nodes
+
+    Used with node _ids collected from the subcomponent index (see bel.edge.components)
+
+    Args:
+        node_ids: node _ids, e.g. nodes/12345
+        direction: 'outbound' (node is subject), 'inbound' (node is object) or 'any'
+        edge_types: only edges with any of these edge_types, e.g. ['primary']
+        species_id: only edges for this species, e.g. TAX:9606
+        limit: page size (capped at max_page_size)
+        cursor: cursor from the previous page
+        db: EdgeStore database handle
+
+    Returns:
+        Mapping[str, Any]: {'edges': [...], 'cursor': cursor for next page or None if last page}
+    """
+
+    bind_vars = {"node_ids": node_ids, "edge_types": edge_types, "species_id": species_id}
+
+    return edges_page(node_edges_queries[direction], bind_vars, limit, cursor, db)
+
+
+def k_hop_paths(
+    node: str,
+    hops: int = 2,
+    edge_types: List[str] = None,
+    species_id: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    db=None,
+) -> Mapping[str, Any]:
+    """Get page of paths of up to hops edges starting at node
+
+    All edges in a path must match the edge_types and species_id filters - paths
+    are not expanded past non-matching edges.  Each page re-runs the traversal
+    up to the cursor offset.
+
+    Args:
+        node: canonical name of start node
+        hops: maximum path length (capped at max_hops)
+        edge_types: only edges with any of these edge_types
+        species_id: only edges for this species
+        limit: page size (capped at max_page_size)
+        cursor: cursor from the previous page
+        db: EdgeStore database handle
+
+    Returns:
+        Mapping[str, Any]: {'paths': [{'nodes': [...], 'edges': [...]}], 'cursor': cursor for next page or None}
+    """
+
+    limit = page_size(limit)
+    offset = int(cursor) if cursor else 0
+    bind_vars = {
+        "@nodes": arangodb.edgestore_nodes_name,
+        "@edges": arangodb.edgestore_edges_name,
+        "node": node,
+        "hops": max(1, min(hops, max_hops)),
+        "edge_types": edge_types,
+        "species_id": species_id,
+        "offset": offset,
+        "limit": limit + 1,
+    }
+
+    paths = list(k_hop_paths_query.execute(db or get_edgestore_db(), bind_vars=bind_vars))
+
+    next_cursor = None
+    if len(paths) > limit:
+        paths = paths[:limit]
+        next_cursor = str(offset + limit)
+
+    return {"paths": paths, "cursor": next_cursor}
+
+
+def edges_by_citation(
+    citation: str,
+    edge_types: List[str] = None,
+    species_id: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    db=None,
+) -> Mapping[str, Any]:
+    """Get page of edges for citation
+
+    Args:
+        citation: edge citation string, e.g. 'PubMed:12345'
+        edge_types: only edges with any of these edge_types
+        species_id: only edges for this species
+        limit: page size (capped at max_page_size)
+        cursor: cursor from the previous page
+        db: EdgeStore database handle
+
+    Returns:
+        Mapping[str, Any]: {'edges': [...], 'cursor': cursor for next page or None if last page}
+    """
+
+    bind_vars = {"citation": citation, "edge_types": edge_types, "species_id": species_id}
+
+    return edges_page(edges_by_citation_query, bind_vars, limit, cursor, db)
+
+
+def iter_pages(page_func, *args, max_results: int = 10000, result_key: str = "edges", **kwargs) -> Iterable[dict]:
+    """Yield results from all pages of a paginated query
+
+    Args:
+        page_func: node_neighborhood, k_hop_paths or edges_by_citation
+        max_results: stop after this many results
+        result_key: 'edges' or 'paths'
+
+    Yields:
+        dict: edge or path
+    """
+
+    cursor, cnt = None, 0
+    while True:
+        page = page_func(*args, cursor=cursor, **kwargs)
+        for result in page[result_key]:
+            if cnt >= max_results:
+                log.info("Stopped at max_results", max_results=max_results)
+                return
+            cnt += 1
+            yield result
+
+        cursor = page["cursor"]
+        if cursor is None:
+            return
+
+
+def iter_node_neighborhood(node: str, max_results: int = 10000, **kwargs) -> Iterable[dict]:
+    """Yield all edges attached to node (see node_neighborhood)"""
+
+    return iter_pages(node_neighborhood, node, max_results=max_results, **kwargs)
+
+
+def iter_node_edges(node_ids: List[str], max_results: int = 10000, **kwargs) -> Iterable[dict]:
+    """Yield all edges attached to any of the nodes (see node_edges)"""
+
+    return iter_pages(node_edges, node_ids, max_results=max_results, **kwargs)
+
+
+def iter_k_hop_paths(node: str, max_results: int = 10000, **kwargs) -> Iterable[dict]:
+    """Yield all paths from node (see k_hop_paths)"""
+
+    return iter_pages(k_hop_paths, node, max_results=max_results, result_key="paths", **kwargs)
+
+
+def iter_edges_by_citation(citation: str, max_results: int = 10000, **kwargs) -> Iterable[dict]:
+    """Yield all edges for citation (see edges_by_citation)"""
+
+    return iter_pages(edges_by_citation, citation, max_results=max_results, **kwargs)
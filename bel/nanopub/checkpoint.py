@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Checkpoint and resume long running nanopub file processing
+
+The checkpoint file records how many input records have been processed, the
+output file position after writing their results and processing counts.  It is
+written atomically (temp file + rename) after the output has been flushed to
+disk so it never points past durable output.
+
+On resume, the output file is truncated back to the checkpointed position,
+dropping anything written after the last checkpoint, and the already processed
+input records are skipped.  The options selecting the input records are saved in
+the checkpoint as well - resuming with different options (see changed_options)
+would skip the wrong records.
+
+Compressed output (see bel.compression) is written as a sequence of complete
+BGZF blocks or zstd frames - each checkpoint flushes the compressor so that the
+checkpointed position is a valid end of file.  Readers (gzip.open, zcat, zstd)
+see the same decompressed content as a file written without checkpoints.
+"""
+
+import json
+import os
+import sys
+from typing import Any, List, Mapping
+
+import bel.compression as compression
+import bel.utils as utils
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Checkpoint(object):
+    """Durable processing state in a JSON checkpoint file"""
+
+    def __init__(self, checkpoint_fn: str):
+        self.checkpoint_fn = checkpoint_fn
+
+    def load(self) -> Mapping[str, Any]:
+        """Load checkpoint state
+
+        Returns:
+            Mapping[str, Any]: checkpoint state or None if there is no checkpoint
+        """
+
+        if not os.path.exists(self.checkpoint_fn):
+            return None
+
+        with open(self.checkpoint_fn, 'rt') as f:
+            return json.load(f)
+
+    def save(self, state: Mapping[str, Any]):
+        """Atomically save checkpoint state"""
+
+        state = dict(state, checkpoint_dt=utils.dt_utc_formatted())
+        tmp_fn = f'{self.checkpoint_fn}.tmp'
+        with open(tmp_fn, 'wt') as f:
+            json.dump(state, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_fn, self.checkpoint_fn)
+
+    def remove(self):
+        """Remove checkpoint after successfully finishing"""
+
+        if os.path.exists(self.checkpoint_fn):
+            os.remove(self.checkpoint_fn)
+
+
+def changed_options(state: Mapping[str, Any], options: Mapping[str, Any]) -> List[str]:
+    """Options that differ from the ones saved in the checkpoint state
+
+    Unset options (None, False or empty) match options missing from the state, e.g.
+    checkpoints saved before the option existed.
+
+    Returns:
+        List[str]: names of the changed options
+    """
+
+    def normalize(value):
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+        return value or None
+
+    return [name for name in options if normalize(state.get(name)) != normalize(options[name])]
+
+
+class ResumableOutput(object):
+    """Text output file that can be checkpointed and truncated back to a checkpoint
+
+    Args:
+        output_fn: output filename, '-' for STDOUT (cannot be truncated), *.gz for gzip, *.zst for zstd
+        position: truncate output file to this position and append - None to start a new file
+    """
+
+    def __init__(self, output_fn: str, position: int = None):
+
+        self.output_fn = output_fn
+        self.compression = compression.file_compression(output_fn)
+        self._compressed = None
+
+        if output_fn == '-':
+            self._raw = None
+            if position:
+                log.warning('Cannot truncate STDOUT to checkpoint - output will continue from the checkpoint')
+            return
+
+        if position is None:
+            self._raw = open(output_fn, 'wb')
+        else:
+            self._raw = open(output_fn, 'r+b')
+            self._raw.truncate(position)
+            self._raw.seek(position)
+
+    def write(self, content: str):
+
+        if self._raw is None:
+            sys.stdout.write(content)
+            return
+
+        if self.compression:
+            if self._compressed is None:
+                self._compressed = compression.open_file(self._raw, 'wb', compression=self.compression)
+            self._compressed.write(content.encode('utf-8'))
+        else:
+            self._raw.write(content.encode('utf-8'))
+
+    def flush(self):
+        """Flush buffered output"""
+
+        if self._raw is None:
+            sys.stdout.flush()
+            return
+
+        if self._compressed is not None:
+            self._compressed.flush()
+        self._raw.flush()
+
+    def checkpoint(self) -> int:
+        """Flush output to disk
+
+        Returns:
+            int: output position to resume from
+        """
+
+        if self._raw is None:
+            sys.stdout.flush()
+            return 0
+
+        if self._compressed is not None:
+            self._compressed.flush()  # complete BGZF blocks/zstd frame - doesn't close the underlying file
+
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+        return self._raw.tell()
+
+    def close(self):
+
+        if self._raw is None:
+            return
+
+        if self._compressed is not None:
+            self._compressed.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
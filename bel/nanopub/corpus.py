@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Random access to indexed nanopub corpus files
+
+A corpus is a JSONLines nanopub file - uncompressed or BGZF compressed (*.gz files
+written by bel.compression, e.g. by belc nanopub reformat).  Indexing it creates a
+sidecar SQLite file (<corpus_fn>.idx) mapping the position (seq) of each nanopub
+in the corpus, its nanopub id, its hash_nanopub digest and its case-sensitive
+hash_nanopub_content digest to the record offset:
+
+    belc nanopub index nanopubs.jsonl.gz
+    belc nanopub extract nanopubs.jsonl.gz --nanopub_id 01CA...
+    belc nanopub diff nanopubs.jsonl.gz nanopubs.previous.jsonl.gz
+    belc pipeline nanopubs.jsonl.gz --shard 3/8 --output_fn edges.3.jsonl.gz
+
+    with bel.nanopub.corpus.CorpusIndex('nanopubs.jsonl.gz') as corpus:
+        nanopub = corpus.get('01CA...')
+
+Offsets of BGZF corpora are virtual offsets - the compressed offset of the BGZF
+block holding the start of the record shifted left 16 bits plus the offset of the
+record in the uncompressed block - so a record is read by decompressing only the
+block(s) it is in.  Ranges of nanopubs (e.g. shards for parallel processing) are
+read by seeking to the offset of the first nanopub and streaming from there.
+"""
+
+import difflib
+import io
+import json
+import os
+import sqlite3
+import zlib
+from typing import IO, Any, Iterable, List, Mapping, Tuple
+
+import bel.codec as codec
+import bel.compression as compression
+import bel.nanopub.nanopubs
+
+import structlog
+log = structlog.getLogger(__name__)
+
+index_version = '3'
+index_extension = '.idx'
+insert_batch_size = 10000
+
+index_schema = """
+    CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS nanopubs (
+        seq INTEGER PRIMARY KEY,
+        id TEXT,
+        hash TEXT,
+        content_hash TEXT,
+        offset INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    );
+"""
+
+index_indexes = """
+    CREATE INDEX IF NOT EXISTS nanopubs_id ON nanopubs (id);
+    CREATE INDEX IF NOT EXISTS nanopubs_hash ON nanopubs (hash);
+    CREATE INDEX IF NOT EXISTS nanopubs_content_hash ON nanopubs (content_hash);
+"""
+
+
+def index_filename(corpus_fn: str) -> str:
+    """Sidecar index filename of the corpus"""
+
+    return f'{corpus_fn}{index_extension}'
+
+
+def corpus_compression(fh: IO) -> str:
+    """Corpus compression - bgzf or None
+
+    Raises:
+        ValueError: if the corpus is compressed but not as BGZF
+    """
+
+    if compression.is_bgzf(fh):
+        return 'bgzf'
+    elif compression.sniff_compression(fh):
+        raise ValueError('Random access requires an uncompressed or BGZF compressed corpus - recompress it with belc nanopub reformat -i <corpus> -o <corpus>.jsonl.gz')
+
+    return None
+
+
+def iter_corpus_records(fh: IO) -> Iterable[Tuple[int, bytes]]:
+    """Iterate over the JSONLines records of a corpus with their offsets
+
+    Args:
+        fh: binary corpus file positioned at the start
+
+    Returns:
+        Iterable[Tuple[int, bytes]]: (offset, record) - offsets are virtual offsets for BGZF corpora
+    """
+
+    if corpus_compression(fh) != 'bgzf':
+        offset = fh.tell()
+        for line in fh:
+            if line.strip():
+                yield (offset, line.rstrip(b'\r\n'))
+            offset += len(line)
+        return
+
+    record, record_offset = bytearray(), None
+    block_offset = fh.tell()
+    while True:
+        block = compression.read_bgzf_block(fh)
+        if block is None:
+            raise OSError('Not a BGZF block - corpus is truncated or corrupt')
+        if not block:
+            break
+
+        data = zlib.decompress(block, 31)
+        position = 0
+        while position < len(data):
+            if record_offset is None:
+                record_offset = (block_offset << 16) | position
+
+            end = data.find(b'\n', position)
+            if end == -1:
+                record += data[position:]
+                break
+
+            record += data[position:end]
+            if record.strip():
+                yield (record_offset, bytes(record.rstrip(b'\r')))
+            record, record_offset = bytearray(), None
+            position = end + 1
+
+        block_offset = fh.tell()
+
+    if record.strip():
+        yield (record_offset, bytes(record.rstrip(b'\r')))
+
+
+def nanopub_keys(nanopub: Mapping[str, Any]) -> Tuple[str, str, str]:
+    """Nanopub id, hash_nanopub digest and hash_nanopub_content digest - None if missing"""
+
+    if not isinstance(nanopub, dict) or not isinstance(nanopub.get('nanopub'), dict):
+        return (None, None, None)
+
+    nanopub_id = nanopub['nanopub'].get('id')
+    try:
+        digest = bel.nanopub.nanopubs.hash_nanopub(nanopub)
+    except (KeyError, AttributeError, TypeError):
+        digest = None
+
+    try:
+        content_digest = bel.nanopub.nanopubs.hash_nanopub_content(nanopub)
+    except (KeyError, AttributeError, TypeError):
+        content_digest = None
+
+    return (nanopub_id, digest, content_digest)
+
+
+def corpus_signature(corpus_fn: str) -> Mapping[str, str]:
+    """Corpus file size and modification time recorded in the index metadata
+
+    The index is out of date if either changed - e.g. a corpus rewritten in place
+    with the same size.
+    """
+
+    stat = os.stat(corpus_fn)
+
+    return {'corpus_size': str(stat.st_size), 'corpus_mtime': str(stat.st_mtime_ns)}
+
+
+def index_corpus(corpus_fn: str, index_fn: str = None) -> int:
+    """Create the sidecar index of a JSONLines nanopub corpus
+
+    Args:
+        corpus_fn: uncompressed or BGZF compressed JSONLines nanopubs file
+        index_fn: index filename - default is <corpus_fn>.idx
+
+    Returns:
+        int: number of nanopubs indexed
+    """
+
+    index_fn = index_fn or index_filename(corpus_fn)
+
+    tmp_fn = f'{index_fn}.tmp'
+    if os.path.exists(tmp_fn):
+        os.remove(tmp_fn)
+
+    conn = sqlite3.connect(tmp_fn)
+    conn.executescript(index_schema)
+
+    signature = corpus_signature(corpus_fn)
+    nanopubs_cnt = 0
+    with open(corpus_fn, 'rb') as fh:
+        corpus_type = corpus_compression(fh)
+
+        rows = []
+        for (offset, record) in iter_corpus_records(fh):
+            (nanopub_id, digest, content_digest) = nanopub_keys(codec.loads(record))
+            rows.append((nanopubs_cnt, nanopub_id, digest, content_digest, offset, len(record)))
+            nanopubs_cnt += 1
+
+            if len(rows) >= insert_batch_size:
+                conn.executemany('INSERT INTO nanopubs VALUES (?, ?, ?, ?, ?, ?)', rows)
+                rows = []
+
+        conn.executemany('INSERT INTO nanopubs VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    conn.executescript(index_indexes)
+    conn.executemany('INSERT INTO metadata VALUES (?, ?)', [
+        ('version', index_version),
+        ('compression', corpus_type or ''),
+        ('nanopubs_cnt', str(nanopubs_cnt)),
+    ] + list(signature.items()))
+    conn.commit()
+    conn.close()
+
+    os.replace(tmp_fn, index_fn)
+
+    log.info('Indexed nanopub corpus', corpus_fn=corpus_fn, index_fn=index_fn, nanopubs_cnt=nanopubs_cnt)
+
+    return nanopubs_cnt
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse shard specification, e.g. '3/8' is the 3rd of 8 shards
+
+    Returns:
+        Tuple[int, int]: (shard number starting at 1, number of shards)
+    """
+
+    try:
+        (shard_num, shards_cnt) = [int(value) for value in shard.split('/')]
+    except ValueError:
+        raise ValueError(f'Shard {shard} should be <shard>/<number of shards>, e.g. 3/8')
+
+    if not 1 <= shard_num <= shards_cnt:
+        raise ValueError(f'Shard {shard} should be between 1/{shards_cnt} and {shards_cnt}/{shards_cnt}')
+
+    return (shard_num, shards_cnt)
+
+
+class CorpusIndex(object):
+    """Indexed nanopub corpus
+
+    Args:
+        corpus_fn: JSONLines nanopubs file
+        index_fn: index filename - default is <corpus_fn>.idx
+        create: create the index if it doesn't exist
+
+    Raises:
+        ValueError: if the index is missing or out of date (corpus changed or older index_version)
+    """
+
+    def __init__(self, corpus_fn: str, index_fn: str = None, create: bool = False):
+
+        self.corpus_fn = corpus_fn
+        self.index_fn = index_fn or index_filename(corpus_fn)
+
+        if create and not os.path.exists(self.index_fn):
+            index_corpus(corpus_fn, self.index_fn)
+        elif not os.path.exists(self.index_fn):
+            raise ValueError(f'Missing index {self.index_fn} - create it with belc nanopub index {corpus_fn}')
+
+        self.conn = sqlite3.connect(self.index_fn)
+        self.metadata = dict(self.conn.execute('SELECT key, value FROM metadata'))
+
+        signature = dict(corpus_signature(corpus_fn), version=index_version)
+        if any(self.metadata.get(key) != value for (key, value) in signature.items()):
+            self.conn.close()
+            raise ValueError(f'Index {self.index_fn} is out of date - recreate it with belc nanopub index {corpus_fn}')
+
+        self.bgzf = self.metadata['compression'] == 'bgzf'
+        self.fh = open(corpus_fn, 'rb')
+
+    def __len__(self) -> int:
+
+        return int(self.metadata['nanopubs_cnt'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+
+        self.fh.close()
+        self.conn.close()
+
+    def lookup(self, nanopub_id: str = None, digest: str = None) -> List[Mapping[str, Any]]:
+        """Index entries of the nanopubs with the nanopub id or hash_nanopub digest
+
+        Returns:
+            List[Mapping[str, Any]]: [{'seq': seq, 'id': nanopub_id, 'hash': digest, 'offset': offset, 'size': size}, ...] in corpus order
+        """
+
+        if nanopub_id is not None:
+            cursor = self.conn.execute('SELECT * FROM nanopubs WHERE id = ? ORDER BY seq', (nanopub_id, ))
+        else:
+            cursor = self.conn.execute('SELECT * FROM nanopubs WHERE hash = ? ORDER BY seq', (digest, ))
+
+        columns = [column[0] for column in cursor.description]
+
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def read_record(self, offset: int, size: int) -> bytes:
+        """Read the record at offset - only the BGZF blocks holding the record are decompressed"""
+
+        if not self.bgzf:
+            self.fh.seek(offset)
+            return self.fh.read(size)
+
+        self.fh.seek(offset >> 16)
+        start = offset & 0xffff
+
+        data = b''
+        while len(data) < start + size:
+            block = compression.read_bgzf_block(self.fh)
+            if not block:
+                raise OSError(f'Record at offset {offset} is past the end of {self.corpus_fn} - recreate the index')
+            data += zlib.decompress(block, 31)
+
+        return data[start:start + size]
+
+    def get(self, nanopub_id: str = None, digest: str = None) -> Mapping[str, Any]:
+        """Get nanopub by nanopub id or hash_nanopub digest - the first one in the corpus
+
+        Returns:
+            Mapping[str, Any]: nanopub - None if not found
+        """
+
+        entries = self.lookup(nanopub_id=nanopub_id, digest=digest)
+        if not entries:
+            return None
+
+        return codec.loads(self.read_record(entries[0]['offset'], entries[0]['size']))
+
+    def seq_range(self, start_id: str = None, end_id: str = None) -> Tuple[int, int]:
+        """Range of nanopubs from the start_id nanopub through the end_id nanopub in corpus order
+
+        Returns:
+            Tuple[int, int]: (start seq, end seq) - end is exclusive
+
+        Raises:
+            KeyError: if start_id or end_id is not in the corpus
+        """
+
+        start, end = 0, len(self)
+        if start_id is not None:
+            entries = self.lookup(nanopub_id=start_id)
+            if not entries:
+                raise KeyError(f'Nanopub {start_id} not found in {self.corpus_fn}')
+            start = entries[0]['seq']
+
+        if end_id is not None:
+            entries = self.lookup(nanopub_id=end_id)
+            if not entries:
+                raise KeyError(f'Nanopub {end_id} not found in {self.corpus_fn}')
+            end = entries[-1]['seq'] + 1
+
+        return (start, end)
+
+    def shard(self, shard_num: int, shards_cnt: int) -> Tuple[int, int]:
+        """Range of nanopubs in shard shard_num (starting at 1) of shards_cnt equal sized shards
+
+        Returns:
+            Tuple[int, int]: (start seq, end seq) - end is exclusive
+        """
+
+        return ((shard_num - 1) * len(self) // shards_cnt, shard_num * len(self) // shards_cnt)
+
+    def iter_range(self, start: int = 0, end: int = None) -> Iterable[Mapping[str, Any]]:
+        """Iterate over the nanopubs from seq start up to seq end
+
+        Seeks to the first nanopub and streams from there (with parallel BGZF decompression).
+
+        Returns:
+            Iterable[Mapping[str, Any]]: nanopubs
+        """
+
+        end = len(self) if end is None else min(end, len(self))
+        if start >= end:
+            return
+
+        offset = self.conn.execute('SELECT offset FROM nanopubs WHERE seq = ?', (start, )).fetchone()[0]
+
+        fh = open(self.corpus_fn, 'rb')
+        if self.bgzf:
+            fh.seek(offset >> 16)
+            reader = compression.BGZFReader(fh)
+            f = io.BufferedReader(reader, buffer_size=compression.chunk_size)
+            f.read(offset & 0xffff)
+        else:
+            fh.seek(offset)
+            f = fh
+
+        try:
+            remaining = end - start
+            for line in f:
+                if not line.strip():
+                    continue
+                yield codec.loads(line)
+                remaining -= 1
+                if remaining == 0:
+                    break
+        finally:
+            f.close()
+
+    def select(self, nanopub_ids: Iterable[str] = None, digests: Iterable[str] = None, start_id: str = None,
+               end_id: str = None, shard: Tuple[int, int] = None) -> Iterable[Mapping[str, Any]]:
+        """Select nanopubs by nanopub id, hash_nanopub digest, id range or shard
+
+        Args:
+            nanopub_ids: nanopub ids
+            digests: hash_nanopub digests
+            start_id: first nanopub id of range in corpus order
+            end_id: last nanopub id of range in corpus order
+            shard: (shard number starting at 1, number of shards) - see parse_shard()
+
+        Returns:
+            Iterable[Mapping[str, Any]]: nanopubs
+        """
+
+        if nanopub_ids or digests:
+            for nanopub_id in nanopub_ids or []:
+                nanopub = self.get(nanopub_id=nanopub_id)
+                if nanopub is None:
+                    log.warning('Nanopub not found', nanopub_id=nanopub_id, corpus_fn=self.corpus_fn)
+                    continue
+                yield nanopub
+
+            for digest in digests or []:
+                nanopub = self.get(digest=digest)
+                if nanopub is None:
+                    log.warning('Nanopub not found', digest=digest, corpus_fn=self.corpus_fn)
+                    continue
+                yield nanopub
+
+            return
+
+        (start, end) = self.seq_range(start_id, end_id)
+        if shard:
+            (shard_start, shard_end) = self.shard(*shard)
+            (start, end) = (max(start, shard_start), min(end, shard_end))
+
+        yield from self.iter_range(start, end)
+
+
+def diff_corpora(corpus_a: CorpusIndex, corpus_b: CorpusIndex) -> Mapping[str, List[str]]:
+    """Compare the nanopubs of two indexed corpora by nanopub id and digests
+
+    A nanopub changed if its hash_nanopub digest (type, citation, assertions and
+    annotation types and ids) or its case-sensitive hash_nanopub_content digest
+    (assertions and full annotations) changed - e.g. p(MGI:akt1) -> p(MGI:Akt1)
+    or a new annotation label.  Other nanopub fields (e.g. evidence) are not compared.
+
+    Returns:
+        Mapping[str, List[str]]: {'added': [...], 'removed': [...], 'changed': [...]} nanopub ids in corpus_b compared to corpus_a
+    """
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('ATTACH DATABASE ? AS a', (corpus_a.index_fn, ))
+    conn.execute('ATTACH DATABASE ? AS b', (corpus_b.index_fn, ))
+
+    def ids(query):
+        return list(dict.fromkeys(row[0] for row in conn.execute(query)))
+
+    diff = {
+        'added': ids('SELECT id FROM b.nanopubs WHERE id IS NOT NULL AND id NOT IN (SELECT id FROM a.nanopubs WHERE id IS NOT NULL) ORDER BY seq'),
+        'removed': ids('SELECT id FROM a.nanopubs WHERE id IS NOT NULL AND id NOT IN (SELECT id FROM b.nanopubs WHERE id IS NOT NULL) ORDER BY seq'),
+        'changed': ids('SELECT b.nanopubs.id FROM b.nanopubs JOIN a.nanopubs ON a.nanopubs.id = b.nanopubs.id WHERE a.nanopubs.hash IS NOT b.nanopubs.hash OR a.nanopubs.content_hash IS NOT b.nanopubs.content_hash ORDER BY b.nanopubs.seq'),
+    }
+    conn.close()
+
+    return diff
+
+
+def diff_nanopub(corpus_a: CorpusIndex, corpus_b: CorpusIndex, nanopub_id: str) -> List[str]:
+    """Unified diff of a nanopub in two indexed corpora
+
+    Returns:
+        List[str]: diff lines - empty if the nanopubs are the same
+    """
+
+    def lines(corpus):
+        nanopub = corpus.get(nanopub_id)
+        if nanopub is None:
+            return []
+        return json.dumps(nanopub, indent=4, sort_keys=True).splitlines(keepends=True)
+
+    return list(difflib.unified_diff(lines(corpus_a), lines(corpus_b), fromfile=corpus_a.corpus_fn, tofile=corpus_b.corpus_fn))
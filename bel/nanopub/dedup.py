@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Streaming duplicate nanopub detection using hash_nanopub
+
+Merged nanopub corpora contain many duplicates - nanopubs with the same type,
+citation, assertions and annotations (see bel.nanopub.nanopubs.hash_nanopub).
+Deduplicator filters a stream of nanopubs down to the first nanopub of each
+digest so duplicates are dropped before they are parsed and processed into edges:
+
+    belc nanopub dedup -i merged.jsonl.gz -o unique.jsonl.gz --report_fn duplicates.jsonl
+    belc pipeline merged.jsonl.gz --dedup --dedup_report_fn duplicates.jsonl
+
+    dedup = bel.nanopub.dedup.Deduplicator(report_fn='duplicates.jsonl')
+    for nanopub in dedup.filter(bel.nanopub.files.read_nanopubs(fn)):
+        ...
+
+Memory use is bounded: the digests seen are kept in memory up to max_digests and
+then spilled to an on-disk SQLite table.  A Bloom filter over all digests seen is
+checked first so new nanopubs - the common case - don't need a disk lookup.  The
+Bloom filter is only a pre-check: duplicates are always confirmed with the exact
+digest so there are no false positives.
+
+The duplicate report is a JSONLines file with one line per duplicate:
+
+    {"nanopub_id": "...", "duplicate_of": "<first nanopub id>", "hash": "<digest>"}
+"""
+
+import hashlib
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+from typing import Any, Iterable, Mapping, Tuple
+
+import bel.codec as codec
+import bel.compression as compression
+import bel.nanopub.nanopubs
+
+import structlog
+log = structlog.getLogger(__name__)
+
+default_max_digests = 500000  # digests kept in memory before spilling to disk
+default_capacity = 10000000  # expected number of nanopubs for sizing the Bloom filter
+default_error_rate = 0.01
+
+
+def nanopub_digest(nanopub: Mapping[str, Any]) -> str:
+    """hash_nanopub digest of the nanopub - None if it can't be hashed
+
+    hash_nanopub sets missing assertion relations and objects to '' so it is run
+    on a copy of the assertions.
+    """
+
+    try:
+        nanopub = {'nanopub': dict(nanopub['nanopub'], assertions=[dict(assertion) for assertion in nanopub['nanopub']['assertions']])}
+        return bel.nanopub.nanopubs.hash_nanopub(nanopub)
+    except (KeyError, AttributeError, TypeError):
+        return None
+
+
+class BloomFilter(object):
+    """Bloom filter of strings
+
+    Args:
+        capacity: expected number of items
+        error_rate: false positive rate at capacity
+    """
+
+    def __init__(self, capacity: int = default_capacity, error_rate: float = default_error_rate):
+
+        self.bits_cnt = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes_cnt = max(1, round(self.bits_cnt / capacity * math.log(2)))
+        self.bits = bytearray((self.bits_cnt + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        """Bit positions by double hashing a 128 bit digest of the item"""
+
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + idx * h2) % self.bits_cnt for idx in range(self.hashes_cnt)]
+
+    def add(self, item: str):
+
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class DigestSet(object):
+    """Exact set of digests (with the first nanopub id of each) spilling to disk
+
+    Args:
+        max_digests: digests kept in memory before spilling them to disk
+        capacity: expected number of digests for sizing the Bloom filter
+        spill_dir: directory for the spill file - default is a temporary directory
+    """
+
+    def __init__(self, max_digests: int = default_max_digests, capacity: int = default_capacity, spill_dir: str = None):
+
+        self.max_digests = max_digests
+        self.spill_dir = spill_dir
+        self.bloom = BloomFilter(capacity)
+
+        self.digests = {}
+        self.spilled_cnt = 0
+        self._conn = None
+        self._tmp_dir = None
+
+    def __len__(self) -> int:
+
+        return len(self.digests) + self.spilled_cnt
+
+    def _spilled_id(self, digest: str) -> Tuple[bool, str]:
+
+        if not self._conn:
+            return (False, None)
+
+        row = self._conn.execute('SELECT id FROM digests WHERE hash = ?', (digest, )).fetchone()
+        if row is None:
+            return (False, None)
+
+        return (True, row[0])
+
+    def spill(self):
+        """Move the in-memory digests to the spill file"""
+
+        if not self.digests:
+            return
+
+        if not self._conn:
+            self._tmp_dir = tempfile.mkdtemp(prefix='bel_dedup_', dir=self.spill_dir)
+            self._conn = sqlite3.connect(os.path.join(self._tmp_dir, 'digests.sqlite'))
+            self._conn.execute('PRAGMA journal_mode = OFF')
+            self._conn.execute('PRAGMA synchronous = OFF')
+            self._conn.execute('CREATE TABLE digests (hash TEXT PRIMARY KEY, id TEXT)')
+
+        self._conn.executemany('INSERT OR IGNORE INTO digests VALUES (?, ?)', self.digests.items())
+        self._conn.commit()
+
+        self.spilled_cnt += len(self.digests)
+        log.debug('Spilled nanopub digests to disk', spilled_cnt=self.spilled_cnt)
+        self.digests = {}
+
+    def add(self, digest: str, nanopub_id: str = None) -> Tuple[bool, str]:
+        """Add digest
+
+        Returns:
+            Tuple[bool, str]: (new digest?, nanopub id recorded for the digest if not new)
+        """
+
+        if digest in self.bloom:
+            if digest in self.digests:
+                return (False, self.digests[digest])
+
+            (found, first_id) = self._spilled_id(digest)
+            if found:
+                return (False, first_id)
+        else:
+            self.bloom.add(digest)
+
+        self.digests[digest] = nanopub_id
+        if len(self.digests) >= self.max_digests:
+            self.spill()
+
+        return (True, None)
+
+    def close(self):
+        """Remove the spill file"""
+
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class Deduplicator(object):
+    """Filter duplicate nanopubs from a stream of nanopubs
+
+    Args:
+        report_fn: duplicate report JSONLines filename (optionally compressed, see bel.compression)
+        max_digests: digests kept in memory before spilling them to disk
+        capacity: expected number of nanopubs for sizing the Bloom filter
+        spill_dir: directory for the spill file - default is a temporary directory
+    """
+
+    def __init__(self, report_fn: str = None, max_digests: int = default_max_digests, capacity: int = default_capacity, spill_dir: str = None):
+
+        self.report_fn = report_fn
+        self.digests = DigestSet(max_digests=max_digests, capacity=capacity, spill_dir=spill_dir)
+
+        self.nanopubs_cnt = 0
+        self.duplicates_cnt = 0
+        self.unhashed_cnt = 0
+
+    def filter(self, nanopubs: Iterable[Mapping[str, Any]]) -> Iterable[Mapping[str, Any]]:
+        """Generate the first nanopub of each hash_nanopub digest
+
+        Nanopubs that can't be hashed (e.g. missing citation) are passed through.
+        """
+
+        report = compression.open_file(self.report_fn, 'wt') if self.report_fn else None
+        try:
+            for nanopub in nanopubs:
+                self.nanopubs_cnt += 1
+
+                digest = nanopub_digest(nanopub)
+                if digest is None:
+                    self.unhashed_cnt += 1
+                    yield nanopub
+                    continue
+
+                nanopub_id = nanopub['nanopub'].get('id')
+                (new_flag, first_id) = self.digests.add(digest, nanopub_id)
+                if new_flag:
+                    yield nanopub
+                    continue
+
+                self.duplicates_cnt += 1
+                if report:
+                    report.write(codec.dumps_line({'nanopub_id': nanopub_id, 'duplicate_of': first_id, 'hash': digest}))
+
+        finally:
+            if report:
+                report.close()
+            self.digests.close()
+
+            log.info(
+                'Deduplicated nanopubs',
+                nanopubs_cnt=self.nanopubs_cnt,
+                duplicates_cnt=self.duplicates_cnt,
+                unhashed_cnt=self.unhashed_cnt,
+                spilled_cnt=self.digests.spilled_cnt,
+            )
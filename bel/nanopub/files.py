@@ -6,23 +6,138 @@
 
 """
 
+import abc
 import json
 import yaml
 import re
-import copy
 import sys
-import click
-from typing import Mapping, Any, List, Iterable, Tuple
-import gzip
+from typing import Mapping, Any, List, Iterable, Tuple, IO
+import collections
+import concurrent.futures
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import bel.codec as codec
+import bel.compression as compression
+import bel.utils
 
 import logging
 log = logging.getLogger(__name__)
 
 
+json_element_separators = re.compile(r'[\s,]*')
+
+
+def iter_json_array(f: IO, chunk_size: int = 65536) -> Iterable[Any]:
+    """Incrementally parse a JSON array file and yield each element
+
+    Each element is parsed (json.JSONDecoder.raw_decode) as soon as it is complete
+    in the read buffer, e.g. once the closing brace of a nanopub has been read.
+    Memory use is bounded by the largest element (plus chunk_size) instead of the
+    whole file.  The read size doubles while an element is incomplete so that
+    elements larger than chunk_size are not re-parsed too often.
+
+    Args:
+        f: JSON text file handle with a top level array
+        chunk_size: characters to read at a time
+
+    Returns:
+        Generator[Any]: array elements
+    """
+
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    read_size = chunk_size
+
+    def read_more():
+        nonlocal buf, pos, eof
+        chunk = f.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    # Opening bracket
+    while not buf.strip() and not eof:
+        read_more()
+    pos = len(buf) - len(buf.lstrip())
+    if buf[pos:pos + 1] != '[':
+        raise ValueError('JSON file does not contain a top level array')
+    pos += 1
+
+    while True:
+        # Skip separators between elements
+        pos = json_element_separators.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError('Truncated JSON array')
+            read_more()
+            continue
+
+        if buf[pos] == ']':
+            return
+
+        # Objects, arrays and strings are complete once parsed, other scalars
+        #    (e.g. numbers) need to be followed by a separator
+        try:
+            (element, end) = decoder.raw_decode(buf, pos)
+            complete = buf[pos] in '{["' or buf[end:].lstrip()[:1] in (',', ']')
+        except ValueError:
+            complete = False
+
+        if not complete:
+            if eof:
+                raise ValueError('Truncated JSON array')
+            read_more()
+            read_size *= 2
+            continue
+
+        read_size = chunk_size
+        yield element
+        pos = end
+
+
+def iter_yaml(f: IO) -> Iterable[Any]:
+    """Incrementally parse a YAML file and yield each document or top level list item
+
+    Handles both a single document holding a list (e.g. of nanopubs) and a
+    multi-document stream.  Each list item or document is composed and constructed
+    on its own so memory use is bounded by the largest item.
+
+    Args:
+        f: YAML text file handle
+
+    Returns:
+        Generator[Any]: top level list items and (non-list) documents
+    """
+
+    loader = yaml.SafeLoader(f)
+    try:
+        loader.get_event()  # StreamStart
+        while not loader.check_event(yaml.StreamEndEvent):
+            loader.get_event()  # DocumentStart
+            if loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()  # SequenceEnd
+            else:
+                document = loader.construct_document(loader.compose_node(None, None))
+                if document is not None:
+                    yield document
+            loader.get_event()  # DocumentEnd
+            loader.anchors = {}
+    finally:
+        loader.dispose()
+
+
 def read_nanopubs(fn: str) -> Iterable[Mapping[str, Any]]:
     """Read file and generate nanopubs
 
-    If filename has *.gz, will read as a gzip file
+    If filename has *.gz or *.zst, will read as a gzip or zstd file (see bel.compression)
     If filename has *.jsonl*, will parsed as a JSONLines file
     IF filename has *.json*, will be parsed as a JSON file
     If filename has *.yaml* or *.yml*,  will be parsed as a YAML file
@@ -46,37 +161,36 @@ def read_nanopubs(fn: str) -> Iterable[Mapping[str, Any]]:
         return {}
 
     try:
-        if re.search('gz$', fn):
-            f = gzip.open(fn, 'rt')
-        else:
-            try:
-                f = click.open_file(fn, mode='rt')
-            except Exception as e:
-                log.info(f'Can not open file {fn}  Error: {e}')
-                quit()
+        f = compression.open_file(fn, 'rt')
+    except Exception as e:
+        log.info(f'Can not open file {fn}  Error: {e}')
+        quit()
 
+    try:
         if jsonl_flag:
             for line in f:
-                yield json.loads(line)
+                yield codec.loads(line)
         elif json_flag:
-            nanopubs = json.load(f)
-            for nanopub in nanopubs:
+            for nanopub in iter_json_array(f):
                 yield nanopub
         elif yaml_flag:
-            nanopubs = yaml.load(f)
-            for nanopub in nanopubs:
+            for nanopub in iter_yaml(f):
                 yield nanopub
 
     except Exception as e:
         log.error(f'Could not open file: {fn}')
 
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
 
 def create_nanopubs_fh(output_fn: str):
     """Create Nanopubs output filehandle
 
     \b
     If output fn is '-' will write JSONlines to STDOUT
-    If output fn has *.gz, will written as a gzip file
+    If output fn has *.gz or *.zst, will written as a gzip or zstd file (see bel.compression)
     If output fn has *.jsonl*, will written as a JSONLines file
     IF output fn has *.json*, will be written as a JSON file
     If output fn has *.yaml* or *.yml*,  will be written as a YAML file
@@ -92,10 +206,7 @@ def create_nanopubs_fh(output_fn: str):
     # set output flags
     json_flag, jsonl_flag, yaml_flag = False, False, False
     if output_fn:
-        if re.search('gz$', output_fn):
-            out_fh = gzip.open(output_fn, 'wt')
-        else:
-            out_fh = click.open_file(output_fn, mode='wt')
+        out_fh = compression.open_file(output_fn, 'wt')
 
         if re.search('ya?ml', output_fn):
             yaml_flag = True
@@ -126,67 +237,546 @@ def read_edges(fn):
         return []
 
     try:
-        if re.search('gz$', fn):
-            f = gzip.open(fn, 'rt')
-        else:
-            f = open(fn, 'rt')
+        f = compression.open_file(fn, 'rt')
+    except Exception as e:
+        log.error(f'Could not open file: {fn}')
+        return
 
+    try:
         if jsonl_flag:
             for line in f:
-                edges = json.loads(line)
+                edges = codec.loads(line)
                 for edge in edges:
                     yield edge
         elif json_flag:
-            edges = json.load(f)
-            for edge in edges:
+            for edge in iter_json_array(f):
                 yield edge
         elif yaml_flag:
-            edges = yaml.load_all(f)
-            for edge in edges:
+            for edge in iter_yaml(f):
                 yield edge
 
     except Exception as e:
-        log.error(f'Could not open file: {fn}')
+        log.error(f'Could not read file: {fn}')
+
+    finally:
+        f.close()
+
+
+def iter_batches(records: Iterable[Any], batch_size: int) -> Iterable[List[Any]]:
+    """Collect records into lists of batch_size records"""
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class BackgroundOutput(object):
+    """Write to a file in a background thread
+
+    Compressing (zlib releases the GIL) and writing the output overlaps with
+    reading and encoding the records in the main thread.  At most max_pending
+    writes are queued.
+
+    Args:
+        out_fh: text file handle to write to, e.g. bel.compression.open_file(fn, 'wt')
+        max_pending: max queued writes
+    """
+
+    def __init__(self, out_fh: IO, max_pending: int = 64):
+
+        self.out_fh = out_fh
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+
+        while True:
+            content = self._queue.get()
+            try:
+                if content is None:
+                    return
+                if self._error is None:
+                    self.out_fh.write(content)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+
+        if self._error is not None:
+            raise self._error
+
+    def write(self, content: str):
+
+        self._check()
+        self._queue.put(content)
+
+    def flush(self):
+
+        self._queue.join()
+        self._check()
+        self.out_fh.flush()
+
+    def close(self):
+
+        self._queue.put(None)
+        self._thread.join()
+        self._check()
+        if self.out_fh not in (sys.stdout, sys.stderr):
+            self.out_fh.close()
+        else:
+            self.out_fh.flush()
+
+
+def _encode_records(writer_cls: type, records: List[Mapping[str, Any]]) -> str:
+    """Encode records in a worker process - see TextRecordsWriter.write_all"""
+
+    return writer_cls.encode(records)
+
+
+class RecordsWriter(abc.ABC):
+    """Stream records (nanopubs or edges) to a file
+
+    Records are written as soon as they are passed to write() so memory use doesn't
+    grow with the number of records.  The output is flushed every flush_every records
+    and at least every flush_secs seconds.
+
+    Subclasses implement write_records().  Text formats derive from TextRecordsWriter
+    which can encode records in worker processes (see TextRecordsWriter.write_all).
+
+    Args:
+        out_fh: text file handle (or bel.nanopub.checkpoint.ResumableOutput)
+        flush_every: records to write between flushes
+        flush_secs: max seconds between flushes
+    """
+
+    def __init__(self, out_fh: IO, flush_every: int = 10000, flush_secs: float = 10.0):
+
+        self.out_fh = out_fh
+        self.flush_every = flush_every
+        self.flush_secs = flush_secs
+
+        self.records_cnt = 0
+        self._unflushed_cnt = 0
+        self._flush_ts = time.time()
+        self._closed = False
+
+        self.start()
+
+    def start(self):
+        """Write file header"""
+        pass
+
+    def end(self):
+        """Write file footer"""
+        pass
+
+    @abc.abstractmethod
+    def write_records(self, records: List[Mapping[str, Any]]):
+        """Write records to out_fh - see write()"""
+
+    def write(self, records: List[Mapping[str, Any]]):
+        """Write records - e.g. the edges of one nanopub"""
+
+        if not records:
+            return
+
+        self.write_records(records)
+        self._written(len(records))
+
+    def _written(self, records_cnt: int):
+
+        self.records_cnt += records_cnt
+        self._unflushed_cnt += records_cnt
+        if self._unflushed_cnt >= self.flush_every or time.time() - self._flush_ts >= self.flush_secs:
+            self.flush()
+
+    def write_all(self, records: Iterable[Mapping[str, Any]], batch_size: int = 1000, workers: int = 0):
+        """Write all records from an iterable, e.g. read_nanopubs(), batch_size records at a time
+
+        Args:
+            records: records to write
+            batch_size: records per write
+            workers: ignored - only text formats encode in worker processes (see TextRecordsWriter)
+        """
+
+        for batch in iter_batches(records, batch_size):
+            self.write(batch)
+
+    def flush(self):
+
+        if hasattr(self.out_fh, 'flush'):
+            self.out_fh.flush()
+
+        self._unflushed_cnt = 0
+        self._flush_ts = time.time()
+
+    def close(self):
+        """Write footer and close the output file"""
+
+        if self._closed:
+            return
+
+        self.end()
+        if self.out_fh not in (sys.stdout, sys.stderr):
+            self.out_fh.close()
+        else:
+            self.out_fh.flush()
+
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class TextRecordsWriter(RecordsWriter):
+    """Text format records writer
+
+    Subclasses implement the encode() classmethod so that records can be encoded
+    in worker processes (see write_all).
+    """
+
+    # Separator written before each encoded record except the first one
+    record_separator = ''
+
+    def __init__(self, out_fh: IO, flush_every: int = 10000, flush_secs: float = 10.0):
+
+        self._first = True
+
+        super().__init__(out_fh, flush_every=flush_every, flush_secs=flush_secs)
+
+    @classmethod
+    @abc.abstractmethod
+    def encode(cls, records: List[Mapping[str, Any]]) -> str:
+        """Encode records - each record prefixed with the record_separator"""
+
+    def write_records(self, records: List[Mapping[str, Any]]):
+        self.write_encoded(self.encode(records))
+
+    def write_encoded(self, content: str):
+        """Write content created by encode()"""
+
+        if self._first and self.record_separator:
+            content = content[len(self.record_separator):]
+
+        self.out_fh.write(content)
+        self._first = False
+
+    def write_all(self, records: Iterable[Mapping[str, Any]], batch_size: int = 1000, workers: int = 0):
+        """Write all records from an iterable, e.g. read_nanopubs(), batch_size records at a time
 
+        Args:
+            records: records to write
+            batch_size: records per write (and per worker task)
+            workers: encode batches in this many worker processes - records are still
+                written in order and at most 2 * workers batches are pending
+        """
 
-def write_edges(edges: Mapping[str, Any], filename: str, jsonlines: bool = False, gzipflag: bool = False, yaml: bool = False):
+        if workers <= 1:
+            return super().write_all(records, batch_size=batch_size)
+
+        pending = collections.deque()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in iter_batches(records, batch_size):
+                pending.append((executor.submit(_encode_records, type(self), batch), len(batch)))
+                if len(pending) >= 2 * workers:
+                    self._write_future(*pending.popleft())
+
+            while pending:
+                self._write_future(*pending.popleft())
+
+    def _write_future(self, future: concurrent.futures.Future, records_cnt: int):
+
+        self.write_encoded(future.result())
+        self._written(records_cnt)
+
+
+class JSONLinesWriter(TextRecordsWriter):
+    """JSONLines - one line per record, e.g. per nanopub"""
+
+    @classmethod
+    def encode(cls, records):
+        return ''.join([codec.dumps_line(record) for record in records])
+
+
+class JSONLinesEdgesWriter(TextRecordsWriter):
+    """JSONLines - one line with the list of edges per write(), e.g. per nanopub"""
+
+    @classmethod
+    def encode(cls, edges):
+        return codec.dumps_line(edges)
+
+
+class JSONArrayWriter(TextRecordsWriter):
+    """JSON array - written incrementally, one record per line"""
+
+    record_separator = ',\n'
+
+    def start(self):
+        self.out_fh.write('[\n')
+
+    @classmethod
+    def encode(cls, records):
+        return ''.join([cls.record_separator + codec.dumps(record) for record in records])
+
+    def end(self):
+        self.out_fh.write('\n]\n')
+
+
+class YAMLWriter(TextRecordsWriter):
+    """Multi-document YAML stream - one document per record
+
+    Uses the libyaml based dumper when PyYAML is built with libyaml.
+    """
+
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+    @classmethod
+    def encode(cls, records):
+        return yaml.dump_all(records, Dumper=cls.dumper, explicit_start=True, default_flow_style=False)
+
+
+class JGFEdgesWriter(RecordsWriter):
+    """JSON Graph Format (http://jsongraphformat.info) graph of the edges
+
+    Nodes are streamed to the output file and edges to a temporary file that is
+    appended to the output after the nodes on close().  Each node is only written
+    once - nodes are tracked by the hash of their name (bel.utils.SeenKeys) so
+    memory use is a fraction of the node names.
+
+    Args:
+        out_fh: text file handle
+        compact: no whitespace between nodes and edges instead of one per line
+        label: graph label
+        kwargs: RecordsWriter flush_every and flush_secs
+    """
+
+    graph_type = 'BEL Edges'
+
+    def __init__(self, out_fh: IO, compact: bool = False, label: str = 'BEL Pipeline Edges', **kwargs):
+
+        self.compact = compact
+        self.label = label
+        self.jgf_separator = ',' if compact else ',\n'
+
+        self.seen_nodes = bel.utils.SeenKeys()
+        self.nodes_cnt = 0
+        self.jgf_edges_cnt = 0
+
+        super().__init__(out_fh, **kwargs)
+
+    def start(self):
+
+        self._edges_fh = tempfile.TemporaryFile(mode='w+t')
+
+        newline = '' if self.compact else '\n'
+        self.out_fh.write(f'{{"graph":{{"label":{codec.dumps(self.label)},"type":{codec.dumps(self.graph_type)},{newline}"nodes":[')
+
+    def write_node(self, node: Mapping[str, Any]):
+        """Write node if not already written"""
+
+        if not self.seen_nodes.add(node['name']):
+            return
+
+        jgf_node = {'id': node['name']}
+        if node.get('label') and node['label'] != node['name']:
+            jgf_node['label'] = node['label']
+
+        self.out_fh.write(self.jgf_separator if self.nodes_cnt else self.jgf_separator[1:])
+        self.out_fh.write(codec.dumps(jgf_node))
+        self.nodes_cnt += 1
+
+    def write_records(self, edges):
+
+        for edge in edges:
+            if 'edge' not in edge:
+                continue
+
+            subject = edge['edge']['subject']
+            object_ = edge['edge']['object']
+            self.write_node(subject)
+            self.write_node(object_)
+
+            jgf_edge = {
+                'source': subject['name'],
+                'target': object_['name'],
+                'relation': edge['edge']['relation']['relation'],
+            }
+            self._edges_fh.write(self.jgf_separator if self.jgf_edges_cnt else self.jgf_separator[1:])
+            self._edges_fh.write(codec.dumps(jgf_edge))
+            self.jgf_edges_cnt += 1
+
+    def end(self):
+
+        newline = '' if self.compact else '\n'
+        self.out_fh.write(newline + '],' + newline + '"edges":[')
+        self._edges_fh.seek(0)
+        shutil.copyfileobj(self._edges_fh, self.out_fh)
+        self._edges_fh.close()
+        self.out_fh.write(newline + ']}}\n')
+
+
+edges_writers = {
+    'jsonl': JSONLinesEdgesWriter,
+    'json': JSONArrayWriter,
+    'yaml': YAMLWriter,
+    'jgf': JGFEdgesWriter,
+}
+
+nanopubs_writers = {
+    'jsonl': JSONLinesWriter,
+    'json': JSONArrayWriter,
+    'yaml': YAMLWriter,
+}
+
+
+def records_file_format(fn: str) -> str:
+    """File format from filename - jsonl, json, yaml, jgf or parquet - None if not recognized"""
+
+    fn = os.path.basename(fn)
+    if fn == '-' or 'jsonl' in fn:
+        return 'jsonl'
+    elif 'parquet' in fn:
+        return 'parquet'
+    elif 'jgf' in fn:
+        return 'jgf'
+    elif 'json' in fn:
+        return 'json'
+    elif re.search('ya?ml', fn):
+        return 'yaml'
+
+    return None
+
+
+def open_output(fn: str, gzipflag: bool = None, background: bool = False) -> IO:
+    """Open text output file
+
+    Args:
+        fn: output filename, '-' for STDOUT
+        gzipflag: gzip output - default is based on the filename (*.gz, *.zst for zstd)
+        background: compress and write in a background thread (see BackgroundOutput)
+
+    Returns:
+        IO: text file handle
+    """
+
+    if fn == '-':
+        out_fh = sys.stdout
+    else:
+        out_fh = compression.open_file(fn, 'wt', compression='gzip' if gzipflag else None)
+
+    if background:
+        out_fh = BackgroundOutput(out_fh)
+
+    return out_fh
+
+
+def open_edges_writer(fn: str, file_format: str = None, gzipflag: bool = None, background: bool = False, **kwargs) -> RecordsWriter:
+    """Open streaming edges writer
+
+    Args:
+        fn: output filename, '-' for STDOUT
+        file_format: jsonl, json, yaml, jgf or parquet - default is based on the filename
+        gzipflag: gzip output - default is based on the filename (*.gz), not used for parquet
+        background: compress and write in a background thread, not used for parquet
+        kwargs: RecordsWriter flush_every and flush_secs (bel.edge.columnar.ParquetEdgesWriter options for parquet)
+
+    Returns:
+        RecordsWriter: writer for the file format
+    """
+
+    file_format = file_format or records_file_format(fn)
+    if file_format == 'parquet':
+        import bel.edge.columnar
+        return bel.edge.columnar.ParquetEdgesWriter(fn, **kwargs)
+
+    if file_format not in edges_writers:
+        raise ValueError(f'Do not recognize edge file format for {fn} - expected one of {list(edges_writers)}')
+
+    return edges_writers[file_format](open_output(fn, gzipflag, background), **kwargs)
+
+
+def open_nanopubs_writer(fn: str, file_format: str = None, gzipflag: bool = None, background: bool = False, **kwargs) -> RecordsWriter:
+    """Open streaming nanopubs writer
+
+    JSON output is an array with one nanopub per line, YAML output is a multi-document
+    stream with one document per nanopub - both are read incrementally by read_nanopubs.
+
+    Args:
+        fn: output filename, '-' for STDOUT (JSONLines)
+        file_format: jsonl, json or yaml - default is based on the filename
+        gzipflag: gzip output - default is based on the filename (*.gz)
+        background: compress and write in a background thread
+        kwargs: RecordsWriter flush_every and flush_secs
+
+    Returns:
+        RecordsWriter: writer for the file format
+    """
+
+    file_format = file_format or records_file_format(fn)
+    if file_format not in nanopubs_writers:
+        raise ValueError(f'Do not recognize nanopub file format for {fn} - expected one of {list(nanopubs_writers)}')
+
+    return nanopubs_writers[file_format](open_output(fn, gzipflag, background), **kwargs)
+
+
+def write_edges(edges: Iterable[Mapping[str, Any]], filename: str, jsonlines: bool = False, gzipflag: bool = False, yaml: bool = False):
     """Write edges to file
 
+    Edges are streamed to the file so edges can be a generator, e.g. bel.nanopub.files.read_edges()
+
     Args:
-        edges (Mapping[str, Any]): in edges JSON Schema format
-        filename (str): filename to write
+        edges (Iterable[Mapping[str, Any]]): in edges JSON Schema format
+        filename (str): filename to write - file format is based on the filename if not set by jsonlines or yaml
         jsonlines (bool): output in JSONLines format?
         gzipflag (bool): create gzipped file?
         yaml (bool): create yaml file?
+
+    Returns:
+        int: number of edges written
     """
-    pass
 
+    file_format = None
+    if jsonlines:
+        file_format = 'jsonl'
+    elif yaml:
+        file_format = 'yaml'
 
-def edges_to_jgf(fn, edges):
-
-    jgf_nodes = []
-    jgf_edges = []
-    for edge in edges:
-        if 'edge' in edge:
-            jgf_nodes.append({'id': edge['edge']['subject']['name']})
-            jgf_nodes.append({'id': edge['edge']['object']['name']})
-            jgf_edges.append({
-                'source': edge['edge']['subject']['name'],
-                'target': edge['edge']['object']['name'],
-                'relation': edge['edge']['relation']['name'],
-            })
-
-    with open(fn, 'wt') as f:
-        graph = {
-            'graph': {
-                'label': 'BEL Pipeline Edges',
-                'type': 'BEL Edges',
-                'nodes': copy.deepcopy(jgf_nodes),
-                'edges': copy.deepcopy(jgf_edges),
-            }
-        }
+    with open_edges_writer(filename, file_format=file_format, gzipflag=gzipflag or None) as writer:
+        writer.write_all(edges)
+
+    return writer.records_cnt
+
+
+def edges_to_jgf(fn: str, edges: Iterable[Mapping[str, Any]], compact: bool = False, label: str = 'BEL Pipeline Edges') -> Tuple[int, int]:
+    """Stream edges to a JSON Graph Format file
+
+    Args:
+        fn: output filename, *.gz for a gzipped file
+        edges: edges in edges JSON Schema format, e.g. from read_edges()
+        compact: write without whitespace between nodes and edges
+        label: graph label
+
+    Returns:
+        Tuple[int, int]: number of (unique) nodes and edges written
+    """
+
+    with open_edges_writer(fn, file_format='jgf', compact=compact, label=label) as writer:
+        writer.write_all(edges)
 
-        f.write("{}\n".format(json.dumps(graph, indent=4)))
+    return (writer.nodes_cnt, writer.jgf_edges_cnt)
 
 
 def main():
@@ -5,6 +5,7 @@ import jsonschema
 import requests
 from cityhash import CityHash64
 
+import bel.codec
 import bel.edge.edges
 from bel.Config import config
 
@@ -215,3 +216,20 @@ def hash_nanopub(nanopub: Mapping[str, Any]) -> str:
     np_string = ' '.join([l.lower() for l in hash_list])
 
     return '{:x}'.format(CityHash64(np_string))
+
+
+def hash_nanopub_content(nanopub: Mapping[str, Any]) -> str:
+    """Create case-sensitive CityHash64 of the nanopub assertions and annotations
+
+    hash_nanopub lowercases the assertions and only uses the annotation type and id
+    so it misses edits that change the edges computed from the nanopub, e.g.
+    p(MGI:akt1) -> p(MGI:Akt1) or a new annotation label.  The assertions and the
+    full annotations are hashed exactly as written.
+    """
+
+    content = {
+        'assertions': nanopub['nanopub'].get('assertions') or [],
+        'annotations': nanopub['nanopub'].get('annotations') or [],
+    }
+
+    return '{:x}'.format(CityHash64(bel.codec.canonical_dumps(content)))
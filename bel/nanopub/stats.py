@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Single pass nanopub corpus profiling for belc nanopub stats
+
+Counts nanopubs and assertions (subject only, nested) and collects the
+frequencies of relations, BEL functions, namespaces and NSArgs plus histograms
+of assertion depth (maximum function nesting) and assertions per nanopub:
+
+    belc nanopub stats nanopubs.jsonl.gz --workers 8
+
+    profile = bel.nanopub.stats.profile_corpus('nanopubs.jsonl.gz', workers=8)
+    print(profile.to_dict(top=20))
+
+Assertions are tokenized with a single regex scan - no BEL specification or full
+parse is needed.  With partialparse=True the bel.lang.partialparse tokenizer
+(character scan, functions and arguments - without building the AST) is used
+instead and its errors are counted.
+
+With workers > 1 the corpus is profiled in worker processes and the partial
+profiles are merged.  Corpora indexed with belc nanopub index (see
+bel.nanopub.corpus) are split into one shard per worker that each worker reads
+itself, otherwise batches of assertions are sent to the workers.
+"""
+
+import collections
+import concurrent.futures
+import os
+import re
+import time
+from typing import Any, Iterable, List, Mapping, Tuple
+
+import bel.nanopub.corpus
+import bel.nanopub.files
+
+import structlog
+log = structlog.getLogger(__name__)
+
+# Quoted strings are matched (and skipped) first so their contents aren't tokenized
+token_pattern = re.compile(r'''
+    "(?:[^"\\]|\\.)*"
+    |(?P<function>[a-zA-Z][a-zA-Z0-9_]*)\(
+    |(?P<ns>[a-zA-Z][\w.\-]*):(?P<ns_val>"(?:[^"\\]|\\.)*"|[^\s,()"]+)
+    |(?P<paren>[()])
+''', re.VERBOSE)
+
+counter_names = ['relations', 'functions', 'namespaces', 'nsargs', 'depths', 'assertions_per_nanopub']
+
+Assertion = Tuple[str, str, str]  # (subject, relation, object)
+
+
+def tokenize(belstr: str) -> Tuple[List[str], List[Tuple[str, str]], int, int]:
+    """Tokenize BEL statement with a regex scan
+
+    Returns:
+        Tuple[List[str], List[Tuple[str, str]], int, int]: (function names, (namespace, value) NSArgs, depth, errors)
+    """
+
+    functions, nsargs = [], []
+    stack, depth, max_depth = [], 0, 0
+
+    for match in token_pattern.finditer(belstr):
+        if match.group('function'):
+            functions.append(match.group('function'))
+            stack.append(True)
+            depth += 1
+            max_depth = max(depth, max_depth)
+        elif match.group('ns'):
+            nsargs.append((match.group('ns'), match.group('ns_val')))
+        elif match.group('paren') == '(':
+            stack.append(False)  # nested statement
+        elif match.group('paren') == ')' and stack:
+            if stack.pop():
+                depth -= 1
+
+    return (functions, nsargs, max_depth, 0)
+
+
+def tokenize_partialparse(belstr: str) -> Tuple[List[str], List[Tuple[str, str]], int, int]:
+    """Tokenize BEL statement with the bel.lang.partialparse tokenizer
+
+    Returns:
+        Tuple[List[str], List[Tuple[str, str]], int, int]: (function names, (namespace, value) NSArgs, depth, errors)
+    """
+
+    import bel.lang.bel_utils  # noqa: F401 - import before bel.lang.ast to avoid a circular import
+    import bel.lang.partialparse as partialparse
+
+    bels = list(belstr)
+    char_locs, errors = partialparse.parse_chars(bels, [])
+    parsed, errors = partialparse.parse_functions(bels, char_locs, {}, errors)
+    parsed, errors = partialparse.parse_args(bels, char_locs, parsed, errors)
+    parsed, errors = partialparse.arg_types(parsed, errors)
+
+    functions, nsargs = [], []
+    ends, max_depth = [], 0
+    for span in sorted(parsed, key=lambda span: (span[0], -span[1])):
+        function = parsed[span]
+        functions.append(function['name'])
+        for arg in function.get('args', []):
+            if arg.get('type') == 'NSArg':
+                nsargs.append((arg['ns'], arg['ns_val']))
+
+        # Depth is the number of enclosing function spans
+        while ends and ends[-1] < span[0]:
+            ends.pop()
+        ends.append(span[1])
+        max_depth = max(len(ends), max_depth)
+
+    return (functions, nsargs, max_depth, len(errors))
+
+
+class CorpusProfile(object):
+    """Mergeable nanopub corpus counters
+
+    Args:
+        partialparse: tokenize assertions with bel.lang.partialparse
+    """
+
+    def __init__(self, partialparse: bool = False):
+
+        self.partialparse = partialparse
+        self.tokenize = tokenize_partialparse if partialparse else tokenize
+
+        self.nanopubs_cnt = 0
+        self.counts = collections.Counter()  # assertions, subject_only, nested, parse_errors
+        for name in counter_names:
+            setattr(self, name, collections.Counter())
+
+    def add_nanopub(self, assertions: List[Assertion]):
+
+        self.nanopubs_cnt += 1
+        self.assertions_per_nanopub[len(assertions)] += 1
+        for assertion in assertions:
+            self.add_assertion(*assertion)
+
+    def add_assertion(self, subject: str, relation: str, object_: str):
+
+        self.counts['assertions'] += 1
+
+        if relation is None:
+            self.counts['subject_only'] += 1
+            belstr = subject or ''
+        else:
+            self.relations[relation] += 1
+            object_ = object_ or ''
+            if object_.lstrip().startswith('('):
+                self.counts['nested'] += 1
+            belstr = f'{subject} {relation} {object_}'
+
+        (functions, nsargs, depth, errors_cnt) = self.tokenize(belstr)
+
+        self.functions.update(functions)
+        for (ns, ns_val) in nsargs:
+            self.namespaces[ns] += 1
+            self.nsargs[f'{ns}:{ns_val}'] += 1
+        self.depths[depth] += 1
+        if errors_cnt:
+            self.counts['parse_errors'] += errors_cnt
+
+    def merge(self, other: 'CorpusProfile') -> 'CorpusProfile':
+        """Add the counts of another (partial) profile"""
+
+        self.nanopubs_cnt += other.nanopubs_cnt
+        self.counts.update(other.counts)
+        for name in counter_names:
+            getattr(self, name).update(getattr(other, name))
+
+        return self
+
+    def to_dict(self, top: int = 100) -> Mapping[str, Any]:
+        """Profile as a JSON serializable dict
+
+        Args:
+            top: only include the top most frequent NSArgs
+
+        Returns:
+            Mapping[str, Any]: profile - frequencies are ordered by count
+        """
+
+        profile = {
+            'nanopubs': self.nanopubs_cnt,
+            'assertions': {
+                'total': self.counts['assertions'],
+                'subject_only': self.counts['subject_only'],
+                'nested': self.counts['nested'],
+                'relations': dict(self.relations.most_common()),
+            },
+            'functions': dict(self.functions.most_common()),
+            'namespaces': dict(self.namespaces.most_common()),
+            'nsargs': {
+                'total': sum(self.nsargs.values()),
+                'distinct': len(self.nsargs),
+                'top': dict(self.nsargs.most_common(top)),
+            },
+            'depth': {depth: self.depths[depth] for depth in sorted(self.depths)},
+            'assertions_per_nanopub': {cnt: self.assertions_per_nanopub[cnt] for cnt in sorted(self.assertions_per_nanopub)},
+        }
+
+        if self.partialparse:
+            profile['assertions']['parse_errors'] = self.counts['parse_errors']
+
+        return profile
+
+
+def nanopub_assertions(nanopub: Mapping[str, Any]) -> List[Assertion]:
+    """Nanopub assertions as (subject, relation, object) - None if not a nanopub"""
+
+    if 'nanopub' not in nanopub:
+        return None
+
+    return [
+        (assertion.get('subject'), assertion.get('relation'), assertion.get('object'))
+        for assertion in nanopub['nanopub'].get('assertions') or []
+    ]
+
+
+def profile_nanopubs(nanopubs: Iterable[Mapping[str, Any]], partialparse: bool = False) -> CorpusProfile:
+    """Profile nanopubs in a single pass"""
+
+    profile = CorpusProfile(partialparse=partialparse)
+    for nanopub in nanopubs:
+        assertions = nanopub_assertions(nanopub)
+        if assertions is not None:
+            profile.add_nanopub(assertions)
+
+    return profile
+
+
+def _profile_batch(batch: List[List[Assertion]], partialparse: bool) -> CorpusProfile:
+
+    profile = CorpusProfile(partialparse=partialparse)
+    for assertions in batch:
+        profile.add_nanopub(assertions)
+
+    return profile
+
+
+def _profile_shard(fn: str, shard: Tuple[int, int], partialparse: bool) -> CorpusProfile:
+
+    with bel.nanopub.corpus.CorpusIndex(fn) as corpus:
+        return profile_nanopubs(corpus.select(shard=shard), partialparse=partialparse)
+
+
+def profile_corpus(fn: str, workers: int = 0, batch_size: int = 1000, partialparse: bool = False) -> CorpusProfile:
+    """Profile nanopub file, optionally in worker processes
+
+    Args:
+        fn: nanopubs filename (see bel.nanopub.files.read_nanopubs)
+        workers: number of worker processes - 0 or 1 to profile in this process
+        batch_size: nanopubs per worker task for files that aren't indexed
+        partialparse: tokenize assertions with bel.lang.partialparse
+
+    Returns:
+        CorpusProfile: merged profile
+    """
+
+    start_time = time.time()
+
+    if workers <= 1:
+        profile = profile_nanopubs(bel.nanopub.files.read_nanopubs(fn), partialparse=partialparse)
+
+    elif os.path.exists(bel.nanopub.corpus.index_filename(fn)):
+        profile = CorpusProfile(partialparse=partialparse)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_profile_shard, fn, (shard_num, workers), partialparse) for shard_num in range(1, workers + 1)]
+            for future in futures:
+                profile.merge(future.result())
+
+    else:
+        profile = CorpusProfile(partialparse=partialparse)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            batch = []
+            for nanopub in bel.nanopub.files.read_nanopubs(fn):
+                assertions = nanopub_assertions(nanopub)
+                if assertions is None:
+                    continue
+                batch.append(assertions)
+                if len(batch) < batch_size:
+                    continue
+
+                pending.append(executor.submit(_profile_batch, batch, partialparse))
+                batch = []
+
+                # Bound the batches in flight so memory use doesn't grow with the corpus
+                while len(pending) > 2 * workers:
+                    profile.merge(pending.popleft().result())
+
+            if batch:
+                pending.append(executor.submit(_profile_batch, batch, partialparse))
+            while pending:
+                profile.merge(pending.popleft().result())
+
+    log.info(
+        'Profiled nanopubs',
+        fn=fn,
+        nanopubs_cnt=profile.nanopubs_cnt,
+        assertions_cnt=profile.counts['assertions'],
+        elapsed=f'{time.time() - start_time:.2f}',
+    )
+
+    return profile
@@ -1,12 +1,12 @@
 import timy
-import json
-import gzip
 import copy
 
 from arango import ArangoError
 
 from typing import IO
 
+import bel.codec as codec
+import bel.compression as compression
 import bel.utils
 import bel.db.elasticsearch as elasticsearch
 import bel.db.arangodb as arangodb
@@ -22,6 +22,13 @@ log = get_logger()
 
 terms_alias = 'terms'
 
+remove_old_equivalences_query = arangodb.AQLQuery('remove_old_equivalences', """
+    FOR doc IN @@collection
+        FILTER doc.source == @source
+        FILTER doc.version != @version
+        REMOVE doc IN @@collection
+""")
+
 
 def load_terms(fo: IO, metadata: dict, forceupdate: bool):
     """Load terms into Elasticsearch and ArangoDB
@@ -73,25 +80,20 @@ def load_terms(fo: IO, metadata: dict, forceupdate: bool):
     with timy.Timer('Load Term Equivalences') as timer:
         arango_client = arangodb.get_client()
         belns_db = arangodb.get_belns_handle(arango_client)
-        arangodb.batch_load_docs(belns_db, terms_iterator_for_arangodb(fo, version), on_duplicate='update')
+        report = arangodb.batch_load_docs(belns_db, terms_iterator_for_arangodb(fo, version), on_duplicate='update')
 
-        log.info('Loaded namespace equivalences', elapsed=timer.elapsed, namespace=metadata['metadata']['namespace'])
+        log.info('Loaded namespace equivalences', elapsed=timer.elapsed, namespace=metadata['metadata']['namespace'], report=report)
 
         # Clean up old entries
-        remove_old_equivalence_edges = f'''
-            FOR edge in equivalence_edges
-                FILTER edge.source == "{metadata["metadata"]["namespace"]}"
-                FILTER edge.version != "{version}"
-                REMOVE edge IN equivalence_edges
-        '''
-        remove_old_equivalence_nodes = f'''
-            FOR node in equivalence_nodes
-                FILTER node.source == "{metadata["metadata"]["namespace"]}"
-                FILTER node.version != "{version}"
-                REMOVE node IN equivalence_nodes
-        '''
-        arangodb.aql_query(belns_db, remove_old_equivalence_edges)
-        arangodb.aql_query(belns_db, remove_old_equivalence_nodes)
+        for collection_name in [arangodb.equiv_edges_name, arangodb.equiv_nodes_name]:
+            bind_vars = {'@collection': collection_name, 'source': metadata['metadata']['namespace'], 'version': version}
+            remove_old_equivalences_query.execute(belns_db, bind_vars=bind_vars)
+
+    # Equivalences can link terms across namespaces so clusters are recomputed over all of them
+    with timy.Timer('Materialize Term Equivalence Clusters') as timer:
+        arangodb.materialize_clusters(belns_db, arangodb.equiv_nodes_name, arangodb.equiv_edges_name)
+
+        log.info('Materialized equivalence clusters', elapsed=timer.elapsed, namespace=metadata['metadata']['namespace'])
 
     # Add metadata to resource metadata collection
     metadata['_key'] = f"Namespace_{metadata['metadata']['namespace']}"
@@ -102,13 +104,23 @@ def load_terms(fo: IO, metadata: dict, forceupdate: bool):
 
 
 def terms_iterator_for_arangodb(fo, version):
+    """Equivalence node and edge iterator
+
+    Each node and edge is only yielded once per load.  A node first seen as an
+    alt_id/equivalence is yielded again if it turns up as a primary term so that
+    the primary flag is added by the on_duplicate='update' import.
+    """
 
     species_list = config['bel_resources'].get('species_list', [])
 
+    seen_nodes = bel.utils.SeenKeys()
+    seen_primary_nodes = bel.utils.SeenKeys()
+    seen_edges = bel.utils.SeenKeys()
+
     fo.seek(0)
-    with gzip.open(fo, 'rt') as f:
+    with compression.open_file(fo, 'rt') as f:
         for line in f:
-            term = json.loads(line)
+            term = codec.loads(line)
             # skip if not term record (e.g. is a metadata record)
             if 'term' not in term:
                 continue
@@ -126,19 +138,26 @@ def terms_iterator_for_arangodb(fo, version):
             (ns, val) = term_id.split(':', maxsplit=1)
 
             # Add primary ID node
-            yield (arangodb.equiv_nodes_name, {'_key': term_key, 'name': term_id, 'primary': True, 'namespace': ns, 'source': source, 'version': version})
+            if seen_primary_nodes.add(term_key):
+                seen_nodes.add(term_key)
+                yield (arangodb.equiv_nodes_name, {'_key': term_key, 'name': term_id, 'primary': True, 'namespace': ns, 'source': source, 'version': version})
 
             # Create Alt ID nodes/equivalences (to support other database equivalences using non-preferred Namespace IDs)
             if 'alt_ids' in term:
                 for alt_id in term['alt_ids']:
                     # log.info(f'Added {alt_id} equivalence')
                     alt_id_key = arangodb.arango_id_to_key(alt_id)
-                    yield (arangodb.equiv_nodes_name, {'_key': alt_id_key, 'name': alt_id, 'namespace': ns, 'source': source, 'version': version})
+                    if seen_nodes.add(alt_id_key):
+                        yield (arangodb.equiv_nodes_name, {'_key': alt_id_key, 'name': alt_id, 'namespace': ns, 'source': source, 'version': version})
+
+                    edge_key = bel.utils._create_hash(f'{term_id}>>{alt_id}')
+                    if not seen_edges.add(edge_key):
+                        continue
 
                     arango_edge = {
                         '_from': f"{arangodb.equiv_nodes_name}/{term_key}",
                         '_to': f"{arangodb.equiv_nodes_name}/{alt_id_key}",
-                        '_key': bel.utils._create_hash(f'{term_id}>>{alt_id}'),
+                        '_key': edge_key,
                         'type': 'equivalent_to',
                         'source': source,
                         'version': version,
@@ -151,12 +170,17 @@ def terms_iterator_for_arangodb(fo, version):
                     (ns, val) = eqv.split(':', maxsplit=1)
                     eqv_key = arangodb.arango_id_to_key(eqv)
 
-                    yield (arangodb.equiv_nodes_name, {'_key': eqv_key, 'name': eqv, 'namespace': ns, 'source': source, 'version': version})
+                    if seen_nodes.add(eqv_key):
+                        yield (arangodb.equiv_nodes_name, {'_key': eqv_key, 'name': eqv, 'namespace': ns, 'source': source, 'version': version})
+
+                    edge_key = bel.utils._create_hash(f'{term_id}>>{eqv}')
+                    if not seen_edges.add(edge_key):
+                        continue
 
                     arango_edge = {
                         '_from': f"{arangodb.equiv_nodes_name}/{term_key}",
                         '_to': f"{arangodb.equiv_nodes_name}/{eqv_key}",
-                        '_key': bel.utils._create_hash(f'{term_id}>>{eqv}'),
+                        '_key': edge_key,
                         'type': 'equivalent_to',
                         'source': source,
                         'version': version,
@@ -170,9 +194,9 @@ def terms_iterator_for_elasticsearch(fo: IO, index_name: str):
     species_list = config['bel_resources'].get('species_list', [])
 
     fo.seek(0)  # Seek back to beginning of file
-    with gzip.open(fo, 'rt') as f:
+    with compression.open_file(fo, 'rt') as f:
         for line in f:
-            term = json.loads(line)
+            term = codec.loads(line)
             # skip if not term record (e.g. is a metadata record)
             if 'term' not in term:
                 continue
@@ -1,11 +1,11 @@
 import timy
-import json
-import gzip
 
 from arango import ArangoError
 
 from typing import IO
 
+import bel.codec as codec
+import bel.compression as compression
 import bel.utils
 import bel.db.arangodb as arangodb
 
@@ -14,6 +14,13 @@ from bel.Config import config
 from structlog import get_logger
 log = get_logger()
 
+remove_old_orthologs_query = arangodb.AQLQuery('remove_old_orthologs', """
+    FOR doc IN @@collection
+        FILTER doc.source == @source
+        FILTER doc.version != @version
+        REMOVE doc IN @@collection
+""")
+
 
 def load_orthologs(fo: IO, metadata: dict):
     """Load orthologs into ArangoDB
@@ -29,25 +36,20 @@ def load_orthologs(fo: IO, metadata: dict):
     with timy.Timer('Load Orthologs') as timer:
         arango_client = arangodb.get_client()
         belns_db = arangodb.get_belns_handle(arango_client)
-        arangodb.batch_load_docs(belns_db, orthologs_iterator(fo, version), on_duplicate='update')
+        report = arangodb.batch_load_docs(belns_db, orthologs_iterator(fo, version), on_duplicate='update')
 
-        log.info('Load orthologs', elapsed=timer.elapsed, source=metadata['metadata']['source'])
+        log.info('Load orthologs', elapsed=timer.elapsed, source=metadata['metadata']['source'], report=report)
 
         # Clean up old entries
-        remove_old_ortholog_edges = f'''
-            FOR edge in ortholog_edges
-                FILTER edge.source == "{metadata["metadata"]["source"]}"
-                FILTER edge.version != "{version}"
-                REMOVE edge IN ortholog_edges
-        '''
-        remove_old_ortholog_nodes = f'''
-            FOR node in ortholog_nodes
-                FILTER node.source == "{metadata["metadata"]["source"]}"
-                FILTER node.version != "{version}"
-                REMOVE node IN ortholog_nodes
-        '''
-        arangodb.aql_query(belns_db, remove_old_ortholog_edges)
-        arangodb.aql_query(belns_db, remove_old_ortholog_nodes)
+        for collection_name in [arangodb.ortholog_edges_name, arangodb.ortholog_nodes_name]:
+            bind_vars = {'@collection': collection_name, 'source': metadata['metadata']['source'], 'version': version}
+            remove_old_orthologs_query.execute(belns_db, bind_vars=bind_vars)
+
+    # Ortholog groups are the connected components of the ortholog graph
+    with timy.Timer('Materialize Ortholog Groups') as timer:
+        arangodb.materialize_clusters(belns_db, arangodb.ortholog_nodes_name, arangodb.ortholog_edges_name, cluster_field='group_id')
+
+        log.info('Materialized ortholog groups', elapsed=timer.elapsed, source=metadata['metadata']['source'])
 
     # Add metadata to resource metadata collection
     metadata['_key'] = f"Orthologs_{metadata['metadata']['source']}"
@@ -58,14 +60,19 @@ def load_orthologs(fo: IO, metadata: dict):
 
 
 def orthologs_iterator(fo, version):
-    """Ortholog node and edge iterator"""
+    """Ortholog node and edge iterator
+
+    Each ortholog node is only yielded once per load.
+    """
 
     species_list = config['bel_resources'].get('species_list', [])
 
+    seen_nodes = bel.utils.SeenKeys()
+
     fo.seek(0)
-    with gzip.open(fo, 'rt') as f:
+    with compression.open_file(fo, 'rt') as f:
         for line in f:
-            edge = json.loads(line)
+            edge = codec.loads(line)
             if 'metadata' in edge:
                 source = edge['metadata']['source']
                 continue
@@ -90,9 +97,11 @@ def orthologs_iterator(fo, version):
                 obj_id = edge['object']['id']
 
                 # Subject node
-                yield (arangodb.ortholog_nodes_name, {'_key': subj_key, 'name': subj_id, 'tax_id': edge['subject']['tax_id'], 'source': source, 'version': version})
+                if seen_nodes.add(subj_key):
+                    yield (arangodb.ortholog_nodes_name, {'_key': subj_key, 'name': subj_id, 'tax_id': edge['subject']['tax_id'], 'source': source, 'version': version})
                 # Object node
-                yield (arangodb.ortholog_nodes_name, {'_key': obj_key, 'name': obj_id, 'tax_id': edge['object']['tax_id'], 'source': source, 'version': version})
+                if seen_nodes.add(obj_key):
+                    yield (arangodb.ortholog_nodes_name, {'_key': obj_key, 'name': obj_id, 'tax_id': edge['object']['tax_id'], 'source': source, 'version': version})
 
                 arango_edge = {
                     '_from': f"{arangodb.ortholog_nodes_name}/{subj_key}",
@@ -1,8 +1,8 @@
 import timy
-import json
-import gzip
 import copy
 
+import bel.codec as codec
+import bel.compression as compression
 import bel.utils
 import bel.db.elasticsearch as elasticsearch
 import bel.db.arangodb as arangodb
@@ -42,8 +42,8 @@ def load_resource(resource_url: str, forceupdate: bool = False):
 
         # Get metadata
         fo.seek(0)
-        with gzip.open(fo, 'rt') as f:
-            metadata = json.loads(f.__next__())
+        with compression.open_file(fo, 'rt') as f:
+            metadata = codec.loads(f.__next__())
 
         if 'metadata' not in metadata:
             log.error(f'Missing metadata entry for {resource_url}')
@@ -1,11 +1,12 @@
 import click
 import json
 import yaml
-import gzip
-import re
 import sys
+import itertools
 import timy
 
+import bel.codec as codec
+import bel.compression
 import bel.db.arangodb
 import bel.db.elasticsearch
 import bel.edge.edges
@@ -18,6 +19,11 @@ from bel.lang.belobj import BEL
 import bel.nanopub.nanopubs as bnn
 import bel.nanopub.files as bnf
 import bel.nanopub.belscripts
+import bel.nanopub.checkpoint
+import bel.nanopub.corpus
+import bel.nanopub.dedup
+import bel.nanopub.stats
+import bel.terms.orthologs
 
 import logging
 import logging.config
@@ -70,8 +76,18 @@ def nanopub():
 @click.option('--version', help='BEL language version')
 @click.option('--api', help='API Endpoint to use for BEL Entity validation')
 @click.option('--config_fn', help="BEL configuration file - overrides default configuration files")
+@click.option('--checkpoint_fn', help="Record progress in this checkpoint file to be able to resume the pipeline")
+@click.option('--checkpoint_every', default=1000, help="Nanopubs to process between checkpoints")
+@click.option('--resume', is_flag=True, default=False, help="Resume from the checkpoint in checkpoint_fn")
+@click.option('--nanopub_id', multiple=True, help="Only process these nanopubs from the indexed input_fn (see belc nanopub index)")
+@click.option('--start_id', help="Only process the indexed input_fn nanopubs starting at this nanopub id")
+@click.option('--end_id', help="Only process the indexed input_fn nanopubs up to and including this nanopub id")
+@click.option('--shard', help="Only process this shard of the indexed input_fn, e.g. 3/8 for the 3rd of 8 shards")
+@click.option('--dedup', is_flag=True, default=False, help="Skip duplicate nanopubs (same hash_nanopub digest)")
+@click.option('--dedup_report_fn', help="Write the skipped duplicate nanopubs to this JSONLines report file")
 @pass_context
-def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, namespace_targets, version, api, config_fn):
+def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, namespace_targets, version, api, config_fn,
+             checkpoint_fn, checkpoint_every, resume, nanopub_id, start_id, end_id, shard, dedup, dedup_report_fn):
     """BEL Pipeline - BEL Nanopubs into BEL Edges
 
     This will process BEL Nanopubs into BEL Edges by validating, orthologizing (if requested),
@@ -91,6 +107,24 @@ def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, names
         IF output fn has *.json*, will be written as a JSON file
         If output fn has *.yaml* or *.yml*,  will be written as a YAML file
         If output fn has *.jgf, will be written as JSON Graph Formatted file
+        If output fn has *.parquet, will be written as a columnar Parquet file (requires pyarrow)
+
+    \b
+    checkpoint_fn:
+        Records processed nanopubs, output file position and counts every checkpoint_every
+        nanopubs (JSONLines output or db_save).  Use --resume to restart from the checkpoint -
+        the output file is truncated to the checkpointed position and processed nanopubs are skipped.
+
+    \b
+    nanopub_id, start_id/end_id, shard:
+        Process individual nanopubs, a range of nanopubs (in file order) or one of a number of
+        equal sized shards of a JSONLines input_fn indexed with belc nanopub index - e.g. run
+        --shard 1/4 ... --shard 4/4 in parallel with a different output_fn each.
+
+    \b
+    dedup:
+        Only the first nanopub with each hash_nanopub digest is processed - duplicates are
+        dropped before they are processed into edges and listed in dedup_report_fn.
     """
 
     if config_fn:
@@ -109,12 +143,16 @@ def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, names
     api = utils.first_true([api, config['bel_api']['servers'].get('api_url', None)], None)
     version = utils.first_true([version, config['bel']['lang'].get('default_bel_version', None)], None)
 
+    # Orthologize with the in-process ortholog groups instead of an ortholog query per gene
+    if species:
+        bel.terms.orthologs.use_ortholog_table()
+
     n = bnn.Nanopub()
 
     try:
-        json_flag, jsonl_flag, yaml_flag, jgf_flag = False, False, False, False
-        all_bel_edges = []
-        fout = None
+        jsonl_flag = False
+        fout, writer, corpus = None, None, None
+        checkpoint, state = None, {}
 
         if db_save or db_delete:
             if db_delete:
@@ -125,25 +163,60 @@ def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, names
 
             edgestore_handle = bel.db.arangodb.get_edgestore_handle(arango_client)
 
-        elif re.search('ya?ml', output_fn):
-            yaml_flag = True
-        elif 'jsonl' in output_fn:
-            jsonl_flag = True
-        elif 'json' in output_fn:
-            json_flag = True
-        elif 'jgf' in output_fn:
-            jgf_flag = True
+        else:
+            jsonl_flag = bnf.records_file_format(output_fn) == 'jsonl'
+
+        if checkpoint_fn:
+            if db_save or jsonl_flag:
+                checkpoint = bel.nanopub.checkpoint.Checkpoint(checkpoint_fn)
+            else:
+                log.warning('Checkpoints are only supported for JSONLines output or db_save')
+
+        # Options selecting the nanopubs - a checkpoint only applies to the same selection
+        run_options = {
+            'input_fn': input_fn,
+            'output_fn': output_fn,
+            'nanopub_id': list(nanopub_id),
+            'start_id': start_id,
+            'end_id': end_id,
+            'shard': shard,
+            'dedup': bool(dedup or dedup_report_fn),
+        }
+
+        if checkpoint and resume:
+            state = checkpoint.load() or {}
+            changed = bel.nanopub.checkpoint.changed_options(state, run_options) if state else []
+            if changed:
+                saved = ', '.join(f'{name}: {state.get(name)}' for name in changed)
+                log.error(f'Checkpoint {checkpoint_fn} was saved with different options - {saved}')
+                sys.exit(1)
+            if state:
+                log.info(f'Resuming pipeline after {state["nanopub_cnt"]} nanopubs')
 
         if db_save:
             pass
-        elif 'gz' in output_fn:
-            fout = gzip.open(output_fn, 'wt')
+        elif jsonl_flag:
+            fout = bel.nanopub.checkpoint.ResumableOutput(output_fn, position=state.get('output_pos'))
+            writer = bnf.JSONLinesEdgesWriter(fout)
         else:
-            fout = open(output_fn, 'wt')
+            writer = bnf.open_edges_writer(output_fn)
 
-        nanopub_cnt = 0
+        nanopub_cnt = state.get('nanopub_cnt', 0)
+        edges_cnt = state.get('edges_cnt', 0)
         with timy.Timer() as timer:
-            for np in bnf.read_nanopubs(input_fn):
+            if nanopub_id or start_id or end_id or shard:
+                corpus = bel.nanopub.corpus.CorpusIndex(input_fn)
+                nanopubs = corpus.select(
+                    nanopub_ids=nanopub_id, start_id=start_id, end_id=end_id,
+                    shard=bel.nanopub.corpus.parse_shard(shard) if shard else None,
+                )
+            else:
+                nanopubs = bnf.read_nanopubs(input_fn)
+
+            if dedup or dedup_report_fn:
+                nanopubs = bel.nanopub.dedup.Deduplicator(report_fn=dedup_report_fn).filter(nanopubs)
+
+            for np in itertools.islice(nanopubs, nanopub_cnt, None):
                 # print('Nanopub:\n', json.dumps(np, indent=4))
 
                 nanopub_cnt += 1
@@ -151,26 +224,32 @@ def pipeline(ctx, input_fn, db_save, db_delete, output_fn, rules, species, names
                     timer.track(f'{nanopub_cnt} Nanopubs processed into Edges')
 
                 bel_edges = n.bel_edges(np, namespace_targets=namespace_targets, orthologize_target=species, rules=rules)
+                edges_cnt += len(bel_edges)
 
                 if db_save:
                     bel.edge.edges.load_edges_into_db(edgestore_handle, edges=bel_edges)
-                elif jsonl_flag:
-                    fout.write("{}\n".format(json.dumps(bel_edges)))
                 else:
-                    all_bel_edges.extend(bel_edges)
+                    writer.write(bel_edges)
 
-        if db_save:
-            pass
-        elif yaml_flag:
-            fout.write("{}\n".format(yaml.dumps(all_bel_edges)))
-        elif json_flag:
-            fout.write("{}\n".format(json.dumps(all_bel_edges)))
-        elif jgf_flag:
-            bnf.edges_to_jgf(output_fn, all_bel_edges)
+                if checkpoint and nanopub_cnt % checkpoint_every == 0:
+                    output_pos = fout.checkpoint() if fout else 0
+                    checkpoint.save(dict(
+                        run_options,
+                        nanopub_cnt=nanopub_cnt,
+                        edges_cnt=edges_cnt,
+                        output_pos=output_pos,
+                    ))
+
+        if checkpoint:
+            checkpoint.remove()
+
+        log.info(f'Processed {nanopub_cnt} nanopubs into {edges_cnt} edges')
 
     finally:
-        if fout:
-            fout.close()
+        if writer:
+            writer.close()
+        if corpus:
+            corpus.close()
 
 
 @nanopub.command(name="validate", context_settings=CONTEXT_SETTINGS)
@@ -227,17 +306,14 @@ def convert_belscript(ctx, input_fn, output_fn):
             docs = []
 
         # input file
-        if re.search('gz$', input_fn):
-            f = gzip.open(input_fn, 'rt')
-        else:
-            f = open(input_fn, 'rt')
+        f = bel.compression.open_file(input_fn, 'rt')
 
         # process belscript
         for doc in bel.nanopub.belscripts.parse_belscript(f):
             if yaml_flag or json_flag:
                 docs.append(doc)
             elif jsonl_flag:
-                out_fh.write("{}\n".format(json.dumps(doc)))
+                out_fh.write(codec.dumps_line(doc))
 
         if yaml_flag:
             yaml.dump(docs, out_fh)
@@ -253,10 +329,15 @@ def convert_belscript(ctx, input_fn, output_fn):
 @nanopub.command(name="reformat", context_settings=CONTEXT_SETTINGS)
 @click.option('--input_fn', '-i')
 @click.option('--output_fn', '-o')
+@click.option('--workers', default=0, help="Encode nanopubs in this many worker processes and compress in a background thread")
+@click.option('--batch_size', default=1000, help="Nanopubs per write (and per worker task)")
 @pass_context
-def reformat(ctx, input_fn, output_fn):
+def reformat(ctx, input_fn, output_fn, workers, batch_size):
     """Reformat between JSON, YAML, JSONLines formats
 
+    Nanopubs are streamed from the input file to the output file so memory use
+    does not depend on the number of nanopubs.
+
     \b
     input_fn:
         If input fn has *.gz, will read as a gzip file
@@ -265,69 +346,121 @@ def reformat(ctx, input_fn, output_fn):
     output_fn:
         If output fn has *.gz, will written as a gzip file
         If output fn has *.jsonl*, will written as a JSONLines file
-        IF output fn has *.json*, will be written as a JSON file
-        If output fn has *.yaml* or *.yml*,  will be written as a YAML file
+        IF output fn has *.json*, will be written as a JSON file (one nanopub per line)
+        If output fn has *.yaml* or *.yml*,  will be written as a YAML file (one document per nanopub)
     """
 
-    try:
+    with bnf.open_nanopubs_writer(output_fn, background=workers > 0) as writer:
+        with timy.Timer() as timer:
+            writer.write_all(bnf.read_nanopubs(input_fn), batch_size=batch_size, workers=workers)
+            timer.track(f'{writer.records_cnt} Nanopubs reformatted')
 
-        (out_fh, yaml_flag, jsonl_flag, json_flag) = bel.nanopub.files.create_nanopubs_fh(output_fn)
-        if yaml_flag or json_flag:
-            docs = []
 
-        # input file
-        if re.search('gz$', input_fn):
-            f = gzip.open(input_fn, 'rt')
-        else:
-            f = open(input_fn, 'rt')
+@nanopub.command(name="dedup", context_settings=CONTEXT_SETTINGS)
+@click.option('--input_fn', '-i')
+@click.option('--output_fn', '-o')
+@click.option('--report_fn', help="Duplicate report JSONLines filename")
+@click.option('--max_digests', default=bel.nanopub.dedup.default_max_digests, help="Nanopub digests kept in memory before spilling to disk")
+@click.option('--spill_dir', help="Directory for spilled nanopub digests - defaults to the system temporary directory")
+@pass_context
+def nanopub_dedup(ctx, input_fn, output_fn, report_fn, max_digests, spill_dir):
+    """Remove duplicate nanopubs
 
-        for np in bnf.read_nanopubs(input_fn):
-            if yaml_flag or json_flag:
-                docs.append(np)
-            elif jsonl_flag:
-                out_fh.write("{}\n".format(json.dumps(np)))
+    Writes the first nanopub with each hash_nanopub digest (same type, citation,
+    assertions and annotations) to output_fn and lists the duplicates in report_fn.
+    """
 
-        if yaml_flag:
-            yaml.dump(docs, out_fh)
+    dedup = bel.nanopub.dedup.Deduplicator(report_fn=report_fn, max_digests=max_digests, spill_dir=spill_dir)
+    with bnf.open_nanopubs_writer(output_fn) as writer:
+        with timy.Timer() as timer:
+            writer.write_all(dedup.filter(bnf.read_nanopubs(input_fn)))
+            timer.track(f'{dedup.nanopubs_cnt} Nanopubs deduplicated - {dedup.duplicates_cnt} duplicates removed')
 
-        elif json_flag:
-            json.dump(docs, out_fh, indent=4)
 
-    finally:
-        f.close()
-        out_fh.close()
+@nanopub.command(name="index", context_settings=CONTEXT_SETTINGS)
+@click.argument('input_fn')
+@pass_context
+def nanopub_index(ctx, input_fn):
+    """Index JSONLines nanopub file for random access
 
+    Creates <input_fn>.idx mapping nanopub ids and hash_nanopub digests to the
+    nanopub file offsets.  input_fn must be uncompressed or BGZF compressed
+    (*.gz files written by belc nanopub reformat).
+    """
 
-@nanopub.command(name="stats", context_settings=CONTEXT_SETTINGS)
+    with timy.Timer() as timer:
+        nanopubs_cnt = bel.nanopub.corpus.index_corpus(input_fn)
+        timer.track(f'{nanopubs_cnt} Nanopubs indexed')
+
+
+@nanopub.command(name="extract", context_settings=CONTEXT_SETTINGS)
 @click.argument('input_fn')
+@click.option('--output_fn', '-o', default='-', help="Nanopubs output filename - defaults to STDOUT")
+@click.option('--nanopub_id', multiple=True, help="Nanopub id to extract")
+@click.option('--hash', 'digest', multiple=True, help="hash_nanopub digest of nanopub to extract")
+@click.option('--start_id', help="Extract nanopubs starting at this nanopub id")
+@click.option('--end_id', help="Extract nanopubs up to and including this nanopub id")
+@click.option('--shard', help="Extract this shard of the nanopubs, e.g. 3/8 for the 3rd of 8 shards")
 @pass_context
-def nanopub_stats(ctx, input_fn):
-    """Collect statistics on nanopub file
+def nanopub_extract(ctx, input_fn, output_fn, nanopub_id, digest, start_id, end_id, shard):
+    """Extract nanopubs from indexed JSONLines nanopub file
 
-    input_fn can be json, jsonl or yaml and additionally gzipped
+    Nanopubs are extracted by id, by hash_nanopub digest, by range (in file order)
+    or by shard using the index created by belc nanopub index.
     """
 
-    counts = {'nanopubs': 0, 'assertions': {'total': 0, 'subject_only': 0, 'nested': 0, 'relations': {}}}
+    with bel.nanopub.corpus.CorpusIndex(input_fn) as corpus:
+        nanopubs = corpus.select(
+            nanopub_ids=nanopub_id, digests=digest, start_id=start_id, end_id=end_id,
+            shard=bel.nanopub.corpus.parse_shard(shard) if shard else None,
+        )
+        with bnf.open_nanopubs_writer(output_fn) as writer:
+            writer.write_all(nanopubs)
 
-    for np in bnf.read_nanopubs(input_fn):
-        if 'nanopub' in np:
-            counts['nanopubs'] += 1
-            counts['assertions']['total'] += len(np['nanopub']['assertions'])
-            for assertion in np['nanopub']['assertions']:
-                if assertion['relation'] is None:
-                    counts['assertions']['subject_only'] += 1
-                else:
-                    if re.match('\s*\(', assertion['object']):
-                        counts['assertions']['nested'] += 1
 
-                    if not assertion.get('relation') in counts['assertions']['relations']:
-                        counts['assertions']['relations'][assertion.get('relation')] = 1
-                    else:
-                        counts['assertions']['relations'][assertion.get('relation')] += 1
+@nanopub.command(name="diff", context_settings=CONTEXT_SETTINGS)
+@click.argument('input_fn')
+@click.argument('other_fn')
+@click.option('--nanopub_id', multiple=True, help="Show differences of this nanopub")
+@pass_context
+def nanopub_diff(ctx, input_fn, other_fn, nanopub_id):
+    """Compare two indexed JSONLines nanopub files
+
+    Lists the nanopub ids added, removed and changed in other_fn compared to input_fn,
+    or shows the differences of the nanopub_id nanopubs.  Changed nanopubs have different
+    citations, assertions (including case-only edits) or annotations (including labels) -
+    other fields, e.g. evidence, are not compared.
+    """
+
+    with bel.nanopub.corpus.CorpusIndex(input_fn) as corpus, bel.nanopub.corpus.CorpusIndex(other_fn) as other:
+        if nanopub_id:
+            for np_id in nanopub_id:
+                sys.stdout.writelines(bel.nanopub.corpus.diff_nanopub(corpus, other, np_id))
+        else:
+            print(json.dumps(bel.nanopub.corpus.diff_corpora(corpus, other), indent=4))
+
+
+@nanopub.command(name="stats", context_settings=CONTEXT_SETTINGS)
+@click.argument('input_fn')
+@click.option('--workers', default=0, help="Profile nanopubs in this many worker processes")
+@click.option('--batch_size', default=1000, help="Nanopubs per worker task (input files without an index)")
+@click.option('--partialparse', is_flag=True, default=False, help="Tokenize assertions with the BEL partialparse tokenizer (counts parse errors)")
+@click.option('--top', default=100, help="Number of most frequent NSArgs to list")
+@pass_context
+def nanopub_stats(ctx, input_fn, workers, batch_size, partialparse, top):
+    """Collect statistics on nanopub file
+
+    input_fn can be json, jsonl or yaml and additionally gzipped
+
+    Counts nanopubs, assertions (subject only, nested), relations, functions,
+    namespaces and NSArgs with histograms of assertion depth (function nesting)
+    and assertions per nanopub.  With --workers, JSONLines files indexed with
+    belc nanopub index are profiled as one shard per worker.
+    """
 
-    counts['assertions']['relations'] = sorted(counts['assertions']['relations'])
+    profile = bel.nanopub.stats.profile_corpus(input_fn, workers=workers, batch_size=batch_size, partialparse=partialparse)
 
-    print('DumpVar:\n', json.dumps(counts, indent=4))
+    print(json.dumps(profile.to_dict(top=top), indent=4))
 
 
 @belc.group()
@@ -570,3 +703,62 @@ def arangodb(delete, db_name):
         bel.db.arangodb.get_belns_handle(client)
     elif db_name == 'edgestore':
         bel.db.arangodb.get_edgestore_handle(client)
+
+
+@db.command(name='component_index')
+@click.argument('output_fn')
+def component_index(output_fn):
+    """Export the EdgeStore node subcomponent index
+
+    output_fn: gzipped JSONLines file for bel.edge.components.ComponentIndex.load"""
+
+    import bel.edge.components
+
+    index = bel.edge.components.ComponentIndex.from_edgestore()
+    index.save(output_fn)
+
+    print(f'Saved {len(index)} subcomponents for {index.nodes_cnt} nodes to {output_fn}')
+    for (term, cnt) in index.most_common(10):
+        print(f'{cnt:10}  {term}')
+
+
+@db.command(name='export_edges')
+@click.argument('output_fn')
+@click.option('--row_group_size', default=100000, help="Edges per Parquet row group")
+def export_edges(output_fn, row_group_size):
+    """Export EdgeStore edges to a columnar Parquet file
+
+    output_fn: Parquet file - see bel.edge.columnar for the columns (requires pyarrow)"""
+
+    import bel.edge.columnar
+
+    edges_cnt = bel.edge.columnar.export_edgestore(output_fn, row_group_size=row_group_size)
+
+    print(f'Exported {edges_cnt} edges to {output_fn}')
+
+
+@db.command(name='advise_indexes')
+def advise_indexes():
+    """Explain the standard EdgeStore queries and flag full collection scans
+
+    Run 'belc db arangodb edgestore' first to add any missing managed indexes.
+    Exits with status 1 if any query needs a full collection scan."""
+
+    import bel.edge.pipeline
+    import bel.edge.queries
+
+    queries = bel.edge.pipeline.edgestore_standard_queries + bel.edge.queries.standard_queries
+    reports = bel.db.arangodb.advise_indexes(bel.edge.pipeline.edgestore_db, queries)
+
+    for report in reports:
+        if report.get('error'):
+            status = f'ERROR {report["error"]}'
+        elif report['full_scan']:
+            status = f'FULL SCAN of {", ".join(report["scans"])}'
+        else:
+            status = 'OK'
+        indexes = ', '.join([f'{coll}.{"+".join(fields)} ({index_type})' for (coll, index_type, fields) in report['indexes']])
+        print(f'{report["name"]:30} {status:40} cost: {report["estimated_cost"]}  indexes: {indexes}')
+
+    if any(report['full_scan'] for report in reports):
+        sys.exit(1)
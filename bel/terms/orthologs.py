@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Mapping
 
 import bel.db.arangodb
 import bel.terms.terms
 
+from bel.Config import config
+
 import structlog
 log = structlog.getLogger()
 
@@ -11,6 +13,83 @@ default_canonical_namespace = 'EG'  # for genes, proteins
 arangodb_client = bel.db.arangodb.get_client()
 belns_db = bel.db.arangodb.get_belns_handle(arangodb_client)
 
+# In-process ortholog groups used by get_orthologs when loaded (see use_ortholog_table)
+ortholog_table = None
+
+# Orthologs are all of the nodes in the gene's materialized ortholog group
+orthologs_query = bel.db.arangodb.AQLQuery('get_orthologs', """
+    FOR start IN ortholog_nodes
+        FILTER start._key == @key
+        LET orthologs = (
+            FOR vertex IN ortholog_nodes
+                FILTER start.group_id != null
+                FILTER vertex.group_id == start.group_id
+                RETURN DISTINCT { "name": vertex.name, "tax_id": vertex.tax_id }
+        )
+        RETURN { group_id: start.group_id, orthologs: orthologs }
+""", batch_size=20)
+
+orthologs_species_query = bel.db.arangodb.AQLQuery('get_orthologs_species', """
+    FOR start IN ortholog_nodes
+        FILTER start._key == @key
+        LET orthologs = (
+            FOR vertex IN ortholog_nodes
+                FILTER start.group_id != null
+                FILTER vertex.group_id == start.group_id
+                FILTER vertex._key == start._key OR vertex.tax_id IN @species
+                RETURN DISTINCT { "name": vertex.name, "tax_id": vertex.tax_id }
+        )
+        RETURN { group_id: start.group_id, orthologs: orthologs }
+""", batch_size=20)
+
+orthologs_traversal_query = bel.db.arangodb.AQLQuery('get_orthologs_traversal', """
+    LET start = (
+        FOR vertex in ortholog_nodes
+            FILTER vertex._key == @key
+            RETURN { "name": vertex.name, "tax_id": vertex.tax_id }
+    )
+
+    LET orthologs = (
+        FOR vertex IN 1..3
+            ANY @start ortholog_edges
+            OPTIONS { bfs: true, uniqueVertices : 'global' }
+            RETURN DISTINCT { "name": vertex.name, "tax_id": vertex.tax_id }
+    )
+
+    RETURN { 'orthologs': FLATTEN(UNION(start, orthologs)) }
+""", batch_size=20)
+
+orthologs_traversal_species_query = bel.db.arangodb.AQLQuery('get_orthologs_traversal_species', """
+    LET start = (
+        FOR vertex in ortholog_nodes
+            FILTER vertex._key == @key
+            RETURN { "name": vertex.name, "tax_id": vertex.tax_id }
+    )
+
+    LET orthologs = (
+        FOR vertex IN 1..3
+            ANY @start ortholog_edges
+            OPTIONS { bfs: true, uniqueVertices : 'global' }
+            FILTER vertex.tax_id IN @species
+            RETURN DISTINCT { "name": vertex.name, "tax_id": vertex.tax_id }
+    )
+
+    RETURN { 'orthologs': FLATTEN(UNION(start, orthologs)) }
+""", batch_size=20)
+
+ortholog_table_query = bel.db.arangodb.AQLQuery('ortholog_table', """
+    FOR node IN ortholog_nodes
+        FILTER node.group_id != null
+        RETURN [node.name, node.tax_id, node.group_id]
+""", batch_size=10000, ttl=3600)
+
+ortholog_table_species_query = bel.db.arangodb.AQLQuery('ortholog_table_species', """
+    FOR node IN ortholog_nodes
+        FILTER node.tax_id IN @species
+        FILTER node.group_id != null
+        RETURN [node.name, node.tax_id, node.group_id]
+""", batch_size=10000, ttl=3600)
+
 
 def get_orthologs(canonical_gene_id: str, species: list = []) -> List[dict]:
     """Get orthologs for given gene_id and species
@@ -26,36 +105,167 @@ def get_orthologs(canonical_gene_id: str, species: list = []) -> List[dict]:
         List[dict]: {'tax_id': <tax_id>, 'canonical': canonical_id, 'decanonical': decanonical_id}
     """
 
-    gene_id_key = bel.db.arangodb.arango_id_to_key(canonical_gene_id)
     orthologs = {}
 
+    results = get_orthologs_from_table(canonical_gene_id, species)
+    if results is None:
+        results = get_orthologs_from_db(canonical_gene_id, species)
+
+    if not results:
+        return orthologs
+
+    # Ortholog node names are primary term ids - normalize them with one equivalents query
+    norms = bel.terms.terms.get_normalized_terms_batch([ortholog['name'] for ortholog in results['orthologs']])
+    for ortholog in results['orthologs']:
+        orthologs[ortholog['tax_id']] = {
+            'canonical': norms[ortholog['name']]['canonical'],
+            'decanonical': norms[ortholog['name']]['decanonical'],
+        }
+
+    return orthologs
+
+
+def get_orthologs_from_table(gene_id: str, species: list = []) -> dict:
+    """Get orthologs from the loaded ortholog_table
+
+    Returns:
+        dict: {'orthologs': [{'name': ..., 'tax_id': ...}, ...]} - None if the ortholog_table isn't
+            loaded, doesn't cover all of the requested species or doesn't contain gene_id
+    """
+
+    if ortholog_table is None or not ortholog_table.covers(species):
+        return None
+
+    table_orthologs = ortholog_table.get_orthologs(gene_id, species)
+    if not table_orthologs:
+        return None
+
+    return {'orthologs': [{'name': name, 'tax_id': tax_id} for (tax_id, name) in table_orthologs.items()]}
+
+
+def get_orthologs_from_db(gene_id: str, species: list = []) -> dict:
+    """Get orthologs with the ortholog group lookup
+
+    Returns:
+        dict: {'group_id': ..., 'orthologs': [{'name': ..., 'tax_id': ...}, ...]} - None if gene_id isn't an ortholog node
+    """
+
+    gene_id_key = bel.db.arangodb.arango_id_to_key(gene_id)
+
     if species:
-        query_filter = f"FILTER vertex.tax_id IN {species}"
+        query = orthologs_species_query
+        bind_vars = {'key': gene_id_key, 'species': species}
+    else:
+        query = orthologs_query
+        bind_vars = {'key': gene_id_key}
 
-    query = f'''
-        LET start = (
-            FOR vertex in ortholog_nodes
-                FILTER vertex._key == "{gene_id_key}"
-                RETURN {{ "name": vertex.name, "tax_id": vertex.tax_id }}
-        )
+    cursor = query.execute(belns_db, bind_vars=bind_vars)
+    results = next(cursor, None)
+    if results and results['group_id'] is None:
+        results = get_orthologs_by_traversal(gene_id_key, species)
 
-        LET orthologs = (
-            FOR vertex IN 1..3
-                ANY "ortholog_nodes/{gene_id_key}" ortholog_edges
-                OPTIONS {{ bfs: true, uniqueVertices : 'global' }}
-                {query_filter}
-                RETURN DISTINCT {{ "name": vertex.name, "tax_id": vertex.tax_id }}
-        )
+    return results
 
-        RETURN {{ 'orthologs': FLATTEN(UNION(start, orthologs)) }}
-    '''
 
-    cursor = belns_db.aql.execute(query, batch_size=20)
-    results = cursor.pop()
-    for ortholog in results['orthologs']:
-        norms = bel.terms.terms.get_normalized_terms(ortholog['name'])
-        orthologs[ortholog['tax_id']] = {'canonical': norms['canonical'], 'decanonical': norms['decanonical']}
+def get_orthologs_by_traversal(gene_id_key: str, species: list = []) -> dict:
+    """Get orthologs by traversing ortholog_edges
 
-    return orthologs
+    Only used for ortholog nodes loaded before ortholog groups were materialized
+    (see bel.db.arangodb.materialize_clusters)
+    """
+
+    if species:
+        query = orthologs_traversal_species_query
+        bind_vars = {'key': gene_id_key, 'start': f'ortholog_nodes/{gene_id_key}', 'species': species}
+    else:
+        query = orthologs_traversal_query
+        bind_vars = {'key': gene_id_key, 'start': f'ortholog_nodes/{gene_id_key}'}
+
+    cursor = query.execute(belns_db, bind_vars=bind_vars)
+
+    return cursor.pop()
+
+
+class OrthologTable(object):
+    """In-process ortholog groups for pipeline workers
+
+    Loads the materialized ortholog groups for the given species (default is the
+    configured bel_resources.species_list) with one query so that ortholog lookups
+    don't need a database round trip.  Returns the ortholog gene ids as stored in
+    the ortholog nodes (not normalized like get_orthologs).
+
+    Use use_ortholog_table() to have get_orthologs (and so BEL.orthologize) use it.
+    """
+
+    def __init__(self, species: list = None) -> None:
+
+        if species is None:
+            species = config['bel_resources'].get('species_list', [])
+
+        self.species = species
+        self.groups = {}  # group_id -> [(gene_id, tax_id), ...]
+        self.gene_groups = {}  # gene_id -> group_id
+
+        if species:
+            query = ortholog_table_species_query
+            bind_vars = {'species': species}
+        else:
+            query = ortholog_table_query
+            bind_vars = {}
+
+        cursor = query.execute(belns_db, bind_vars=bind_vars)
+        for (gene_id, tax_id, group_id) in cursor:
+            self.gene_groups[gene_id] = group_id
+            self.groups.setdefault(group_id, []).append((gene_id, tax_id))
+
+        log.info('Loaded ortholog table', genes=len(self.gene_groups), groups=len(self.groups))
+
+    def __len__(self):
+        return len(self.gene_groups)
+
+    def covers(self, species: list) -> bool:
+        """True if all of the given species (all species if empty) were loaded"""
+
+        if not self.species:
+            return True
+
+        return bool(species) and set(species) <= set(self.species)
+
+    def get_orthologs(self, gene_id: str, species: list = []) -> Mapping[str, str]:
+        """Get orthologs for gene_id
+
+        Args:
+            gene_id: canonical gene_id, e.g. EG:207
+            species: target species for ortholog - tax id format TAX:<number>, default is all loaded species
+
+        Returns:
+            Mapping[str, str]: tax_id -> ortholog gene_id (includes the given gene_id)
+        """
+
+        group_id = self.gene_groups.get(gene_id)
+        if group_id is None:
+            return {}
+
+        return {
+            tax_id: ortholog_id for (ortholog_id, tax_id) in self.groups[group_id]
+            if not species or tax_id in species or ortholog_id == gene_id
+        }
+
+
+def use_ortholog_table(species: list = None) -> OrthologTable:
+    """Load the ortholog groups into an OrthologTable used by get_orthologs
+
+    Genes or species not in the table are still looked up in the database.
+
+    Args:
+        species: species to load - default is the configured bel_resources.species_list
+
+    Returns:
+        OrthologTable: loaded ortholog table
+    """
+
+    global ortholog_table
 
+    ortholog_table = OrthologTable(species)
 
+    return ortholog_table
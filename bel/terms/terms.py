@@ -17,6 +17,35 @@ es = bel.db.elasticsearch.get_client()
 arangodb_client = bel.db.arangodb.get_client()
 belns_db = bel.db.arangodb.get_belns_handle(arangodb_client)
 
+# Equivalents are all of the nodes in the term's materialized equivalence cluster
+equivalents_query = bel.db.arangodb.AQLQuery('get_equivalents', """
+    FOR start IN equivalence_nodes
+        FILTER start._key IN @keys
+        LET equivalents = (
+            FOR vertex IN equivalence_nodes
+                FILTER start.cluster_id != null
+                FILTER vertex.cluster_id == start.cluster_id
+                FILTER vertex._key != start._key
+                RETURN DISTINCT {
+                    term_id: vertex.name,
+                    namespace: vertex.namespace,
+                    primary: vertex.primary
+                }
+        )
+        RETURN {key: start._key, cluster_id: start.cluster_id, equivalents: equivalents}
+""", batch_size=1000)
+
+equivalents_traversal_query = bel.db.arangodb.AQLQuery('get_equivalents_traversal', """
+    FOR vertex, edge IN 1..5
+        ANY @start equivalence_edges
+        OPTIONS {bfs: true, uniqueVertices : 'global'}
+        RETURN DISTINCT {
+            term_id: vertex.name,
+            namespace: vertex.namespace,
+            primary: vertex.primary
+        }
+""", batch_size=20)
+
 
 def get_terms(term_id):
     """Get term(s) using term_id - given term_id may match multiple term records
@@ -67,22 +96,14 @@ def get_equivalents(term_id: str) -> List[Mapping[str, Union[str, bool]]]:
 
         term_id_key = bel.db.arangodb.arango_id_to_key(term_id)
 
-        equivalents = []
-        query = f"""
-        FOR vertex, edge IN 1..5
-            ANY 'equivalence_nodes/{term_id_key}' equivalence_edges
-            OPTIONS {{bfs: true, uniqueVertices : 'global'}}
-            RETURN DISTINCT {{
-                term_id: vertex.name,
-                namespace: vertex.namespace,
-                primary: vertex.primary
-            }}
-        """
-
-        cursor = belns_db.aql.execute(query, count=True, batch_size=20)
-        for doc in cursor:
-            if doc.get('term_id', False):
-                equivalents.append(doc)
+        cursor = equivalents_query.execute(belns_db, bind_vars={'keys': [term_id_key]})
+        result = next(cursor, None)
+        if result is None:
+            equivalents = []
+        elif result['cluster_id'] is not None:
+            equivalents = [doc for doc in result['equivalents'] if doc.get('term_id', False)]
+        else:
+            equivalents = get_equivalents_by_traversal(term_id_key)
 
         equivalents.append({'term_id': term_id, 'namespace': term_id.split(':')[0], 'primary': True})
 
@@ -93,6 +114,58 @@ def get_equivalents(term_id: str) -> List[Mapping[str, Union[str, bool]]]:
         return {'equivalents': [], 'errors': [f'Unexpected error {e}']}
 
 
+def get_equivalents_batch(term_ids: List[str]) -> Mapping[str, dict]:
+    """Get equivalents for many primary term ids with a single query
+
+    Unlike get_equivalents, the term ids are not resolved to their primary ID first
+    so use the primary term id.
+
+    Args:
+        term_ids (List[str]): primary term ids
+
+    Returns:
+        Mapping[str, dict]: term_id -> {'equivalents': [...], 'errors': [...]}
+    """
+
+    results = {}
+    for term_id in term_ids:
+        results[term_id] = {'equivalents': [], 'errors': []}
+
+    try:
+        keys = {bel.db.arangodb.arango_id_to_key(term_id): term_id for term_id in term_ids}
+
+        cursor = equivalents_query.execute(belns_db, bind_vars={'keys': list(keys.keys())})
+        for result in cursor:
+            term_id = keys[result['key']]
+            if result['cluster_id'] is not None:
+                equivalents = [doc for doc in result['equivalents'] if doc.get('term_id', False)]
+            else:
+                equivalents = get_equivalents_by_traversal(result['key'])
+            results[term_id]['equivalents'].extend(equivalents)
+
+        for term_id in term_ids:
+            results[term_id]['equivalents'].append({'term_id': term_id, 'namespace': term_id.split(':')[0], 'primary': True})
+
+    except Exception as e:
+        log.error(f'Problem getting term equivalents for {len(term_ids)} terms msg: {e}')
+        for term_id in term_ids:
+            results[term_id] = {'equivalents': [], 'errors': [f'Unexpected error {e}']}
+
+    return results
+
+
+def get_equivalents_by_traversal(term_id_key: str) -> List[Mapping[str, Union[str, bool]]]:
+    """Get equivalents by traversing equivalence_edges
+
+    Only used for equivalence nodes loaded before clusters were materialized
+    (see bel.db.arangodb.materialize_clusters)
+    """
+
+    cursor = equivalents_traversal_query.execute(belns_db, bind_vars={'start': f'equivalence_nodes/{term_id_key}'})
+
+    return [doc for doc in cursor if doc.get('term_id', False)]
+
+
 def get_normalized_term(term_id: str, equivalents: list, namespace_targets: dict) -> str:
     """Get normalized term"""
 
@@ -122,23 +195,37 @@ def get_labels(term_ids: list) -> dict:
     return term_labels
 
 
-def get_normalized_terms(term_id: str) -> dict:
-    """Get normalized terms - canonical/decanonical forms"""
+def normalize_term(term_id: str, equivalents: list) -> dict:
+    """Canonical/decanonical forms of term_id given its equivalents"""
 
     canonical = term_id
     decanonical = term_id
 
-    canonical_namespace_targets = config['bel']['lang']['canonical']
-    decanonical_namespace_targets = config['bel']['lang']['decanonical']
+    if equivalents:
+        canonical = get_normalized_term(term_id, equivalents, config['bel']['lang']['canonical'])
+        decanonical = get_normalized_term(canonical, equivalents, config['bel']['lang']['decanonical'])
+
+    return {'canonical': canonical, 'decanonical': decanonical, 'original': term_id}
+
+
+def get_normalized_terms(term_id: str) -> dict:
+    """Get normalized terms - canonical/decanonical forms"""
+
     results = get_equivalents(term_id)
-    equivalents = results['equivalents']
 
-    # log.debug(f'Equivalents: {equivalents}')
+    return normalize_term(term_id, results['equivalents'])
 
-    if equivalents:
-        canonical = get_normalized_term(term_id, equivalents, canonical_namespace_targets)
-        decanonical = get_normalized_term(canonical, equivalents, decanonical_namespace_targets)
 
-    # log.debug(f'canonical: {canonical}, decanonical: {decanonical}, original: {term_id}')
+def get_normalized_terms_batch(term_ids: List[str]) -> Mapping[str, dict]:
+    """Get normalized terms for many primary term ids with a single equivalents query
 
-    return {'canonical': canonical, 'decanonical': decanonical, 'original': term_id}
+    Args:
+        term_ids (List[str]): primary term ids (see get_equivalents_batch)
+
+    Returns:
+        Mapping[str, dict]: term_id -> {'canonical': ..., 'decanonical': ..., 'original': term_id}
+    """
+
+    results = get_equivalents_batch(list(dict.fromkeys(term_ids)))
+
+    return {term_id: normalize_term(term_id, results[term_id]['equivalents']) for term_id in term_ids}
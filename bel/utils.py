@@ -10,13 +10,14 @@ NOTE: reqsess allows caching external (including ElasticSearch and ArangoDB) RES
 import ulid
 import tempfile
 from cityhash import CityHash64
-import json
-from typing import Mapping, Any
+from typing import Mapping, Any, Iterable, Tuple
 import datetime
 import dateutil
 import requests
 import requests_cache
 
+import bel.codec
+
 from structlog import get_logger
 log = get_logger()
 
@@ -100,6 +101,73 @@ def first_true(iterable, default=False, pred=None):
     return next(filter(pred, iterable), default)
 
 
+def connected_components(pairs: Iterable[Tuple[str, str]]) -> Mapping[str, str]:
+    """Collect connected components of an undirected graph (union-find)
+
+    The component id is the lowest sorting node in the component so that
+    the result is stable across repeated runs on the same graph.
+
+    Args:
+        pairs: (node, node) tuples, one per edge
+
+    Returns:
+        Mapping[str, str]: node -> component id for every node seen in pairs
+    """
+
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]  # path halving
+            node = parent[node]
+        return node
+
+    for (a, b) in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b:
+            continue
+        if root_a < root_b:
+            parent[root_b] = root_a
+        else:
+            parent[root_a] = root_b
+
+    return {node: find(node) for node in parent}
+
+
+class SeenKeys(object):
+    """Compact set of already seen string keys
+
+    Keeps the CityHash64 of each key instead of the key itself which uses
+    a fraction of the memory of a set of strings for the millions of keys
+    in a terminology or ortholog load.  A hash collision (very unlikely for 64bit
+    hashes) would report an unseen key as seen.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    def __contains__(self, key: str) -> bool:
+        return CityHash64(key) in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, key: str) -> bool:
+        """Add key
+
+        Returns:
+            bool: True if key had not been seen before
+        """
+
+        key_hash = CityHash64(key)
+        if key_hash in self._hashes:
+            return False
+
+        self._hashes.add(key_hash)
+        return True
+
+
 def _create_hash_from_doc(doc: Mapping[str, Any]) -> str:
     """Create hash Id from edge record
 
@@ -110,7 +178,7 @@ def _create_hash_from_doc(doc: Mapping[str, Any]) -> str:
         str: Murmur3 128 bit hash
     """
 
-    doc_string = json.dumps(doc, sort_keys=True)
+    doc_string = bel.codec.canonical_dumps(doc)
     return _create_hash(doc_string)
 
 
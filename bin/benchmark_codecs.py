@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Usage:  benchmark_codecs.py [files...]
+
+Benchmark bel.codec backends (records/sec) decoding and encoding the records of
+nanopub, edge or terminology files - JSONLines (one record per line, e.g.
+terminology *.jsonl.gz files) or JSON arrays, optionally gzipped.  Defaults to
+the nanopub and edge test datasets.
+"""
+
+import glob
+import gzip
+import json
+import os
+import sys
+import timeit
+
+import bel.codec as codec
+
+datasets_dir = os.path.join(os.path.dirname(__file__), "..", "tests", "nanopub", "datasets")
+
+
+def read_records(fn: str):
+    """Raw JSON strings of the file records"""
+
+    opener = gzip.open if fn.endswith(".gz") else open
+    with opener(fn, "rt") as f:
+        if "jsonl" in fn:
+            return [line for line in f if line.strip()]
+
+        doc = json.load(f)
+        if not isinstance(doc, list):
+            doc = [doc]
+
+        return [json.dumps(record) for record in doc]
+
+
+def main():
+
+    fns = sys.argv[1:] or sorted(glob.glob(os.path.join(datasets_dir, "*.json")))
+
+    records = []
+    for fn in fns:
+        records.extend(read_records(fn))
+
+    if not records:
+        print("ERROR: no records found")
+        sys.exit(1)
+
+    # Small test datasets are repeated so that timings are meaningful
+    repeat = max(1, 100000 // len(records))
+    records = records * repeat
+    print(f"{len(records):,} records from {len(fns)} files, {sum(len(record) for record in records):,} bytes")
+
+    for backend in codec.available_backends():
+        codec.set_backend(backend)
+        docs = [codec.loads(record) for record in records]
+
+        elapsed = min(timeit.repeat(lambda: [codec.loads(record) for record in records], number=1, repeat=3))
+        print(f"{backend:10} loads       {len(records) / elapsed:12,.0f} records/sec  ({elapsed:.2f} sec)")
+
+        elapsed = min(timeit.repeat(lambda: [codec.dumps_line(doc) for doc in docs], number=1, repeat=3))
+        print(f"{backend:10} dumps_line  {len(records) / elapsed:12,.0f} records/sec  ({elapsed:.2f} sec)")
+
+    elapsed = min(timeit.repeat(lambda: [codec.canonical_dumps(doc) for doc in docs], number=1, repeat=3))
+    print(f"{'canonical':10} dumps       {len(records) / elapsed:12,.0f} records/sec  ({elapsed:.2f} sec)")
+
+
+if __name__ == "__main__":
+    main()
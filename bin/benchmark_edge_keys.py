@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Usage:  benchmark_edge_keys.py [edges_cnt] [nodes_cnt]
+
+Benchmark EdgeStore _key generation (keys/sec) of bel.edge.keys against
+deep copying and hashing whole documents with bel.utils._create_hash_from_doc
+and check that both create the same keys.
+"""
+
+import copy
+import random
+import sys
+import timeit
+
+import bel.utils as utils
+from bel.edge.keys import edge_key_exclude_fields, node_key, relation_key
+
+
+def make_edges(edges_cnt: int, nodes_cnt: int):
+    """Synthetic edges - nodes_cnt distinct nodes so that popular nodes repeat"""
+
+    random.seed(42)
+    nodes = []
+    for idx in range(nodes_cnt):
+        name = f"p(HGNC:GENE{idx})"
+        nodes.append(
+            {
+                "name": name,
+                "name_lc": name.lower(),
+                "label": name,
+                "label_lc": name.lower(),
+                "components": [name, f"HGNC:GENE{idx}"],
+            }
+        )
+
+    edges = []
+    for idx in range(edges_cnt):
+        subj, obj = random.choice(nodes), random.choice(nodes)
+        relation = {
+            "relation": "increases",
+            "edge_hash": str(idx),
+            "edge_dt": "2018-01-01T00:00:00.000Z",
+            "nanopub_url": f"http://nanopubstore/nanopubs/{idx // 20}",
+            "nanopub_id": str(idx // 20),
+            "citation": "PubMed:123",
+            "subject_canon": subj["name"],
+            "subject": subj["name"],
+            "object_canon": obj["name"],
+            "object": obj["name"],
+            "annotations": [{"type": "Species", "id": "TAX:9606", "label": "human"}],
+            "metadata": {"gd:updateTS": "2018-01-01T00:00:00.000Z", "project": "benchmark"},
+            "public_flag": True,
+            "edge_types": ["original", "primary"],
+            "species_id": "TAX:9606",
+            "species_label": "human",
+        }
+        edges.append({"edge": {"subject": subj, "relation": relation, "object": obj}})
+
+    return edges
+
+
+def doc_keys(edges):
+    """Previous edge_iterator key generation"""
+
+    keys = []
+    for edge in edges:
+        subj = copy.deepcopy(edge["edge"]["subject"])
+        subj_id = utils._create_hash_from_doc(subj)
+        obj = copy.deepcopy(edge["edge"]["object"])
+        obj_id = utils._create_hash_from_doc(obj)
+
+        relation = copy.deepcopy(edge["edge"]["relation"])
+        relation["_from"] = f"nodes/{subj_id}"
+        relation["_to"] = f"nodes/{obj_id}"
+        relation_hash = copy.deepcopy(relation)
+        for field in edge_key_exclude_fields:
+            relation_hash.pop(field, None)
+
+        keys.append((subj_id, obj_id, utils._create_hash_from_doc(relation_hash)))
+
+    return keys
+
+
+def edge_keys(edges):
+    """bel.edge.keys key generation"""
+
+    keys = []
+    for edge in edges:
+        subj_id = node_key(edge["edge"]["subject"])
+        obj_id = node_key(edge["edge"]["object"])
+
+        relation = dict(edge["edge"]["relation"])
+        relation["_from"] = f"nodes/{subj_id}"
+        relation["_to"] = f"nodes/{obj_id}"
+
+        keys.append((subj_id, obj_id, relation_key(relation)))
+
+    return keys
+
+
+def main():
+
+    edges_cnt = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    nodes_cnt = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    edges = make_edges(edges_cnt, nodes_cnt)
+
+    if doc_keys(edges[:1000]) != edge_keys(edges[:1000]):
+        print("ERROR: bel.edge.keys keys are not compatible")
+        sys.exit(1)
+
+    for (name, func) in [("deepcopy + _create_hash_from_doc", doc_keys), ("bel.edge.keys", edge_keys)]:
+        elapsed = min(timeit.repeat(lambda: func(edges), number=1, repeat=3))
+        # 3 keys per edge - subject, object and relation
+        print(f"{name:35} {edges_cnt * 3 / elapsed:12,.0f} keys/sec  ({elapsed:.2f} sec)")
+
+
+if __name__ == "__main__":
+    main()
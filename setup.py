@@ -39,6 +39,13 @@ REQUIRED = [
     'ulid-py',
 ]
 
+# Optional packages - e.g. pip install bel[fast,parquet]
+EXTRAS = {
+    'fast': ['orjson'],
+    'parquet': ['pyarrow'],
+    'zstd': ['zstandard'],
+}
+
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
 # Except, perhaps the License and Trove Classifiers!
@@ -110,6 +117,7 @@ setup(
         ],
     },
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     python_requires='~=3.6',
     include_package_data=True,
     license='Apache2',
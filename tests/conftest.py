@@ -0,0 +1,71 @@
+import pytest
+
+
+def edges_factory(cnt):
+    """Pipeline edges - each edge links p(HGNC:GENE<idx>) to p(HGNC:GENE<idx + 1>)"""
+
+    def node(gene):
+        name = f'p(HGNC:{gene})'
+        return {'name': name, 'name_lc': name.lower(), 'label': name, 'label_lc': name.lower(), 'components': [name, f'HGNC:{gene}']}
+
+    edges = []
+    for idx in range(cnt):
+        edges.append({
+            'edge': {
+                'subject': node(f'GENE{idx}'),
+                'relation': {
+                    'relation': 'increases',
+                    'edge_hash': str(idx),
+                    'nanopub_id': f'NP{idx // 3}',
+                    'citation': 'PubMed:123',
+                    'edge_types': ['original', 'primary'],
+                    'species_id': 'TAX:9606',
+                    'species_label': 'human',
+                    'annotations': [{'type': 'Species', 'id': 'TAX:9606', 'label': 'human'}],
+                    'metadata': {'gd:updateTS': '2018-01-01T00:00:00.000Z'},
+                },
+                'object': node(f'GENE{idx + 1}'),
+            }
+        })
+
+    return edges
+
+
+def nanopub_factory(nanopub_id, gene, pmid='123', relation=None, evidence=''):
+    """Nanopub with a single p(HGNC:<gene>) assertion - subject only unless relation is set"""
+
+    return {
+        'nanopub': {
+            'id': nanopub_id,
+            'type': {'name': 'BEL', 'version': '2.0.0'},
+            'citation': {'database': {'name': 'PubMed', 'id': pmid}},
+            'assertions': [{'subject': f'p(HGNC:{gene})', 'relation': relation, 'object': 'p(HGNC:EGF)' if relation else None}],
+            'annotations': [{'type': 'Species', 'id': 'TAX:9606', 'label': 'human'}],
+            'evidence': evidence,
+            'metadata': {'gd:updateTS': nanopub_id},
+        }
+    }
+
+
+def nanopubs_factory(cnt):
+    """Nanopubs NP00000, NP00001, ... citing 50 different PubMed ids with evidence of varying length"""
+
+    return [
+        nanopub_factory(f'NP{idx:05d}', f'GENE{idx}', pmid=str(idx % 50), relation='increases', evidence='x' * (idx % 200))
+        for idx in range(cnt)
+    ]
+
+
+@pytest.fixture
+def make_edges():
+    return edges_factory
+
+
+@pytest.fixture
+def make_nanopub():
+    return nanopub_factory
+
+
+@pytest.fixture
+def make_nanopubs():
+    return nanopubs_factory
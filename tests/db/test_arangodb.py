@@ -0,0 +1,193 @@
+import bel.db.arangodb as arangodb
+
+
+class MockAQL(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, query, **options):
+        self.calls.append((query, options))
+        return iter([{'name': 'HGNC:AKT1'}])
+
+    def explain(self, query):
+        self.calls.append((query, {}))
+        if 'nanopub_id' in query:
+            node = {'type': 'IndexNode', 'collection': 'edges', 'indexes': [{'type': 'hash', 'fields': ['nanopub_id']}]}
+        else:
+            node = {'type': 'EnumerateCollectionNode', 'collection': 'edges'}
+        return {'nodes': [{'type': 'SingletonNode'}, node], 'estimatedCost': 3}
+
+
+class MockCollection(object):
+
+    def __init__(self):
+        self.added = []
+        self.imported = []
+
+    def import_bulk(self, docs, on_duplicate=None, halt_on_error=None):
+        self.imported.append(len(docs))
+        return {'created': len(docs), 'errors': 0}
+
+    def indexes(self):
+        return [
+            {'type': 'primary', 'fields': ['_key']},
+            {'type': 'hash', 'fields': ['nanopub_id'], 'sparse': False},
+        ]
+
+    def add_hash_index(self, fields, unique=None, sparse=None):
+        self.added.append(('hash', fields, sparse))
+
+    def add_skiplist_index(self, fields, unique=None, sparse=None):
+        self.added.append(('skiplist', fields, sparse))
+
+
+class MockDB(object):
+
+    def __init__(self):
+        self.aql = MockAQL()
+        self.collections = {}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, MockCollection())
+
+
+def test_aql_query_bind_vars_and_stats():
+
+    query = arangodb.AQLQuery('test_get_node', 'FOR node IN @@nodes FILTER node.name == @name RETURN node', batch_size=10)
+
+    assert arangodb.aql_queries['test_get_node'] is query
+
+    db = MockDB()
+    results = list(query.execute(db, bind_vars={'@nodes': 'nodes', 'name': 'HGNC:AKT1'}))
+    results = list(query.execute(db, bind_vars={'@nodes': 'nodes', 'name': 'HGNC:AKT2'}, batch_size=100))
+
+    assert results == [{'name': 'HGNC:AKT1'}]
+
+    # Query string is constant - values are only passed as bind variables
+    (query_1, options_1), (query_2, options_2) = db.aql.calls
+    assert query_1 == query_2
+    assert options_1['batch_size'] == 10
+    assert options_2['batch_size'] == 100
+    assert options_2['bind_vars']['name'] == 'HGNC:AKT2'
+    assert 'stream' not in options_1
+
+    stats = arangodb.get_aql_query_stats()
+    assert stats['test_get_node']['count'] == 2
+    assert stats['test_get_node']['errors'] == 0
+
+
+class LegacyAQL(object):
+    """AQL API without the stream cursor option (python-arango 4.x)"""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, query, count=False, batch_size=None, ttl=None, bind_vars=None, cache=None):
+        self.calls.append(dict(count=count, batch_size=batch_size, ttl=ttl, cache=cache))
+        return iter([])
+
+
+def test_aql_query_unsupported_stream(monkeypatch):
+
+    query = arangodb.AQLQuery('test_stream_nodes', 'FOR node IN @@nodes RETURN node', batch_size=10)
+    monkeypatch.setitem(arangodb.config['bel_api'], 'aql_queries', {'test_stream_nodes': {'stream': True}})
+
+    db = MockDB()
+    db.aql = LegacyAQL()
+    list(query.execute(db, bind_vars={'@nodes': 'nodes'}))
+
+    assert db.aql.calls == [{'count': False, 'batch_size': 10, 'ttl': None, 'cache': None}]
+
+    # Options are passed through when execute() accepts them
+    db = MockDB()
+    list(query.execute(db, bind_vars={'@nodes': 'nodes'}))
+    assert db.aql.calls[0][1]['stream'] is True
+
+
+def test_inline_bind_vars():
+
+    query = arangodb.inline_bind_vars(
+        'FOR edge IN @@edges FILTER edge.nanopub_id IN @ids RETURN edge', {'@edges': 'edges', 'ids': ['A', 'B']}
+    )
+    assert query == 'FOR edge IN `edges` FILTER edge.nanopub_id IN ["A", "B"] RETURN edge'
+
+
+def test_ensure_indexes():
+
+    db = MockDB()
+    index_definitions = {'edges': [
+        {'type': 'hash', 'fields': ['nanopub_id']},
+        {'type': 'hash', 'fields': ['species_id'], 'sparse': True},
+        {'type': 'skiplist', 'fields': ['metadata.gd:updateTS']},
+    ]}
+    created = arangodb.ensure_indexes(db, index_definitions)
+
+    assert [index['fields'] for index in created] == [['species_id'], ['metadata.gd:updateTS']]
+    assert db.collection('edges').added == [('hash', ['species_id'], True), ('skiplist', ['metadata.gd:updateTS'], False)]
+
+
+def test_advise_indexes():
+
+    arangodb.AQLQuery('test_edges_by_nanopub', 'FOR edge IN @@edges FILTER edge.nanopub_id == @nanopub_id RETURN edge')
+    arangodb.AQLQuery('test_edges_by_hash', 'FOR edge IN @@edges FILTER edge.edge_hash == @edge_hash RETURN edge')
+
+    reports = arangodb.advise_indexes(MockDB(), [
+        ('test_edges_by_nanopub', {'@edges': 'edges', 'nanopub_id': 'A'}),
+        ('test_edges_by_hash', {'@edges': 'edges', 'edge_hash': '1'}),
+    ])
+
+    assert reports[0]['full_scan'] is False
+    assert reports[0]['indexes'] == [('edges', 'hash', ['nanopub_id'])]
+    assert reports[1]['full_scan'] is True
+    assert reports[1]['scans'] == ['edges']
+
+
+def test_batch_load_docs_batch_bytes():
+
+    db = MockDB()
+    docs = [('nodes', {'_key': f'{idx:04}', 'name': 'x' * 80}) for idx in range(250)]
+    docs += [('edges', {'_key': f'{idx:04}'}) for idx in range(3)]
+
+    report = arangodb.batch_load_docs(db, iter(docs), batch_size=1000, batch_bytes=5000, max_workers=1)
+
+    # ~100 byte nodes are imported ~50 at a time, the few edges in a single batch
+    assert sum(db.collection('nodes').imported) == 250
+    assert max(db.collection('nodes').imported) <= 51
+    assert db.collection('edges').imported == [3]
+    assert report['nodes']['created'] == 250
+    assert report['edges']['batches'] == 1
+
+
+class ClusterAQL(MockAQL):
+    """Edges a-b, b-c and d-e - a already has its cluster id, e a stale one"""
+
+    def execute(self, query, **options):
+        self.calls.append((query, options))
+        if query == arangodb.cluster_edges_query.query:
+            return iter([['nodes/b', 'nodes/a'], ['nodes/c', 'nodes/b'], ['nodes/d', 'nodes/e']])
+        return iter([['a', 'a'], ['b', None], ['c', None], ['d', 'd'], ['e', 'e'], ['f', 'f']])
+
+
+def test_materialize_clusters(monkeypatch):
+
+    db = MockDB()
+    db.aql = ClusterAQL()
+
+    loaded = []
+
+    def batch_load_docs(db, doc_iterator, on_duplicate='replace'):
+        loaded.extend(doc_iterator)
+
+    monkeypatch.setattr(arangodb, 'batch_load_docs', batch_load_docs)
+
+    counts = arangodb.materialize_clusters(db, 'nodes', 'edges', cluster_field='group_id')
+
+    # a, d and f are unchanged - only b, c and e are written back
+    assert counts == {'nodes': 6, 'clusters': 3, 'updated': 3}
+    assert loaded == [
+        ('nodes', {'_key': 'b', 'group_id': 'a'}),
+        ('nodes', {'_key': 'c', 'group_id': 'a'}),
+        ('nodes', {'_key': 'e', 'group_id': 'd'}),
+    ]
+    assert db.aql.calls[1][1]['bind_vars'] == {'@nodes': 'nodes', 'field': 'group_id'}
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import bel.edge.columnar as columnar  # noqa: E402
+import bel.nanopub.files as files  # noqa: E402
+
+
+def test_edge_row(make_edges):
+
+    row = columnar.edge_row(make_edges(1)[0])
+
+    assert sorted(row) == sorted(columnar.edge_column_names)
+    assert row['subject_canon'] == 'p(HGNC:GENE0)'
+    assert row['annotations'] == [{'type': 'Species', 'id': 'TAX:9606', 'label': 'human'}]
+    assert columnar.edge_row({'nanopub': {}}) is None
+
+
+def test_parquet_edges_writer(tmpdir, make_edges):
+
+    fn = str(tmpdir.join('edges.parquet'))
+    edges = make_edges(250)
+
+    with files.open_edges_writer(fn, row_group_size=100) as writer:
+        for idx in range(0, len(edges), 10):
+            writer.write(edges[idx:idx + 10] + [{'nanopub': {}}])  # non-edge records aren't written or counted
+
+    assert writer.records_cnt == 250
+    assert writer.row_groups_cnt == 3
+
+    table = columnar.read_edges_table(fn, columns=['subject_canon', 'relation'])
+    assert table.column_names == ['subject_canon', 'relation']
+    assert table.num_rows == 250
+    assert table.column('relation').type.value_type == 'string'  # dictionary encoded
+
+    rows = list(columnar.iter_edge_rows(fn, columns=['edge_hash', 'edge_types'], batch_size=64))
+    assert rows[5] == {'edge_hash': '5', 'edge_types': ['original', 'primary']}
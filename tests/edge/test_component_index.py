@@ -0,0 +1,44 @@
+from bel.edge.components import ComponentIndex, node_terms
+
+
+def make_index():
+
+    index = ComponentIndex()
+    index.add_node('1', 'p(HGNC:AKT1)', ['HGNC:AKT1'])
+    index.add_node('2', 'p(HGNC:AKT1, pmod(Ph))', ['HGNC:AKT1', 'pmod(Ph)'])
+    index.add_node('3', 'complex(p(HGNC:AKT1), p(HGNC:PDPK1))', ['p(HGNC:AKT1)', 'HGNC:AKT1', 'p(HGNC:PDPK1)', 'HGNC:PDPK1'])
+    index.add_node('4', 'p(HGNC:PDPK1, pmod(Ph))', ['HGNC:PDPK1', 'pmod(Ph)'])
+
+    return index
+
+
+def test_node_terms():
+
+    terms = node_terms('p(HGNC:AKT1, pmod(Ph))', ['HGNC:AKT1', 'pmod(Ph)'])
+    assert sorted(terms) == ['HGNC:AKT1', 'p()', 'pmod()', 'pmod(Ph)']
+
+
+def test_component_index():
+
+    index = make_index()
+
+    assert index.count('HGNC:AKT1') == 3
+    assert index.most_common(1) == [('p()', 4)]
+
+    assert index.node_keys(['HGNC:AKT1']) == ['1', '2', '3']
+    assert index.node_keys(['HGNC:AKT1', 'complex()']) == ['3']
+    assert index.node_keys(['HGNC:AKT1', 'pmod()']) == ['2']
+    assert index.node_keys(['HGNC:AKT1', 'HGNC:MISSING']) == []
+    assert index.node_ids(['HGNC:PDPK1', 'pmod()']) == ['nodes/4']
+
+
+def test_component_index_save_load(tmpdir):
+
+    index = make_index()
+    fn = str(tmpdir.join('components.jsonl.gz'))
+    index.save(fn)
+
+    loaded = ComponentIndex.load(fn)
+    assert loaded.nodes_cnt == 4
+    assert loaded.counts() == index.counts()
+    assert loaded.node_keys(['HGNC:AKT1', 'complex()']) == ['3']
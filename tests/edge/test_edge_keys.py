@@ -0,0 +1,56 @@
+import copy
+
+import bel.utils as utils
+from bel.edge.keys import edge_key_exclude_fields, node_key, node_key_cache_info, relation_key
+
+node = {
+    "name": "p(HGNC:TNF)",
+    "name_lc": "p(hgnc:tnf)",
+    "label": "p(HGNC:TNF)",
+    "label_lc": "p(hgnc:tnf)",
+    "components": ["p(HGNC:TNF)", "HGNC:TNF"],
+}
+
+relation = {
+    "relation": "increases",
+    "edge_hash": "123",
+    "edge_dt": "2018-01-01T00:00:00.000Z",
+    "nanopub_url": "http://nanopubstore/nanopubs/01",
+    "nanopub_id": "01",
+    "citation": "PubMed:123",
+    "subject_canon": "p(EG:7124)",
+    "subject": "p(HGNC:TNF)",
+    "object_canon": "p(EG:3569)",
+    "object": "p(HGNC:IL6)",
+    "annotations": [{"type": "Species", "id": "TAX:9606", "label": "human"}],
+    "metadata": {"gd:updateTS": "2018-01-01T00:00:00.000Z"},
+    "public_flag": True,
+    "edge_types": ["original", "primary"],
+    "species_id": "TAX:9606",
+    "species_label": "human",
+    "_from": "nodes/1",
+    "_to": "nodes/2",
+}
+
+
+def test_node_key():
+    """Node keys match hashing the whole node"""
+
+    assert node_key(node) == utils._create_hash_from_doc(node)
+    assert node_key(copy.deepcopy(node)) == utils._create_hash_from_doc(node)
+    assert node_key_cache_info().hits >= 1
+
+    # Not memoized - extra field
+    other_node = dict(node, species_id="TAX:9606")
+    assert node_key(other_node) == utils._create_hash_from_doc(other_node)
+
+
+def test_relation_key():
+    """Relation keys match hashing the relation without the excluded fields"""
+
+    relation_hash = copy.deepcopy(relation)
+    for field in edge_key_exclude_fields:
+        relation_hash.pop(field, None)
+
+    assert relation_key(relation) == utils._create_hash_from_doc(relation_hash)
+    assert relation_key(dict(relation, edge_dt="2019-01-01T00:00:00.000Z")) == relation_key(relation)
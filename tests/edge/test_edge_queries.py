@@ -0,0 +1,90 @@
+import bel.edge.queries as queries
+
+
+class MockAQL(object):
+    """Return edges with _key > @after sorted by _key up to @limit"""
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.calls = []
+        self.options = []
+
+    def execute(self, query, bind_vars=None, **options):
+        self.calls.append((query, bind_vars))
+        self.options.append(options)
+        keys = [key for key in self.keys if key > bind_vars['after']][:bind_vars['limit']]
+        return iter([{'_key': key} for key in keys])
+
+
+class MockDB(object):
+
+    def __init__(self, keys):
+        self.aql = MockAQL(keys)
+
+
+def test_node_neighborhood_pages():
+
+    db = MockDB([f'{idx:03}' for idx in range(25)])
+
+    page = queries.node_neighborhood('p(HGNC:TNF)', limit=10, db=db)
+    assert [edge['_key'] for edge in page['edges']] == [f'{idx:03}' for idx in range(10)]
+    assert page['cursor'] == '009'
+
+    page = queries.node_neighborhood('p(HGNC:TNF)', limit=10, cursor=page['cursor'], db=db)
+    assert page['edges'][0]['_key'] == '010'
+
+    page = queries.node_neighborhood('p(HGNC:TNF)', limit=10, cursor=page['cursor'], db=db)
+    assert len(page['edges']) == 5
+    assert page['cursor'] is None
+
+    (query, bind_vars) = db.aql.calls[0]
+    assert 'FILTER node.name == @node' in query
+    assert bind_vars['node'] == 'p(HGNC:TNF)'
+    assert bind_vars['limit'] == 11
+
+
+def test_iter_pages_max_results():
+
+    db = MockDB([f'{idx:03}' for idx in range(25)])
+
+    edges = list(queries.iter_node_neighborhood('HGNC:TNF', node_by='component', limit=10, max_results=15, db=db))
+    assert len(edges) == 15
+    assert len(db.aql.calls) == 2
+    assert 'FILTER @node IN node.components' in db.aql.calls[0][0]
+
+    edges = list(queries.iter_edges_by_citation('PubMed:123', limit=5000, db=MockDB(['1', '2'])))
+    assert len(edges) == 2
+
+
+def test_streaming_cursors():
+
+    edge_queries = list(queries.neighborhood_queries.values()) + list(queries.node_edges_queries.values())
+    edge_queries += [queries.k_hop_paths_query, queries.edges_by_citation_query]
+    assert all(query.stream for query in edge_queries)
+
+    db = MockDB(['1', '2'])
+    list(queries.iter_edges_by_citation('PubMed:123', db=db))
+    assert db.aql.options[0]['stream'] is True
+
+
+class MockPathsAQL(MockAQL):
+    """Return @limit paths"""
+
+    def execute(self, query, bind_vars=None, **options):
+        self.calls.append((query, bind_vars))
+        return iter([{'nodes': [], 'edges': []}] * bind_vars['limit'])
+
+
+def test_k_hop_paths_pruned():
+
+    db = MockDB([])
+    db.aql = MockPathsAQL([])
+
+    page = queries.k_hop_paths('p(HGNC:TNF)', hops=5, edge_types=['primary'], limit=2, cursor='4', db=db)
+    assert len(page['paths']) == 2
+    assert page['cursor'] == '6'
+
+    (query, bind_vars) = db.aql.calls[0]
+    assert 'PRUNE edge != null AND NOT' in query
+    assert 'path.edges[* FILTER' not in query  # filtered while traversing instead of on complete paths
+    assert (bind_vars['hops'], bind_vars['offset'], bind_vars['limit']) == (queries.max_hops, 4, 3)
@@ -0,0 +1,380 @@
+import copy
+
+import pytest
+
+import bel.db.arangodb as arangodb
+import bel.edge.pipeline as pipeline
+
+
+class MockCollection(object):
+    """Documents by _key with the document API calls used by the pipeline"""
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = []
+        self.rejecting = False  # reject all imported documents
+
+    def import_bulk(self, docs, on_duplicate=None, halt_on_error=None):
+        self.calls.append(('import_bulk', len(docs)))
+        if self.rejecting:
+            return {'created': 0, 'errors': len(docs), 'empty': 0, 'updated': 0, 'ignored': 0}
+
+        created = 0
+        for doc in docs:
+            if on_duplicate == 'ignore' and doc['_key'] in self.docs:
+                continue
+            self.docs[doc['_key']] = copy.deepcopy(doc)
+            created += 1
+        return {'created': created, 'errors': 0, 'empty': 0, 'updated': 0, 'ignored': len(docs) - created}
+
+    def update_many(self, docs, merge=None, silent=None):
+        self.calls.append(('update_many', len(docs)))
+        for doc in docs:
+            self.docs[doc['_key']].update(copy.deepcopy(doc))
+
+    def get(self, key):
+        return self.docs.get(key)
+
+    def get_many(self, keys):
+        self.calls.append(('get_many', len(keys)))
+        return [self.docs[key] for key in keys if key in self.docs]
+
+    def insert(self, doc, overwrite=None, silent=None):
+        self.calls.append(('insert', doc['_key']))
+        self.docs[doc['_key']] = copy.deepcopy(doc)
+
+    def delete(self, key, ignore_missing=None):
+        self.calls.append(('delete', key))
+        self.docs.pop(key, None)
+
+
+class MockAQL(object):
+    """Run the named pipeline queries (see arangodb.aql_queries) against the mock collections"""
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = []
+        self.failing = set()
+
+    def execute(self, query, bind_vars=None, **options):
+        name = next(name for (name, aql) in arangodb.aql_queries.items() if aql.query == query)
+        self.calls.append(name)
+        if name in self.failing:
+            raise Exception(f'{name} failed')
+
+        return iter(getattr(self, name)(bind_vars) or [])
+
+    def get_nanopub_edge_keys(self, bind_vars):
+        edges = self.db.collection(bind_vars['@edges']).docs.values()
+        return [
+            dict({'_key': edge['_key']}, **{field: edge[field] for field in bind_vars['fields'] if field in edge})
+            for edge in edges if edge['nanopub_id'] == bind_vars['nanopub_id']
+        ]
+
+    def remove_nanopub_edges(self, bind_vars):
+        docs = self.db.collection(bind_vars['@edges']).docs
+        for key in [key for key in docs if docs[key]['nanopub_id'] == bind_vars['nanopub_id']]:
+            del docs[key]
+
+    def remove_edges_by_key(self, bind_vars):
+        docs = self.db.collection(bind_vars['@edges']).docs
+        for key in bind_vars['keys']:
+            docs.pop(key, None)
+
+    def remove_nanopub_errors(self, bind_vars):
+        pass
+
+    def purge_nanopub_edges(self, bind_vars):
+        docs = self.db.collection(bind_vars['@edges']).docs
+        removed = [docs.pop(key) for key in list(docs) if docs[key]['nanopub_id'] in bind_vars['nanopub_ids']]
+        return [[edge['_from'], edge['_to']] for edge in removed]
+
+    def purge_nanopub_errors(self, bind_vars):
+        docs = self.db.collection(bind_vars['@errors']).docs
+        return [docs.pop(key) and 1 for key in list(docs) if docs[key]['nanopub_id'] in bind_vars['nanopub_ids']]
+
+    def purge_docs_by_key(self, bind_vars):
+        docs = self.db.collection(bind_vars['@collection']).docs
+        return [key if docs.pop(key, None) else None for key in bind_vars['keys']]
+
+    def _is_orphan(self, node_id, edges_coll_name):
+        edges = self.db.collection(edges_coll_name).docs.values()
+        return not any(node_id in (edge['_from'], edge['_to']) for edge in edges)
+
+    def remove_orphan_nodes(self, bind_vars):
+        docs = self.db.collection(bind_vars['@nodes']).docs
+        return [
+            node_id.split('/')[1] if docs.pop(node_id.split('/')[1], None) else None
+            for node_id in bind_vars['node_ids'] if self._is_orphan(node_id, bind_vars['@edges'])
+        ]
+
+    def remove_all_orphan_nodes(self, bind_vars):
+        docs = self.db.collection(bind_vars['@nodes']).docs
+        return [docs.pop(key) and 1 for key in list(docs) if self._is_orphan(f'nodes/{key}', bind_vars['@edges'])]
+
+    def get_edges_update_ts(self, bind_vars):
+        edges = self.db.collection(bind_vars['@edges']).docs.values()
+        update_ts = {}
+        for edge in edges:
+            if edge['nanopub_id'] in bind_vars['nanopub_ids']:
+                update_ts[edge['nanopub_id']] = max(edge['metadata']['gd:updateTS'], update_ts.get(edge['nanopub_id'], ''))
+        return list(update_ts.items())
+
+
+class MockEdgeStore(object):
+
+    def __init__(self):
+        self.aql = MockAQL(self)
+        self.collections = {}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, MockCollection())
+
+
+@pytest.fixture
+def edgestore(monkeypatch):
+
+    db = MockEdgeStore()
+    monkeypatch.setattr(pipeline, 'edgestore_db', db)
+    monkeypatch.setattr(pipeline, 'get_resource_versions', lambda: {})
+
+    return db
+
+
+@pytest.fixture
+def nanopub_to_edges(monkeypatch, make_edges):
+    """Edges for nanopub NPn are make_edges edges 3n to 3n + 2"""
+
+    def to_edges(nanopub, orthologize_targets=[]):
+        idx = int(nanopub['nanopub']['id'][2:])
+        return {'success': True, 'edges': make_edges(3 * idx + 3)[3 * idx:], 'errors': []}
+
+    monkeypatch.setattr(pipeline.bel.edge.edges, 'nanopub_to_edges', to_edges, raising=False)
+
+
+def test_update_edges_inserted(edgestore, make_edges):
+
+    counts = pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=make_edges(3), normalized=False)
+
+    assert counts == {'removed': 0, 'inserted': 3, 'patched': 0, 'unchanged': 0, 'success': True}
+    assert len(edgestore.collection(pipeline.edges_coll_name).docs) == 3
+    assert len(edgestore.collection(pipeline.nodes_coll_name).docs) == 4
+
+
+def test_update_edges_removed(edgestore, make_edges):
+
+    edges = make_edges(3)
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges, normalized=False)
+    edges_coll = edgestore.collection(pipeline.edges_coll_name)
+    edges_coll.calls = []
+
+    counts = pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges[:2], normalized=False)
+
+    assert counts == {'removed': 1, 'inserted': 0, 'patched': 0, 'unchanged': 2, 'success': True}
+    assert sorted(edge['edge_hash'] for edge in edges_coll.docs.values()) == ['0', '1']
+    assert edges_coll.calls == []  # kept edges aren't re-imported
+    assert 'remove_edges_by_key' in edgestore.aql.calls
+
+
+def test_update_edges_patched(edgestore, make_edges):
+
+    edges = make_edges(3)
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges, normalized=False)
+    edges_coll = edgestore.collection(pipeline.edges_coll_name)
+    edges_coll.calls = []
+
+    edges = make_edges(3)
+    edges[1]['edge']['relation']['metadata'] = {'gd:updateTS': '2019-01-01T00:00:00.000Z'}
+    edges[1]['edge']['relation']['edge_dt'] = '2019-01-02T00:00:00.000Z'
+
+    counts = pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges, normalized=False)
+
+    assert counts == {'removed': 0, 'inserted': 0, 'patched': 1, 'unchanged': 2, 'success': True}
+    assert edges_coll.calls == [('update_many', 1)]
+    patched = [edge for edge in edges_coll.docs.values() if edge['edge_hash'] == '1'][0]
+    assert patched['metadata'] == {'gd:updateTS': '2019-01-01T00:00:00.000Z'}
+    assert patched['edge_dt'] == '2019-01-02T00:00:00.000Z'
+
+
+def test_update_edges_replaced_relation(edgestore, make_edges):
+    """A changed relation changes the edge _key - the old edge is removed and the new one inserted"""
+
+    edges = make_edges(3)
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges, normalized=False)
+
+    edges = make_edges(3)
+    edges[2]['edge']['relation']['relation'] = 'decreases'
+
+    counts = pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=edges, normalized=False)
+
+    assert counts == {'removed': 1, 'inserted': 1, 'patched': 0, 'unchanged': 2, 'success': True}
+    relations = sorted(edge['relation'] for edge in edgestore.collection(pipeline.edges_coll_name).docs.values())
+    assert relations == ['decreases', 'increases', 'increases']
+
+
+def test_update_edges_full_load_fallback(edgestore, make_edges):
+
+    edgestore.aql.failing.add('get_nanopub_edge_keys')
+
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=make_edges(3), normalized=False)
+
+    assert 'remove_nanopub_edges' in edgestore.aql.calls
+    assert len(edgestore.collection(pipeline.edges_coll_name).docs) == 3
+
+
+def test_load_edges_rejected(edgestore, make_edges):
+
+    edgestore.collection(pipeline.nodes_coll_name).rejecting = True
+
+    assert pipeline.load_edges_into_db('NP0', 'http://nanopubs/NP0', edges=make_edges(3), normalized=False) == {'success': False}
+
+    counts = pipeline.load_edges_into_db('NP1', 'http://nanopubs/NP1', edges=make_edges(6)[3:], diff=True, normalized=False)
+    assert counts['success'] is False
+
+
+@pytest.mark.parametrize('diff', [False, True])
+def test_process_nanopub_failed_load(edgestore, nanopub_to_edges, make_nanopub, diff):
+
+    prefetched = {'nanopub': make_nanopub('NP0', 'AKT1'), 'edge_update_ts': None, 'pipeline_state': None}
+    edgestore.collection(pipeline.edges_coll_name).rejecting = True
+
+    result = pipeline.process_nanopub('http://nanopubs/NP0', diff=diff, prefetched=prefetched)
+
+    assert result['success'] is False
+    assert edgestore.collection(arangodb.edgestore_pipeline_name).docs == {}  # no state for a failed load
+
+    edgestore.collection(pipeline.edges_coll_name).rejecting = False
+
+    result = pipeline.process_nanopub('http://nanopubs/NP0', diff=diff, prefetched=prefetched)
+
+    assert result['success'] is True
+    assert result['edges_cnt'] == 3
+    assert list(edgestore.collection(arangodb.edgestore_pipeline_name).docs) == ['NP0']
+
+
+def test_process_nanopubs_batches(edgestore, nanopub_to_edges, make_nanopub, monkeypatch):
+
+    nanopubstore = MockEdgeStore()
+    monkeypatch.setattr(pipeline, 'db', {'NanopubStore': nanopubstore})
+    nanopubs = nanopubstore.collection('Nanopub')
+    for idx in range(3):
+        nanopub = make_nanopub(f'NP{idx}', f'GENE{idx}')
+        nanopubs.docs[f'NP{idx}'] = dict(nanopub, _key=f'NP{idx}')
+
+    urls = ['http://nanopubs/NP0', 'http://nanopubs/NP1', 'http://nanopubs/NP0', 'http://nanopubs/NP2']
+    results = list(pipeline.process_nanopubs(urls, batch_size=3))
+
+    assert [url for (url, result) in results] == urls
+    assert all(result['success'] for (url, result) in results)
+    assert results[2][1]['msg'] == 'Nanopub already processed in this batch'
+
+    # One prefetch per batch and no per-nanopub freshness queries
+    assert nanopubs.calls == [('get_many', 2), ('get_many', 1)]
+    assert edgestore.collection(arangodb.edgestore_pipeline_name).calls.count(('get_many', 2)) == 1
+    assert edgestore.aql.calls.count('get_edges_update_ts') == 2
+    assert 'get_nanopub' not in edgestore.aql.calls + nanopubstore.aql.calls
+    assert 'get_edges_for_nanopub' not in edgestore.aql.calls
+
+    # Each nanopub loaded once
+    assert edgestore.aql.calls.count('remove_nanopub_edges') == 3
+    assert len(edgestore.collection(pipeline.edges_coll_name).docs) == 9
+
+
+def test_edge_contexts(make_edges):
+
+    edges = make_edges(6)
+    contexts = list(pipeline.edge_contexts(edges))
+
+    assert [context['_key'] for context in contexts] == ['NP0', 'NP1']
+    assert contexts[0]['annotations'] == [{'type': 'Species', 'id': 'TAX:9606', 'label': 'human'}]
+    assert contexts[0]['metadata'] == {'gd:updateTS': '2018-01-01T00:00:00.000Z'}
+
+    contexts[0]['metadata']['nanopub_id'] = 'NP0'
+    assert 'nanopub_id' not in edges[0]['edge']['relation']['metadata']  # copied
+
+
+def test_load_edge_contexts(edgestore, make_edges):
+
+    contexts = edgestore.collection(pipeline.contexts_coll_name)
+
+    assert pipeline.load_edge_contexts(make_edges(6)) is True
+    assert sorted(contexts.docs) == ['NP0', 'NP1']
+
+    contexts.rejecting = True
+    assert pipeline.load_edge_contexts(make_edges(6)) is False
+
+
+@pytest.mark.parametrize('normalized', [False, True])
+def test_update_edges_layout_changed(edgestore, make_edges, normalized):
+    """Switching between inline and normalized annotations and metadata reloads all of the edges"""
+
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=make_edges(3), normalized=not normalized)
+    edges_coll = edgestore.collection(pipeline.edges_coll_name)
+    edges_coll.calls = []
+
+    pipeline.update_edges_in_db('NP0', 'http://nanopubs/NP0', edges=make_edges(3), normalized=normalized)
+
+    assert 'remove_nanopub_edges' in edgestore.aql.calls
+    assert edges_coll.calls == [('import_bulk', 3)]
+    for edge in edges_coll.docs.values():
+        assert ('context_key' in edge) == normalized
+        assert ('annotations' in edge) != normalized
+
+
+def test_nanopub_state_normalized(make_nanopub, monkeypatch):
+
+    monkeypatch.setattr(pipeline, 'get_resource_versions', lambda: {})
+    nanopub = make_nanopub('NP0', 'AKT1')
+
+    monkeypatch.setitem(pipeline.config['bel_api'], 'edgestore_normalized', False)
+    state = pipeline.get_nanopub_state(nanopub)
+
+    monkeypatch.setitem(pipeline.config['bel_api'], 'edgestore_normalized', True)
+    assert pipeline.is_nanopub_unchanged(pipeline.get_nanopub_state(nanopub), state) is False
+    assert pipeline.is_nanopub_unchanged(pipeline.get_nanopub_state(nanopub), pipeline.get_nanopub_state(nanopub)) is True
+
+
+@pytest.mark.parametrize('full_node_gc', [False, True])
+def test_purge_nanopubs(edgestore, make_edges, full_node_gc):
+
+    edges = make_edges(6)
+    pipeline.load_edges_into_db('NP0', 'http://nanopubs/NP0', edges=edges[:3], normalized=True)
+    pipeline.load_edges_into_db('NP1', 'http://nanopubs/NP1', edges=edges[3:], normalized=True)
+    edgestore.collection(arangodb.edgestore_pipeline_name).docs['NP0'] = {'_key': 'NP0'}
+    errors = edgestore.collection(arangodb.edgestore_pipeline_errors_name)
+    errors.docs.update({key: {'_key': key, 'nanopub_id': 'NP0'} for key in ['e1', 'e2']})
+
+    # A node of a removed edge already removed by someone else isn't counted
+    del edgestore.collection(pipeline.nodes_coll_name).docs[pipeline.node_key(edges[0]['edge']['subject'])]
+
+    urls = ['http://nanopubs/NP0', 'NP0', 'http://nanopubs/NP9']
+    report = pipeline.purge_nanopubs(urls, chunk_size=2, full_node_gc=full_node_gc)
+
+    assert report['nanopubs'] == 2
+    assert report['edges_removed'] == 3
+    assert report['errors_removed'] == 2
+    assert report['states_removed'] == 1  # NP9 has no state
+    assert report['contexts_removed'] == 1
+    assert report['nodes_removed'] == 2  # GENE1 and GENE2 - GENE3 still has the NP1 edges
+
+    nodes = edgestore.collection(pipeline.nodes_coll_name).docs.values()
+    assert sorted(node['name'] for node in nodes) == [f'p(HGNC:GENE{idx})' for idx in range(3, 7)]
+    assert sorted(edgestore.collection(pipeline.contexts_coll_name).docs) == ['NP1']
+
+
+def test_nanopub_state_case_and_label_edits(make_nanopub, monkeypatch):
+    """Edits hash_nanopub ignores still change the edges and the state"""
+
+    monkeypatch.setattr(pipeline, 'get_resource_versions', lambda: {})
+    state = pipeline.get_nanopub_state(make_nanopub('NP0', 'akt1'))
+
+    case_edit = make_nanopub('NP0', 'Akt1')
+    label_edit = make_nanopub('NP0', 'akt1')
+    label_edit['nanopub']['annotations'][0]['label'] = 'Homo sapiens'
+
+    for nanopub in [case_edit, label_edit]:
+        edited_state = pipeline.get_nanopub_state(nanopub)
+        assert edited_state['nanopub_hash'] == state['nanopub_hash']
+        assert pipeline.is_nanopub_unchanged(edited_state, state) is False
+
+    assert pipeline.is_nanopub_unchanged(pipeline.get_nanopub_state(make_nanopub('NP0', 'akt1')), state) is True
@@ -0,0 +1,90 @@
+import gzip
+
+import pytest
+
+from bel.nanopub.checkpoint import Checkpoint, ResumableOutput, changed_options
+
+
+def write_lines(output_fn, lines, position=None, checkpoint_at=None):
+    """Write lines returning the position of the checkpoint taken after checkpoint_at lines"""
+
+    checkpoint_pos = None
+    out = ResumableOutput(output_fn, position=position)
+    for idx, line in enumerate(lines, start=1):
+        out.write(f'{line}\n')
+        if idx == checkpoint_at:
+            checkpoint_pos = out.checkpoint()
+    out.close()
+
+    return checkpoint_pos
+
+
+def test_checkpoint(tmpdir):
+
+    checkpoint = Checkpoint(str(tmpdir.join('pipeline.checkpoint')))
+    assert checkpoint.load() is None
+
+    checkpoint.save({'nanopub_cnt': 10, 'output_pos': 100})
+    state = checkpoint.load()
+    assert state['nanopub_cnt'] == 10
+    assert state['output_pos'] == 100
+    assert 'checkpoint_dt' in state
+
+    checkpoint.remove()
+    assert checkpoint.load() is None
+
+
+def test_changed_options(tmpdir):
+
+    checkpoint = Checkpoint(str(tmpdir.join('pipeline.checkpoint')))
+    options = {'input_fn': 'nanopubs.jsonl.gz', 'nanopub_id': ['NP1', 'NP2'], 'shard': '1/4', 'start_id': None, 'dedup': False}
+    checkpoint.save(dict(options, nanopub_cnt=10))
+    state = checkpoint.load()
+
+    assert changed_options(state, dict(options, nanopub_id=('NP1', 'NP2'))) == []
+    assert changed_options(state, dict(options, shard='2/4', dedup=True)) == ['shard', 'dedup']
+    assert changed_options(state, dict(options, end_id=None)) == []  # not in older checkpoints
+    assert changed_options(state, dict(options, end_id='NP9')) == ['end_id']
+
+
+def test_resume_gzip_output(tmpdir):
+    """Resuming after a crash results in the same output as an uninterrupted run"""
+
+    lines = [f'line {idx}' for idx in range(10)]
+
+    output_fn = str(tmpdir.join('edges.jsonl.gz'))
+    position = write_lines(output_fn, lines[:7], checkpoint_at=5)  # crash after 7 lines
+
+    write_lines(output_fn, lines[5:], position=position)
+
+    with gzip.open(output_fn, 'rt') as f:
+        assert f.read().splitlines() == lines
+
+
+def test_resume_plain_output(tmpdir):
+
+    lines = [f'line {idx}' for idx in range(10)]
+
+    output_fn = str(tmpdir.join('edges.jsonl'))
+    position = write_lines(output_fn, lines[:7], checkpoint_at=5)
+
+    write_lines(output_fn, lines[5:], position=position)
+
+    with open(output_fn, 'rt') as f:
+        assert f.read().splitlines() == lines
+
+
+def test_resume_zstd_output(tmpdir):
+
+    zstandard = pytest.importorskip('zstandard')
+
+    lines = [f'line {idx}' for idx in range(10)]
+
+    output_fn = str(tmpdir.join('edges.jsonl.zst'))
+    position = write_lines(output_fn, lines[:7], checkpoint_at=5)
+
+    write_lines(output_fn, lines[5:], position=position)
+
+    with open(output_fn, 'rb') as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        assert reader.read().decode('utf-8').splitlines() == lines
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+
+import pytest
+
+import bel.compression as compression
+import bel.nanopub.corpus as corpus
+import bel.nanopub.files as files
+
+
+@pytest.fixture(params=['nanopubs.jsonl', 'nanopubs.jsonl.gz'])
+def corpus_fn(request, tmpdir, make_nanopubs):
+
+    fn = str(tmpdir.join(request.param))
+    with files.open_nanopubs_writer(fn) as writer:
+        writer.write_all(make_nanopubs(2000))
+
+    return fn
+
+
+def test_index_and_get(corpus_fn, make_nanopubs):
+
+    nanopubs = make_nanopubs(2000)
+
+    assert corpus.index_corpus(corpus_fn) == 2000
+    assert os.path.exists(f'{corpus_fn}.idx')
+
+    with corpus.CorpusIndex(corpus_fn) as index:
+        assert len(index) == 2000
+        assert index.bgzf == corpus_fn.endswith('.gz')
+
+        for idx in [0, 1, 777, 1999]:
+            assert index.get(f'NP{idx:05d}') == nanopubs[idx]
+
+        digest = index.lookup(nanopub_id='NP00123')[0]['hash']
+        assert index.get(digest=digest) == nanopubs[123]
+        assert index.get('missing') is None
+
+        assert list(index.select(nanopub_ids=['NP00005', 'missing', 'NP00003'])) == [nanopubs[5], nanopubs[3]]
+        assert list(index.select(start_id='NP00998', end_id='NP01002')) == nanopubs[998:1003]
+
+        shards = [list(index.select(shard=(shard_num, 3))) for shard_num in range(1, 4)]
+        assert [nanopub for shard in shards for nanopub in shard] == nanopubs
+
+
+def test_index_records_across_blocks(tmpdir, make_nanopubs):
+    """Records spanning BGZF blocks and larger than a block"""
+
+    fn = str(tmpdir.join('large.jsonl.gz'))
+    nanopubs = make_nanopubs(5)
+    nanopubs[2]['nanopub']['evidence'] = 'y' * (3 * compression.bgzf_block_size)
+
+    with files.open_nanopubs_writer(fn) as writer:
+        writer.write_all(nanopubs)
+
+    with corpus.CorpusIndex(fn, create=True) as index:
+        assert [index.get(f'NP{idx:05d}') for idx in range(5)] == nanopubs
+        assert list(index.iter_range(1, 4)) == nanopubs[1:4]
+
+
+def test_index_out_of_date(tmpdir, make_nanopubs):
+
+    fn = str(tmpdir.join('nanopubs.jsonl'))
+    with files.open_nanopubs_writer(fn) as writer:
+        writer.write_all(make_nanopubs(10))
+
+    with pytest.raises(ValueError):
+        corpus.CorpusIndex(fn)
+
+    corpus.index_corpus(fn)
+    with open(fn, 'a') as f:
+        f.write('{"nanopub": {"id": "NP99999"}}\n')
+
+    with pytest.raises(ValueError):
+        corpus.CorpusIndex(fn)
+
+    # Rewritten in place with the same size
+    corpus.index_corpus(fn)
+    size = os.path.getsize(fn)
+    with open(fn, 'r+') as f:
+        content = f.read().replace('NP00001', 'NP00002')
+        f.seek(0)
+        f.write(content)
+    stat = os.stat(fn)
+    os.utime(fn, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))  # coarse filesystem timestamps
+    assert os.path.getsize(fn) == size
+
+    with pytest.raises(ValueError):
+        corpus.CorpusIndex(fn)
+
+    # Created by an older index version
+    corpus.index_corpus(fn)
+    conn = sqlite3.connect(f'{fn}.idx')
+    conn.execute("UPDATE metadata SET value = '2' WHERE key = 'version'")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(ValueError):
+        corpus.CorpusIndex(fn)
+
+
+def test_diff_corpora(tmpdir, make_nanopubs):
+
+    nanopubs = make_nanopubs(20)
+    fn_a, fn_b = str(tmpdir.join('a.jsonl.gz')), str(tmpdir.join('b.jsonl.gz'))
+
+    with files.open_nanopubs_writer(fn_a) as writer:
+        writer.write_all(nanopubs[:15])
+
+    nanopubs[3]['nanopub']['assertions'] = [{'subject': 'p(HGNC:AKT1)', 'relation': 'decreases', 'object': 'p(HGNC:EGF)'}]
+    nanopubs[4]['nanopub']['evidence'] = 'not hashed'
+    nanopubs[5]['nanopub']['assertions'][0]['subject'] = 'p(HGNC:gene5)'  # case-only edit
+    nanopubs[6]['nanopub']['annotations'][0]['label'] = 'Homo sapiens'
+    with files.open_nanopubs_writer(fn_b) as writer:
+        writer.write_all(nanopubs[2:])
+
+    with corpus.CorpusIndex(fn_a, create=True) as corpus_a, corpus.CorpusIndex(fn_b, create=True) as corpus_b:
+        assert corpus.diff_corpora(corpus_a, corpus_b) == {
+            'added': [f'NP{idx:05d}' for idx in range(15, 20)],
+            'removed': ['NP00000', 'NP00001'],
+            'changed': ['NP00003', 'NP00005', 'NP00006'],
+        }
+
+        diff = ''.join(corpus.diff_nanopub(corpus_a, corpus_b, 'NP00003'))
+        assert '-                "relation": "increases"' in diff
+        assert '+                "relation": "decreases"' in diff
+        assert corpus.diff_nanopub(corpus_a, corpus_b, 'NP00007') == []
+
+
+def test_parse_shard():
+
+    assert corpus.parse_shard('3/8') == (3, 8)
+
+    for shard in ['0/8', '9/8', '3', 'a/b']:
+        with pytest.raises(ValueError):
+            corpus.parse_shard(shard)
@@ -0,0 +1,61 @@
+import json
+
+import bel.compression as compression
+import bel.nanopub.dedup as dedup
+
+
+def test_nanopub_digest(make_nanopub):
+
+    nanopub = make_nanopub('NP1', 'AKT1')
+
+    digest = dedup.nanopub_digest(nanopub)
+    assert digest == dedup.nanopub_digest(make_nanopub('NP2', 'AKT1'))
+    assert digest != dedup.nanopub_digest(make_nanopub('NP1', 'AKT1', pmid='456'))
+
+    assert nanopub['nanopub']['assertions'][0]['relation'] is None  # not modified
+    assert dedup.nanopub_digest({'nanopub': {'id': 'NP3'}}) is None
+
+
+def test_bloom_filter():
+
+    bloom = dedup.BloomFilter(capacity=1000, error_rate=0.01)
+    for idx in range(1000):
+        bloom.add(f'item{idx}')
+
+    assert all(f'item{idx}' in bloom for idx in range(1000))
+    assert sum(f'other{idx}' in bloom for idx in range(10000)) < 300
+
+
+def test_digest_set_spill(tmpdir):
+
+    digests = dedup.DigestSet(max_digests=10, capacity=100, spill_dir=str(tmpdir))
+    for idx in range(25):
+        assert digests.add(f'digest{idx}', f'NP{idx}') == (True, None)
+
+    assert digests.spilled_cnt == 20
+    assert len(digests) == 25
+    assert digests.add('digest3', 'NP100') == (False, 'NP3')
+    assert digests.add('digest24', 'NP101') == (False, 'NP24')
+
+    digests.close()
+    assert tmpdir.listdir() == []
+
+
+def test_deduplicator(tmpdir, make_nanopub):
+
+    nanopubs = [make_nanopub(f'NP{idx}', f'GENE{idx % 7}') for idx in range(30)]
+    nanopubs.append({'nanopub': {'id': 'unhashed'}})
+    report_fn = str(tmpdir.join('duplicates.jsonl.gz'))
+
+    deduplicator = dedup.Deduplicator(report_fn=report_fn, max_digests=3, spill_dir=str(tmpdir))
+    unique = list(deduplicator.filter(iter(nanopubs)))
+
+    assert [nanopub['nanopub']['id'] for nanopub in unique] == ['NP0', 'NP1', 'NP2', 'NP3', 'NP4', 'NP5', 'NP6', 'unhashed']
+    assert (deduplicator.nanopubs_cnt, deduplicator.duplicates_cnt, deduplicator.unhashed_cnt) == (31, 23, 1)
+
+    with compression.open_file(report_fn, 'rt') as f:
+        report = [json.loads(line) for line in f]
+
+    assert len(report) == 23
+    assert report[0] == {'nanopub_id': 'NP7', 'duplicate_of': 'NP0', 'hash': dedup.nanopub_digest(nanopubs[0])}
+    assert report[-1]['duplicate_of'] == 'NP1'
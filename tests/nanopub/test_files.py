@@ -0,0 +1,159 @@
+import gzip
+import io
+import json
+
+import pytest
+import yaml
+
+import bel.nanopub.files as files
+
+elements = [
+    {'nanopub': {'id': 1, 'assertions': [{'subject': 'p(HGNC:AKT1)', 'relation': 'increases', 'object': 'p(HGNC:EGF)'}]}},
+    {'nanopub': {'id': 2, 'text': 'braces { [ in "strings" ] } and \\\\ escapes \\" é'}},
+    [1, 2, {'a': []}],
+    'scalar',
+    12.5,
+    {},
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 65536])
+def test_iter_json_array(chunk_size):
+
+    for indent in [None, 4]:
+        f = io.StringIO(json.dumps(elements, indent=indent))
+        assert list(files.iter_json_array(f, chunk_size=chunk_size)) == elements
+
+    assert list(files.iter_json_array(io.StringIO(' [ ] '), chunk_size=chunk_size)) == []
+
+
+def test_iter_json_array_truncated():
+
+    f = io.StringIO(json.dumps(elements)[:-10])
+    with pytest.raises(ValueError):
+        list(files.iter_json_array(f, chunk_size=5))
+
+
+def test_iter_yaml():
+
+    nanopubs = [element for element in elements if isinstance(element, dict)]
+
+    # Single document with list
+    f = io.StringIO(yaml.dump(nanopubs))
+    assert list(files.iter_yaml(f)) == nanopubs
+
+    # Multi-document stream
+    f = io.StringIO(yaml.dump_all(nanopubs))
+    assert list(files.iter_yaml(f)) == nanopubs
+
+
+def test_read_nanopubs_json(tmpdir):
+
+    fn = str(tmpdir.join('nanopubs.json'))
+    with open(fn, 'wt') as f:
+        json.dump(elements[:2], f)
+
+    assert list(files.read_nanopubs(fn)) == elements[:2]
+
+
+@pytest.mark.parametrize('fn', ['edges.jsonl', 'edges.json', 'edges.yaml', 'edges.json.gz', 'edges.yml.gz'])
+def test_write_edges(tmpdir, fn, make_edges):
+
+    fn = str(tmpdir.join(fn))
+    edges = make_edges(2500)
+
+    assert files.write_edges(iter(edges), fn) == len(edges)
+    assert list(files.read_edges(fn)) == edges
+
+    # Empty output is still a valid file
+    assert files.write_edges([], fn) == 0
+    assert list(files.read_edges(fn)) == []
+
+
+def test_edges_writer_flush(tmpdir, make_edges):
+
+    fn = str(tmpdir.join('edges.json'))
+    edges = make_edges(10)
+
+    with files.open_edges_writer(fn, flush_every=5, flush_secs=3600) as writer:
+        writer.write(edges[:4])
+        writer.write(edges[4:6])
+        with open(fn) as f:
+            assert f.read().count('"edge_hash"') == 6  # 6 edges flushed
+        writer.write(edges[6:])
+
+    assert writer.records_cnt == 10
+    with open(fn) as f:
+        assert json.load(f) == edges
+
+
+def test_edges_writer_jgf(tmpdir, make_edges):
+
+    fn = str(tmpdir.join('edges.jgf'))
+    edges = make_edges(3)
+
+    with files.open_edges_writer(fn) as writer:
+        writer.write(edges)
+
+    with open(fn) as f:
+        graph = json.load(f)['graph']
+
+    assert graph['label'] == 'BEL Pipeline Edges'
+    assert graph['nodes'] == [{'id': f'p(HGNC:GENE{idx})'} for idx in range(4)]  # de-duplicated
+    assert graph['edges'][0] == {'source': 'p(HGNC:GENE0)', 'target': 'p(HGNC:GENE1)', 'relation': 'increases'}
+    assert len(graph['edges']) == 3
+
+    with pytest.raises(ValueError):
+        files.open_edges_writer(str(tmpdir.join('edges.txt')))
+
+
+def test_records_writer_abstract(tmpdir, make_edges):
+
+    class EncodelessWriter(files.TextRecordsWriter):
+        pass
+
+    with pytest.raises(TypeError):
+        files.RecordsWriter(io.StringIO())
+    with pytest.raises(TypeError):
+        EncodelessWriter(io.StringIO())
+
+    # Writers without encode() ignore workers and write in the calling process
+    fn = str(tmpdir.join('edges.jgf'))
+    with files.open_edges_writer(fn) as writer:
+        writer.write_all(iter(make_edges(5)), batch_size=2, workers=2)
+
+    assert writer.records_cnt == 5
+    with open(fn) as f:
+        assert len(json.load(f)['graph']['edges']) == 5
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_edges_to_jgf(tmpdir, compact, make_edges):
+
+    fn = str(tmpdir.join('edges.jgf.gz'))
+    edges = make_edges(1500) + make_edges(1500)  # every node and edge twice
+
+    assert files.edges_to_jgf(fn, iter(edges), compact=compact, label='Test') == (1501, 3000)
+
+    with gzip.open(fn, 'rt') as f:
+        content = f.read()
+
+    assert (content.count('\n') == 1) == compact
+    graph = json.loads(content)['graph']
+    assert graph['label'] == 'Test'
+    assert len(graph['nodes']) == 1501
+    assert graph['edges'][-1] == {'source': 'p(HGNC:GENE1499)', 'target': 'p(HGNC:GENE1500)', 'relation': 'increases'}
+
+
+@pytest.mark.parametrize('fn', ['nanopubs.jsonl.gz', 'nanopubs.json', 'nanopubs.yaml.gz'])
+@pytest.mark.parametrize('workers', [0, 2])
+def test_nanopubs_writer(tmpdir, fn, workers):
+
+    fn = str(tmpdir.join(fn))
+    nanopubs = [{'nanopub': {'id': idx, 'assertions': [{'subject': f'p(HGNC:GENE{idx})', 'relation': 'increases'}]}} for idx in range(500)]
+
+    with files.open_nanopubs_writer(fn, background=bool(workers)) as writer:
+        writer.write_all(iter(nanopubs), batch_size=30, workers=workers)
+
+    assert writer.records_cnt == 500
+    assert list(files.read_nanopubs(fn)) == nanopubs
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import bel.nanopub.corpus as corpus
+import bel.nanopub.files as files
+import bel.nanopub.stats as stats
+
+nanopubs = [
+    {'nanopub': {'id': 'NP1', 'assertions': [
+        {'subject': 'p(HGNC:AKT1)', 'relation': 'increases', 'object': 'p(HGNC:EGF, pmod(Ph, S, 473))'},
+        {'subject': 'act(p(SFAM:"AKT Family"), ma(kin))', 'relation': None, 'object': None},
+    ]}},
+    {'nanopub': {'id': 'NP2', 'assertions': [
+        {'subject': 'p(HGNC:AKT1)', 'relation': 'increases', 'object': '(p(HGNC:EGF) decreases bp(GO:"cell death"))'},
+    ]}},
+    {'nanopub': {'id': 'NP3', 'assertions': []}},
+    {'not_a_nanopub': {}},
+]
+
+
+def test_tokenize():
+
+    (functions, nsargs, depth, errors_cnt) = stats.tokenize('act(p(SFAM:"AKT Family, (1)"), ma(kin)) increases (p(HGNC:EGF) decreases bp(GO:"cell death"))')
+
+    assert functions == ['act', 'p', 'ma', 'p', 'bp']
+    assert nsargs == [('SFAM', '"AKT Family, (1)"'), ('HGNC', 'EGF'), ('GO', '"cell death"')]
+    assert depth == 2
+    assert errors_cnt == 0
+
+
+def test_profile_nanopubs():
+
+    profile = stats.profile_nanopubs(nanopubs).to_dict(top=2)
+
+    assert profile['nanopubs'] == 3
+    assert profile['assertions'] == {'total': 3, 'subject_only': 1, 'nested': 1, 'relations': {'increases': 2}}
+    assert profile['functions'] == {'p': 5, 'pmod': 1, 'act': 1, 'ma': 1, 'bp': 1}
+    assert profile['namespaces'] == {'HGNC': 4, 'SFAM': 1, 'GO': 1}
+    assert profile['nsargs'] == {'total': 6, 'distinct': 4, 'top': {'HGNC:AKT1': 2, 'HGNC:EGF': 2}}
+    assert profile['depth'] == {1: 1, 2: 2}
+    assert profile['assertions_per_nanopub'] == {0: 1, 1: 1, 2: 1}
+
+
+def test_profile_merge():
+
+    merged = stats.profile_nanopubs(nanopubs[:1]).merge(stats.profile_nanopubs(nanopubs[1:]))
+
+    assert merged.to_dict() == stats.profile_nanopubs(nanopubs).to_dict()
+
+
+def test_profile_partialparse():
+
+    profile = stats.profile_nanopubs(nanopubs, partialparse=True).to_dict()
+    expected = stats.profile_nanopubs(nanopubs).to_dict()
+
+    assert profile['assertions'].pop('parse_errors') == 0
+    assert profile == expected
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_profile_corpus_workers(tmpdir, indexed):
+
+    fn = str(tmpdir.join('nanopubs.jsonl.gz'))
+    with files.open_nanopubs_writer(fn) as writer:
+        writer.write_all(nanopubs[:3] * 50)
+
+    if indexed:
+        corpus.index_corpus(fn)
+
+    profile = stats.profile_corpus(fn, workers=2, batch_size=7).to_dict()
+
+    assert json.loads(json.dumps(profile)) == json.loads(json.dumps(stats.profile_corpus(fn).to_dict()))
+    assert profile['nanopubs'] == 150
+    assert profile['assertions']['relations'] == {'increases': 100}
@@ -0,0 +1,113 @@
+import bel.terms.orthologs
+
+
+class MockAQL(object):
+    """Ortholog group EG:207 (human), EG:11651 (mouse), EG:24185 (rat) - EG:1956 has no group yet"""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, query, **options):
+        self.calls.append((query, options))
+        bind_vars = options['bind_vars']
+        if query in [bel.terms.orthologs.orthologs_query.query, bel.terms.orthologs.orthologs_species_query.query]:
+            if bind_vars['key'] == 'EG:1956':
+                return iter([{'group_id': None, 'orthologs': []}])
+            return iter([{'group_id': 'EG:11651', 'orthologs': [
+                {'name': 'EG:207', 'tax_id': 'TAX:9606'},
+                {'name': 'EG:11651', 'tax_id': 'TAX:10090'},
+            ]}])
+        if query in [bel.terms.orthologs.ortholog_table_query.query, bel.terms.orthologs.ortholog_table_species_query.query]:
+            return iter([
+                ['EG:207', 'TAX:9606', 'EG:11651'],
+                ['EG:11651', 'TAX:10090', 'EG:11651'],
+                ['EG:24185', 'TAX:10116', 'EG:11651'],
+            ])
+        return [{'orthologs': [{'name': 'EG:1956', 'tax_id': 'TAX:9606'}, {'name': 'EG:13649', 'tax_id': 'TAX:10090'}]}]
+
+
+class MockDB(object):
+
+    def __init__(self):
+        self.aql = MockAQL()
+
+
+def normalized_terms_batch(term_ids):
+    return {term_id: {'canonical': term_id, 'decanonical': f'DECANON:{term_id}', 'original': term_id} for term_id in term_ids}
+
+
+def mock_belns(monkeypatch):
+
+    db = MockDB()
+    monkeypatch.setattr(bel.terms.orthologs, 'belns_db', db)
+    monkeypatch.setattr(bel.terms.orthologs, 'ortholog_table', None)
+    monkeypatch.setattr(bel.terms.terms, 'get_normalized_terms_batch', normalized_terms_batch)
+
+    return db
+
+
+def test_get_orthologs_group(monkeypatch):
+
+    db = mock_belns(monkeypatch)
+
+    orthologs = bel.terms.orthologs.get_orthologs('EG:207', ['TAX:10090'])
+
+    assert orthologs == {
+        'TAX:9606': {'canonical': 'EG:207', 'decanonical': 'DECANON:EG:207'},
+        'TAX:10090': {'canonical': 'EG:11651', 'decanonical': 'DECANON:EG:11651'},
+    }
+    assert [(query, options['bind_vars']) for (query, options) in db.aql.calls] == [
+        (bel.terms.orthologs.orthologs_species_query.query, {'key': 'EG:207', 'species': ['TAX:10090']}),
+    ]
+
+
+def test_get_orthologs_traversal(monkeypatch):
+
+    db = mock_belns(monkeypatch)
+
+    orthologs = bel.terms.orthologs.get_orthologs('EG:1956')
+
+    # Nodes loaded before the ortholog groups were materialized are traversed
+    assert orthologs['TAX:10090'] == {'canonical': 'EG:13649', 'decanonical': 'DECANON:EG:13649'}
+    (query, options) = db.aql.calls[1]
+    assert query == bel.terms.orthologs.orthologs_traversal_query.query
+    assert options['bind_vars'] == {'key': 'EG:1956', 'start': 'ortholog_nodes/EG:1956'}
+
+
+def test_ortholog_table(monkeypatch):
+
+    db = mock_belns(monkeypatch)
+
+    table = bel.terms.orthologs.OrthologTable(['TAX:9606', 'TAX:10090', 'TAX:10116'])
+
+    assert len(table) == 3
+    assert db.aql.calls[0][1]['bind_vars'] == {'species': ['TAX:9606', 'TAX:10090', 'TAX:10116']}
+    assert table.get_orthologs('EG:207') == {'TAX:9606': 'EG:207', 'TAX:10090': 'EG:11651', 'TAX:10116': 'EG:24185'}
+    assert table.get_orthologs('EG:207', ['TAX:10116']) == {'TAX:9606': 'EG:207', 'TAX:10116': 'EG:24185'}
+    assert table.get_orthologs('EG:1956') == {}
+
+    assert table.covers(['TAX:10090'])
+    assert not table.covers(['TAX:7955'])
+    assert not table.covers([])
+
+
+def test_get_orthologs_from_table(monkeypatch):
+
+    db = mock_belns(monkeypatch)
+
+    bel.terms.orthologs.use_ortholog_table(['TAX:9606', 'TAX:10090', 'TAX:10116'])
+    db.aql.calls.clear()
+
+    orthologs = bel.terms.orthologs.get_orthologs('EG:207', ['TAX:10116'])
+
+    assert orthologs == {
+        'TAX:9606': {'canonical': 'EG:207', 'decanonical': 'DECANON:EG:207'},
+        'TAX:10116': {'canonical': 'EG:24185', 'decanonical': 'DECANON:EG:24185'},
+    }
+    assert db.aql.calls == []
+
+    # Genes and species not in the table are looked up in the database
+    bel.terms.orthologs.get_orthologs('EG:1956', ['TAX:10090'])
+    bel.terms.orthologs.get_orthologs('EG:207', ['TAX:7955'])
+
+    assert [options['bind_vars']['key'] for (query, options) in db.aql.calls] == ['EG:1956', 'EG:1956', 'EG:207']
@@ -30,3 +30,64 @@ def test_obsolete_term():
     check = {'canonical': 'EG:54855', 'decanonical': 'HGNC:TENT5C', 'original': 'HGNC:FAM46C'}
 
     assert check == result
+
+
+class MockAQL(object):
+    """Equivalents query results - HGNC:AKT1 has a materialized cluster, MGI:Akt1 does not"""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, query, **options):
+        self.calls.append((query, options))
+        if query == bel.terms.terms.equivalents_query.query:
+            return iter([
+                {'key': 'HGNC:AKT1', 'cluster_id': 'EG:207', 'equivalents': [
+                    {'term_id': 'EG:207', 'namespace': 'EG', 'primary': True},
+                    {'term_id': 'SP:P31749', 'namespace': 'SP', 'primary': True},
+                ]},
+                {'key': 'MGI:Akt1', 'cluster_id': None, 'equivalents': []},
+            ])
+        return iter([{'term_id': 'EG:11651', 'namespace': 'EG', 'primary': True}])
+
+
+class MockDB(object):
+
+    def __init__(self):
+        self.aql = MockAQL()
+
+
+def test_normalized_terms_batch(monkeypatch):
+
+    db = MockDB()
+    monkeypatch.setattr(bel.terms.terms, 'belns_db', db)
+    monkeypatch.setitem(bel.terms.terms.config['bel']['lang'], 'canonical', {'HGNC': ['EG'], 'MGI': ['EG']})
+    monkeypatch.setitem(bel.terms.terms.config['bel']['lang'], 'decanonical', {'EG': ['HGNC', 'MGI']})
+
+    results = bel.terms.terms.get_normalized_terms_batch(['HGNC:AKT1', 'MGI:Akt1', 'HGNC:AKT1'])
+
+    assert results == {
+        'HGNC:AKT1': {'canonical': 'EG:207', 'decanonical': 'HGNC:AKT1', 'original': 'HGNC:AKT1'},
+        'MGI:Akt1': {'canonical': 'EG:11651', 'decanonical': 'MGI:Akt1', 'original': 'MGI:Akt1'},
+    }
+
+    # One equivalents query for the de-duplicated term ids plus a traversal for the unclustered node
+    assert len(db.aql.calls) == 2
+    assert db.aql.calls[0][1]['bind_vars'] == {'keys': ['HGNC:AKT1', 'MGI:Akt1']}
+    assert db.aql.calls[1][1]['bind_vars'] == {'start': 'equivalence_nodes/MGI:Akt1'}
+
+
+def test_equivalents_batch_error(monkeypatch):
+
+    class FailingAQL(MockAQL):
+        def execute(self, query, **options):
+            raise Exception('connection refused')
+
+    db = MockDB()
+    db.aql = FailingAQL()
+    monkeypatch.setattr(bel.terms.terms, 'belns_db', db)
+
+    results = bel.terms.terms.get_equivalents_batch(['HGNC:AKT1', 'HGNC:EGF'])
+
+    assert results['HGNC:AKT1']['equivalents'] == []
+    assert results['HGNC:EGF']['errors'] == ['Unexpected error connection refused']
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import bel.codec as codec
+import bel.utils as utils
+
+
+@pytest.fixture(params=codec.available_backends())
+def backend(request):
+
+    previous = codec.backend
+    yield codec.set_backend(request.param)
+    codec.set_backend(previous)
+
+
+def test_roundtrip(backend):
+
+    doc = {'nanopub': {'id': '01', 'assertions': [{'subject': 'p(HGNC:AKT1)', 'relation': 'increases'}], 'score': 1.5, 'public': True, 'note': None}}
+
+    assert codec.loads(codec.dumps(doc)) == doc
+    assert codec.loads(codec.dumps(doc).encode('utf-8')) == doc
+
+    line = codec.dumps_line(doc)
+    assert line.endswith('\n') and line.count('\n') == 1
+
+
+def test_dumps_fallback(backend):
+    """Documents orjson can't serialize fall back to stdlib json"""
+
+    doc = {1: 'non-string key', 'big': 2 ** 70}
+
+    assert json.loads(codec.dumps(doc)) == {'1': 'non-string key', 'big': 2 ** 70}
+
+
+def test_canonical_dumps(backend):
+    """Canonical serialization - and hashes - don't depend on the backend"""
+
+    doc = {'b': [1, 2], 'a': {'y': 'ü', 'x': None}}
+
+    assert codec.canonical_dumps(doc) == json.dumps(doc, sort_keys=True)
+    assert utils._create_hash_from_doc(doc) == utils._create_hash(json.dumps(doc, sort_keys=True))
+
+
+def test_set_backend():
+
+    previous = codec.backend
+
+    assert codec.set_backend('json') == 'json'
+    assert codec.set_backend() == codec.available_backends()[0]
+
+    with pytest.raises(ValueError):
+        codec.set_backend('simplejson')
+
+    codec.set_backend(previous)
@@ -0,0 +1,129 @@
+import gzip
+import io
+
+import pytest
+
+import bel.compression as compression
+
+lines = [f'{{"nanopub": {{"id": {idx}, "text": "{"é" * (idx % 300)}"}}}}\n' for idx in range(20000)]
+content = ''.join(lines)
+
+
+@pytest.mark.parametrize('fn', ['nanopubs.jsonl.gz', 'nanopubs.jsonl.bgz', 'nanopubs.jsonl.zst', 'nanopubs.jsonl'])
+def test_roundtrip(tmpdir, fn):
+
+    if fn.endswith('.zst'):
+        pytest.importorskip('zstandard')
+
+    fn = str(tmpdir.join(fn))
+    with compression.open_file(fn, 'wt', threads=3) as f:
+        for line in lines:
+            f.write(line)
+
+    with compression.open_file(fn, 'rt', threads=3) as f:
+        assert f.read() == content
+
+    with compression.open_file(fn, 'rt') as f:
+        assert f.readline() == lines[0]
+
+
+def test_bgzf_blocks(tmpdir):
+    """BGZF output is readable by gzip and made of <= 64KB blocks ending with the EOF block"""
+
+    fn = str(tmpdir.join('nanopubs.jsonl.gz'))
+    with compression.open_file(fn, 'wt') as f:
+        f.write(content)
+
+    with gzip.open(fn, 'rt', encoding='utf-8') as f:
+        assert f.read() == content
+
+    blocks = []
+    with open(fn, 'rb') as f:
+        assert compression.is_bgzf(f)
+        while True:
+            block = compression.read_bgzf_block(f)
+            if not block:
+                break
+            blocks.append(block)
+
+    assert len(blocks) > 10
+    assert all(len(block) <= 65536 for block in blocks)
+    assert blocks[-1] == compression.bgzf_eof
+
+
+def test_read_gzip_fileobj(tmpdir):
+    """Plain gzip file objects, e.g. downloaded resources, are sniffed and left open"""
+
+    fn = str(tmpdir.join('terms.jsonl.gz'))
+    with gzip.open(fn, 'wt', encoding='utf-8') as f:
+        f.write(content)
+
+    with open(fn, 'rb') as fo:
+        with compression.open_file(fo, 'rt') as f:
+            assert f.readline() == lines[0]  # stop reading early
+        assert not fo.closed
+
+        fo.seek(0)
+        with compression.open_file(fo, 'rt') as f:
+            assert f.read() == content
+
+    fo = io.BytesIO(content.encode('utf-8'))
+    with compression.open_file(fo, 'rt') as f:
+        assert f.read() == content
+
+
+class Pipe(io.RawIOBase):
+    """Non-seekable stream returning at most 1000 bytes per read"""
+
+    def __init__(self, data):
+        self.fo = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.fo.read(min(len(b), 1000))
+        b[:len(data)] = data
+        return len(data)
+
+
+@pytest.mark.parametrize('compression_name', ['gzip', 'bgzf', 'zstd', None])
+def test_read_non_seekable_fileobj(compression_name):
+    """Non-seekable file objects, e.g. pipes and HTTP responses, are sniffed without seeking"""
+
+    data = content.encode('utf-8')
+    if compression_name == 'gzip':
+        data = gzip.compress(data)
+    elif compression_name == 'bgzf':
+        fo = io.BytesIO()
+        with compression.open_file(fo, 'wb', compression='gzip') as f:
+            f.write(data)
+        data = fo.getvalue()
+    elif compression_name == 'zstd':
+        zstandard = pytest.importorskip('zstandard')
+        data = zstandard.ZstdCompressor().compress(data)
+
+    with compression.open_file(Pipe(data), 'rt') as f:
+        assert f.read() == content
+
+
+def test_flush_complete_stream():
+    """Flushed output is a complete gzip stream"""
+
+    fo = io.BytesIO()
+    f = compression.open_file(fo, 'wb', compression='gzip')
+    f.write(b'first\n')
+    f.flush()
+
+    assert gzip.decompress(fo.getvalue()) == b'first\n'
+
+    f.write(b'second\n')
+    f.close()
+
+    assert gzip.decompress(fo.getvalue()) == b'first\nsecond\n'
+
+
+def test_unknown_compression():
+
+    with pytest.raises(ValueError):
+        compression.open_file(io.BytesIO(), 'wb', compression='lz4')
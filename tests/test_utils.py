@@ -43,3 +43,26 @@ def test_generate_id():
     _id = utils._generate_id()
     assert re.match('\w{26,26}', str(_id))
 
+
+def test_connected_components():
+
+    pairs = [('HGNC:AKT1', 'EG:207'), ('SP:P31749', 'EG:207'), ('MGI:Akt1', 'EG:11651')]
+
+    components = utils.connected_components(pairs)
+
+    assert components['HGNC:AKT1'] == 'EG:207'
+    assert components['SP:P31749'] == 'EG:207'
+    assert components['MGI:Akt1'] == 'EG:11651'
+    assert len(set(components.values())) == 2
+
+
+def test_seen_keys():
+
+    seen = utils.SeenKeys()
+
+    assert seen.add('HGNC:AKT1')
+    assert not seen.add('HGNC:AKT1')
+    assert seen.add('EG:207')
+    assert 'EG:207' in seen
+    assert 'MGI:Akt1' not in seen
+    assert len(seen) == 2